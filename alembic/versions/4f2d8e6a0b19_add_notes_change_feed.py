@@ -0,0 +1,42 @@
+"""add notes change feed
+
+Revision ID: 4f2d8e6a0b19
+Revises: e7a94b1d3c50
+Create Date: 2026-10-18 14:41:09.873125
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '4f2d8e6a0b19'
+down_revision: Union[str, None] = 'e7a94b1d3c50'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(sa.schema.CreateSequence(sa.Sequence("note_change_seq")))
+    # The default is volatile, so every existing note draws its own number.
+    op.add_column(
+        "notes",
+        sa.Column("change_seq", sa.BigInteger, server_default=sa.text("nextval('note_change_seq')"), nullable=False),
+    )
+    op.create_index("ix_notes_user_id_change_seq", "notes", ["user_id", "change_seq"])
+    op.create_table(
+        "note_tombstones",
+        sa.Column("id", sa.Uuid, primary_key=True),
+        sa.Column("user_id", sa.String, nullable=False),
+        sa.Column("change_seq", sa.BigInteger, server_default=sa.text("nextval('note_change_seq')"), nullable=False),
+        sa.Column("deleted_at", sa.DateTime, server_default=sa.func.now(), nullable=False),
+    )
+    op.create_index("ix_note_tombstones_user_id_change_seq", "note_tombstones", ["user_id", "change_seq"])
+
+
+def downgrade() -> None:
+    op.drop_table("note_tombstones")
+    op.drop_index("ix_notes_user_id_change_seq", table_name="notes")
+    op.drop_column("notes", "change_seq")
+    op.execute(sa.schema.DropSequence(sa.Sequence("note_change_seq")))
@@ -0,0 +1,26 @@
+"""index notes by user creation order
+
+Revision ID: 5b1e0f3c9a27
+Revises: 06823a7549f0
+Create Date: 2026-10-18 10:12:40.118305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '5b1e0f3c9a27'
+down_revision: Union[str, None] = '06823a7549f0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_notes_user_id_created_at_id", "notes", ["user_id", "created_at", "id"])
+    op.drop_index("ix_notes_user_id", table_name="notes")
+
+
+def downgrade() -> None:
+    op.create_index("ix_notes_user_id", "notes", ["user_id"])
+    op.drop_index("ix_notes_user_id_created_at_id", table_name="notes")
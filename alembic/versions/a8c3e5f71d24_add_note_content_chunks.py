@@ -0,0 +1,38 @@
+"""add note content chunks
+
+Revision ID: a8c3e5f71d24
+Revises: 4f2d8e6a0b19
+Create Date: 2026-10-18 16:12:45.204318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8c3e5f71d24'
+down_revision: Union[str, None] = '4f2d8e6a0b19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("notes", sa.Column("content_id", sa.Uuid, nullable=True))
+    op.add_column("notes", sa.Column("content_size", sa.BigInteger, nullable=True))
+    op.create_table(
+        "note_content_chunks",
+        sa.Column("content_id", sa.Uuid, primary_key=True),
+        sa.Column("offset", sa.BigInteger, primary_key=True),
+        sa.Column("note_id", sa.Uuid, sa.ForeignKey("notes.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("data", sa.LargeBinary, nullable=False),
+    )
+    op.create_index("ix_note_content_chunks_note_id", "note_content_chunks", ["note_id"])
+    # Chunks are stored uncompressed, sparing decompression on every read of a range.
+    op.execute("ALTER TABLE note_content_chunks ALTER COLUMN data SET STORAGE EXTERNAL")
+
+
+def downgrade() -> None:
+    op.drop_table("note_content_chunks")
+    op.drop_column("notes", "content_size")
+    op.drop_column("notes", "content_id")
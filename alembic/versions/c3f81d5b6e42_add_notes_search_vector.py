@@ -0,0 +1,36 @@
+"""add notes search vector
+
+Revision ID: c3f81d5b6e42
+Revises: 9d4c2a7e1f08
+Create Date: 2026-10-18 11:48:05.207731
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3f81d5b6e42'
+down_revision: Union[str, None] = '9d4c2a7e1f08'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "notes",
+        sa.Column(
+            "search_vector",
+            postgresql.TSVECTOR,
+            sa.Computed("to_tsvector('simple', title || ' ' || content)", persisted=True),
+            nullable=False,
+        ),
+    )
+    op.create_index("ix_notes_search_vector", "notes", ["search_vector"], postgresql_using="gin")
+
+
+def downgrade() -> None:
+    op.drop_index("ix_notes_search_vector", table_name="notes")
+    op.drop_column("notes", "search_vector")
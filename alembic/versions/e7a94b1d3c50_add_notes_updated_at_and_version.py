@@ -0,0 +1,29 @@
+"""add notes updated_at and version
+
+Revision ID: e7a94b1d3c50
+Revises: c3f81d5b6e42
+Create Date: 2026-10-18 14:02:37.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a94b1d3c50'
+down_revision: Union[str, None] = 'c3f81d5b6e42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("notes", sa.Column("updated_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False))
+    op.add_column("notes", sa.Column("version", sa.Integer(), server_default="1", nullable=False))
+    # Existing notes have not been changed since they were created as far as anyone can tell.
+    op.execute("UPDATE notes SET updated_at = created_at")
+
+
+def downgrade() -> None:
+    op.drop_column("notes", "version")
+    op.drop_column("notes", "updated_at")
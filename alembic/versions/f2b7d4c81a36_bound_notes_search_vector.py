@@ -0,0 +1,37 @@
+"""bound notes search vector
+
+Revision ID: f2b7d4c81a36
+Revises: a8c3e5f71d24
+Create Date: 2026-10-18 18:40:12.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b7d4c81a36'
+down_revision: Union[str, None] = 'a8c3e5f71d24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _replace_search_vector(expression: str) -> None:
+    # The expression of a generated column cannot be altered, the column is added anew.
+    op.drop_index("ix_notes_search_vector", table_name="notes")
+    op.drop_column("notes", "search_vector")
+    op.add_column(
+        "notes",
+        sa.Column("search_vector", postgresql.TSVECTOR, sa.Computed(expression, persisted=True), nullable=False),
+    )
+    op.create_index("ix_notes_search_vector", "notes", ["search_vector"], postgresql_using="gin")
+
+
+def upgrade() -> None:
+    _replace_search_vector("to_tsvector('simple', title || ' ' || left(content, 100000))")
+
+
+def downgrade() -> None:
+    _replace_search_vector("to_tsvector('simple', title || ' ' || content)")
@@ -0,0 +1,77 @@
+"""Measures the time taken to import the app, in a fresh interpreter, and reports which packages it goes to.
+
+Startup cost matters for workers started by autoscaling and for command line tools importing the app,
+the optional integrations are imported only when they are enabled in the settings. Timings come from
+`python -X importtime`, the self time of every module is added up by its top level package.
+
+    python -m benchmarks.imports
+    python -m benchmarks.imports --module nulland.relay --top 10
+
+The run fails when importing takes longer than the budget:
+
+    python -m benchmarks.imports --budget 2.5
+"""
+import argparse
+import subprocess
+import sys
+
+from collections import Counter
+
+
+def import_times(module: str) -> dict[str, tuple[int, int]]:
+    """Imports the module in a new interpreter, returns self and cumulative import time by module name in us."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        # Lines look like "import time:       120 |        340 |   nulland.config", after a header line.
+        if not line.startswith("import time:"):
+            continue
+        self_time, cumulative, name = line.removeprefix("import time:").split("|")
+        if self_time.strip().isdigit():
+            times[name.strip()] = (int(self_time), int(cumulative))
+    return times
+
+
+def by_package(times: dict[str, tuple[int, int]]) -> Counter:
+    """Returns the self import time of the modules added up by top level package."""
+    packages = Counter()
+    for name, (self_time, _) in times.items():
+        packages[name.split(".")[0]] += self_time
+    return packages
+
+
+def measure(module: str, repeat: int) -> tuple[float, dict[str, tuple[int, int]]]:
+    """Returns the best import time of the module in seconds, with the times of the modules in that run."""
+    best = None
+    for _ in range(repeat):
+        times = import_times(module)
+        if best is None or times[module][1] < best[module][1]:
+            best = times
+    return best[module][1] / 1e6, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="nulland.main", help="module to import")
+    parser.add_argument("--repeat", type=int, default=5, help="number of runs to take the best of")
+    parser.add_argument("--top", type=int, default=20, help="number of packages to report")
+    parser.add_argument("--budget", type=float, help="fail if importing takes longer than this many seconds")
+    args = parser.parse_args()
+
+    total, times = measure(args.module, args.repeat)
+    print(f"{'package':<30}{'self ms':>10}")
+    for package, self_time in by_package(times).most_common(args.top):
+        print(f"{package:<30}{self_time / 1000:>10.1f}")
+    print(f"{args.module} imported in {total * 1000:.0f} ms, {len(times)} modules")
+    if args.budget is not None and total > args.budget:
+        print(f"Over the budget of {args.budget * 1000:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""Drives a mix of note requests at fixed concurrency against the app and reports throughput and latency.
+
+Users and their notes are seeded into the database configured by DATABASE_URI and removed afterwards.
+Tokens are signed and verified with the test key, no OIDC provider is needed. Requests are made
+to the ASGI app in-process, or over HTTP to uvicorn serving it from the same process.
+Runs are reproducible: the mix of requests follows a random generator with a fixed seed.
+The app runs with its configuration from the environment, set EVENT_PRODUCER=none to keep events out of the output.
+
+    python -m benchmarks.load --scenario read-heavy --users 20 --notes 100 --concurrency 16 --requests 5000
+    python -m benchmarks.load --server uvicorn --allocations
+
+Results can be saved as the baseline of the scenario and later runs on the same machine checked against it,
+the check fails when throughput drops or latency grows by more than the tolerance:
+
+    python -m benchmarks.load --save-baseline
+    python -m benchmarks.load --check-baseline --tolerance 0.2
+"""
+import argparse
+import asyncio
+import datetime
+import httpx
+import json
+import random
+import socket
+import sys
+import time
+import tracemalloc
+import uuid
+import uvicorn
+
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from pathlib import Path
+from sqlalchemy import delete, insert
+
+from nulland import auth
+from nulland.db.session import SessionLocal
+from nulland.main import app
+from nulland.models.notes import Note, NoteTombstone
+from nulland.tests.utils.auth import auth_headers, get_public_key
+
+
+BASELINES = Path(__file__).parent / "baselines"
+
+# Weights of the operations in each scenario.
+SCENARIOS = {
+    "read-heavy": {"list": 40, "get": 50, "create": 4, "update": 5, "delete": 1},
+    "write-heavy": {"list": 10, "get": 20, "create": 30, "update": 30, "delete": 10},
+    "list": {"list": 1},
+    "get": {"get": 1},
+}
+
+
+class Workload:
+    """Users with their tokens and the ids of their notes, kept up to date as notes are created and deleted."""
+
+    def __init__(self, users: int, notes: int, content_size: int, seed: int):
+        self.run_id = uuid.uuid4().hex[:8]
+        self.users = [f"bench-{self.run_id}-{i}" for i in range(users)]
+        self.headers = {user_id: auth_headers(user_id) for user_id in self.users}
+        self.notes: dict[str, list[uuid.UUID]] = {user_id: [] for user_id in self.users}
+        self.notes_per_user = notes
+        self.content = "x" * content_size
+        self.rng = random.Random(seed)
+
+    def seed(self):
+        created_at = datetime.datetime.now()
+        rows = []
+        for user_id in self.users:
+            for i in range(self.notes_per_user):
+                note_id = uuid.uuid4()
+                self.notes[user_id].append(note_id)
+                rows.append({
+                    "id": note_id,
+                    "user_id": user_id,
+                    "title": f"Note {i}",
+                    "content": self.content,
+                    "created_at": created_at + datetime.timedelta(microseconds=i),
+                })
+        with SessionLocal() as db:
+            if rows:
+                db.execute(insert(Note), rows)
+            db.commit()
+
+    def cleanup(self):
+        with SessionLocal() as db:
+            db.execute(delete(Note).where(Note.user_id.in_(self.users)))
+            db.execute(delete(NoteTombstone).where(NoteTombstone.user_id.in_(self.users)))
+            db.commit()
+
+    def next_request(self, operations: list[str], weights: list[int]) -> tuple[str, str, str, str, dict]:
+        """Picks the next request of the mix: operation name, user id, HTTP method, URL and keyword arguments."""
+        operation = self.rng.choices(operations, weights)[0]
+        user_id = self.rng.choice(self.users)
+        notes = self.notes[user_id]
+        kwargs = {"headers": self.headers[user_id]}
+        if operation in ("get", "update", "delete") and not notes:
+            operation = "create"
+        if operation == "list":
+            return operation, user_id, "GET", "/notes", kwargs
+        if operation == "create":
+            return operation, user_id, "POST", "/notes", {**kwargs, "json": {"title": "New note", "content": self.content}}
+        note_id = self.rng.choice(notes)
+        if operation == "get":
+            return operation, user_id, "GET", f"/notes/{note_id}", kwargs
+        if operation == "update":
+            return operation, user_id, "PATCH", f"/notes/{note_id}", {**kwargs, "json": {"title": "Updated note"}}
+        # Deleted note is forgotten right away so that concurrent requests do not pick it.
+        notes.remove(note_id)
+        return operation, user_id, "DELETE", f"/notes/{note_id}", kwargs
+
+    def record(self, operation: str, user_id: str, response: httpx.Response):
+        if operation == "create" and response.status_code == 201:
+            self.notes[user_id].append(uuid.UUID(response.json()["id"]))
+
+
+async def drive(client: httpx.AsyncClient, workload: Workload, scenario: dict, concurrency: int, requests: int):
+    """Makes the requests from `concurrency` concurrent clients, returns latencies by operation and the wall time."""
+    operations, weights = list(scenario), list(scenario.values())
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            operation, user_id, method, url, kwargs = workload.next_request(operations, weights)
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies[operation].append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors[f"{operation} {response.status_code}"] += 1
+            workload.record(operation, user_id, response)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+
+async def measure_allocations(client: httpx.AsyncClient, workload: Workload, scenario: dict, requests: int) -> float:
+    """Returns the average peak of memory allocated while handling a request, in KiB.
+
+    Requests are made one at a time so that the peak belongs to a single request.
+    """
+    operations, weights = list(scenario), list(scenario.values())
+    total = 0
+    tracemalloc.start()
+    try:
+        for _ in range(requests):
+            operation, user_id, method, url, kwargs = workload.next_request(operations, weights)
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            response = await client.request(method, url, **kwargs)
+            total += tracemalloc.get_traced_memory()[1] - baseline
+            workload.record(operation, user_id, response)
+    finally:
+        tracemalloc.stop()
+    return total / requests / 1024
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def summarize(latencies: dict[str, list[float]], elapsed: float) -> dict:
+    everything = [latency for values in latencies.values() for latency in values]
+    result = {"rps": len(everything) / elapsed, "operations": {}}
+    for operation, values in sorted(latencies.items()) + [("all", everything)]:
+        stats = {
+            "count": len(values),
+            "p50": percentile(values, 0.5) * 1000,
+            "p90": percentile(values, 0.9) * 1000,
+            "p99": percentile(values, 0.99) * 1000,
+            "max": max(values) * 1000,
+        }
+        result["operations"][operation] = stats
+    return result
+
+
+def report(result: dict, errors: dict[str, int]):
+    print(f"{result['rps']:.0f} requests/s")
+    print(f"{'operation':<10}{'count':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for operation, stats in result["operations"].items():
+        print(
+            f"{operation:<10}{stats['count']:>8}{stats['p50']:>10.2f}{stats['p90']:>10.2f}"
+            f"{stats['p99']:>10.2f}{stats['max']:>10.2f}"
+        )
+    if "allocated_kib" in result:
+        print(f"{result['allocated_kib']:.1f} KiB allocated at peak per request")
+    for error, count in sorted(errors.items()):
+        print(f"error responses {error}: {count}")
+
+
+def check_baseline(result: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Returns the regressions of the result against the baseline beyond the tolerance."""
+    regressions = []
+    if result["rps"] < baseline["rps"] * (1 - tolerance):
+        regressions.append(f"throughput {result['rps']:.0f} requests/s, baseline {baseline['rps']:.0f}")
+    for operation, stats in result["operations"].items():
+        expected = baseline["operations"].get(operation)
+        if expected and stats["p99"] > expected["p99"] * (1 + tolerance):
+            regressions.append(f"{operation} p99 {stats['p99']:.2f} ms, baseline {expected['p99']:.2f} ms")
+    if "allocated_kib" in result and "allocated_kib" in baseline:
+        if result["allocated_kib"] > baseline["allocated_kib"] * (1 + tolerance):
+            regressions.append(f"allocated {result['allocated_kib']:.1f} KiB, baseline {baseline['allocated_kib']:.1f} KiB")
+    return regressions
+
+
+async def run(args) -> dict:
+    scenario = SCENARIOS[args.scenario]
+    workload = Workload(args.users, args.notes, args.content_size, args.seed)
+    workload.seed()
+    try:
+        async with app_client(args.server, args.concurrency) as client:
+            # Warm up pools and caches so that they are not part of the measurement.
+            await drive(client, workload, scenario, args.concurrency, args.concurrency * 10)
+            latencies, errors, elapsed = await drive(client, workload, scenario, args.concurrency, args.requests)
+            result = summarize(latencies, elapsed)
+            if args.allocations:
+                result["allocated_kib"] = await measure_allocations(client, workload, scenario, 200)
+    finally:
+        workload.cleanup()
+    report(result, errors)
+    return result
+
+
+@asynccontextmanager
+async def app_client(server: str, concurrency: int):
+    """Yields a client of the app, served in-process or by uvicorn, with the app started and stopped around it."""
+    if server == "asgi":
+        # ASGI transport does not run the lifespan of the app.
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+                yield client
+        return
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, port=port, log_level="warning", access_log=False))
+    serving = asyncio.create_task(server.serve())
+    try:
+        while not server.started:
+            await asyncio.sleep(0.01)
+        limits = httpx.Limits(max_connections=concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits) as client:
+            yield client
+    finally:
+        server.should_exit = True
+        await serving
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", choices=SCENARIOS, default="read-heavy", help="mix of operations")
+    parser.add_argument("--server", choices=["asgi", "uvicorn"], default="asgi", help="how the app is served")
+    parser.add_argument("--users", type=int, default=20, help="number of users")
+    parser.add_argument("--notes", type=int, default=100, help="number of notes of each user")
+    parser.add_argument("--content-size", type=int, default=500, help="length of each note content")
+    parser.add_argument("--concurrency", type=int, default=16, help="number of concurrent requests")
+    parser.add_argument("--requests", type=int, default=5000, help="number of requests to make")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the request mix")
+    parser.add_argument("--allocations", action="store_true", help="measure memory allocated per request")
+    parser.add_argument("--save-baseline", action="store_true", help="save the results as the baseline")
+    parser.add_argument("--check-baseline", action="store_true", help="fail if the results regress from the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression from the baseline, 0.2 is 20%%")
+    args = parser.parse_args()
+
+    auth.get_public_key = get_public_key
+    result = asyncio.run(run(args))
+    result["parameters"] = {
+        name: getattr(args, name)
+        for name in ("scenario", "server", "users", "notes", "content_size", "concurrency", "requests", "seed")
+    }
+
+    baseline_path = BASELINES / f"{args.scenario}-{args.server}.json"
+    if args.check_baseline:
+        baseline = json.loads(baseline_path.read_text())
+        if baseline["parameters"] != result["parameters"]:
+            print(f"Parameters differ from the baseline: {baseline['parameters']}")
+        if regressions := check_baseline(result, baseline, args.tolerance):
+            print("Regressions from the baseline:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("No regressions from the baseline")
+    if args.save_baseline:
+        BASELINES.mkdir(exist_ok=True)
+        baseline_path.write_text(json.dumps(result, indent=2) + "\n")
+        print(f"Saved baseline to {baseline_path}")
+
+
+if __name__ == "__main__":
+    main()
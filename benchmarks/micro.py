@@ -0,0 +1,94 @@
+"""Measures the CPU cost of the steps every request goes through, one at a time.
+
+Covers auth token verification and user construction, event serialization and response serialization,
+so that a regression in an end-to-end benchmark can be traced to the step that caused it.
+
+    python -m benchmarks.micro --number 2000
+    python -m benchmarks.micro --only event
+"""
+import argparse
+import asyncio
+import datetime
+import time
+import uuid
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from jose import jwt
+
+from nulland.auth import TokenCache
+from nulland.models.notes import Note as NoteModel
+from nulland.schemas.auth import User
+from nulland.schemas.notes import Note, NoteLog
+from nulland.tests.utils.auth import auth_headers, jwk_public_key
+
+
+def make_note() -> NoteModel:
+    now = datetime.datetime.now()
+    return NoteModel(
+        id=uuid.uuid4(),
+        user_id=str(uuid.uuid4()),
+        title="Benchmark note",
+        content="x" * 500,
+        created_at=now,
+        updated_at=now,
+        version=1,
+    )
+
+
+def benchmarks() -> dict:
+    """Returns the measured functions by name, each taking no arguments."""
+    token = auth_headers(uuid.uuid4())["Authorization"].removeprefix("Bearer ")
+    claims = jwt.decode(token, jwk_public_key, options={"verify_aud": False})
+    user = User(**claims)
+    token_cache = TokenCache(size=1, ttl=60)
+    token_cache.put(token, user, None)
+    note = make_note()
+    note_field = create_response_field(name="response", type_=Note)
+    notes = [make_note() for _ in range(100)]
+    notes_field = create_response_field(name="response", type_=list[Note])
+
+    def response(field, content):
+        return JSONResponse(asyncio.run(serialize_response(field=field, response_content=content))).body
+
+    return {
+        "auth.jwt_decode": lambda: jwt.decode(token, jwk_public_key, options={"verify_aud": False}),
+        "auth.unverified_header": lambda: jwt.get_unverified_header(token),
+        "auth.user": lambda: User(**claims),
+        "auth.token_cache_hit": lambda: token_cache.get(token),
+        "event.validate": lambda: NoteLog.model_validate(note),
+        "event.serialize": lambda: NoteLog.model_validate(note).model_dump_json(),
+        "response.note": lambda: response(note_field, Note.model_validate(note)),
+        "response.notes_100": lambda: response(notes_field, [Note.model_validate(note) for note in notes]),
+    }
+
+
+def measure(function, number: int, repeat: int) -> float:
+    """Returns the best time of a single call in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            function()
+        best = min(best, (time.perf_counter() - started) / number)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=1000, help="number of calls in each run")
+    parser.add_argument("--repeat", type=int, default=5, help="number of runs to take the best of")
+    parser.add_argument("--only", help="measure only the functions with names starting with this prefix")
+    args = parser.parse_args()
+
+    for name, function in benchmarks().items():
+        if args.only and not name.startswith(args.only):
+            continue
+        # Slow functions get fewer calls, so that every measurement takes about the same time.
+        number = max(1, args.number // 100) if name == "response.notes_100" else args.number
+        print(f"{name:<25}{measure(function, number, args.repeat) * 1e6:>12.2f} us")
+
+
+if __name__ == "__main__":
+    main()
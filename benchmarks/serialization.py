@@ -0,0 +1,76 @@
+"""Compares the cost of encoding a note list response with and without the JSON fast path.
+
+The default path validates every note into the response schema, then FastAPI validates and
+serializes the list again against the response model and encodes it with the stdlib encoder.
+The fast path encodes the database rows with orjson as they are.
+
+    python -m benchmarks.serialization --notes 1000 --content-size 2000
+"""
+import argparse
+import asyncio
+import datetime
+import orjson
+import time
+import uuid
+
+from collections import namedtuple
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from nulland.schemas.notes import Note
+
+
+# Stands in for SQLAlchemy Row, which offers the same attribute and _asdict() access.
+Row = namedtuple("Row", ["id", "title", "content", "created_at", "updated_at", "version", "content_size"])
+
+
+def make_rows(count: int, content_size: int) -> list[Row]:
+    now = datetime.datetime.now()
+    return [
+        Row(uuid.uuid4(), f"Note {i}", "x" * content_size, now + datetime.timedelta(seconds=i), now, 1, None)
+        for i in range(count)
+    ]
+
+
+async def default_path(rows: list[Row]) -> bytes:
+    field = create_response_field(name="response", type_=list[Note])
+    notes = [Note.model_validate(row) for row in rows]
+    content = await serialize_response(field=field, response_content=notes)
+    return JSONResponse(content).body
+
+
+async def fast_path(rows: list[Row]) -> bytes:
+    return orjson.dumps([row._asdict() for row in rows], default=str)
+
+
+async def measure(path, rows: list[Row], repeat: int) -> float:
+    """Returns the best time of encoding all rows in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await path(rows)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notes", type=int, default=1000, help="number of notes in the response")
+    parser.add_argument("--content-size", type=int, default=500, help="length of each note content")
+    parser.add_argument("--repeat", type=int, default=20, help="number of runs to take the best of")
+    args = parser.parse_args()
+
+    rows = make_rows(args.notes, args.content_size)
+    assert orjson.loads(asyncio.run(default_path(rows))) == orjson.loads(asyncio.run(fast_path(rows)))
+
+    default = asyncio.run(measure(default_path, rows, args.repeat))
+    fast = asyncio.run(measure(fast_path, rows, args.repeat))
+    print(f"{args.notes} notes, {args.content_size} characters of content each")
+    print(f"default path: {default / args.notes * 1e6:8.2f} us/note")
+    print(f"fast path:    {fast / args.notes * 1e6:8.2f} us/note")
+    print(f"speedup:      {default / fast:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Server profile of the app, read by gunicorn from the working directory.
+
+Settings are taken from the environment, and gunicorn command line arguments and GUNICORN_CMD_ARGS override them:
+
+    WEB_CONCURRENCY       number of worker processes, the number of CPUs by default
+    GUNICORN_BIND         address to listen on, 0.0.0.0:8000 by default
+    GUNICORN_PRELOAD      whether the app is loaded once before workers are forked, true by default
+    GUNICORN_KEEPALIVE    seconds an idle client connection is kept open, 65 by default
+    GUNICORN_MAX_REQUESTS number of requests after which a worker is replaced, 0 to never replace them
+    FORWARDED_ALLOW_IPS   comma separated addresses of proxies trusted to set X-Forwarded-* headers, 127.0.0.1 by default
+"""
+import os
+import sys
+
+from prometheus_client import multiprocess
+
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+# Each worker runs an event loop handling many requests at once, one per CPU keeps them all busy.
+workers = int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1))
+# Uvicorn picks uvloop and httptools when they are installed.
+worker_class = "uvicorn.workers.UvicornWorker"
+# Imports are done once and the memory of the loaded app is shared by the workers until they change it.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "true").lower() in ("true", "1", "yes")
+# Longer than the idle timeout of common load balancers, so that they never reuse a connection the worker is closing.
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 65))
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 0))
+max_requests_jitter = max_requests // 10
+# Only a proxy in front of the app may tell the client address and scheme, anyone else could forge them.
+forwarded_allow_ips = os.environ.get("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+
+def post_fork(server, worker):
+    if "nulland.db.session" in sys.modules:
+        from nulland.db.session import dispose_after_fork
+        dispose_after_fork()
+
+
+def child_exit(server, worker):
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        # Live gauges of the exited worker must not be reported anymore.
+        multiprocess.mark_process_dead(worker.pid)
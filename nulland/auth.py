@@ -1,20 +1,28 @@
+import asyncio
+import hashlib
 import httpx
+import json
 import logging
+import re
+import time
 
+from collections import OrderedDict
 from fastapi import Depends
 from fastapi import HTTPException
 from fastapi import status
 from fastapi.security import OAuth2AuthorizationCodeBearer
-from functools import lru_cache
 from jose import jwt, JOSEError
 from pydantic import ValidationError
 from typing import Annotated
 
+from nulland import prometheus
 from nulland.schemas.auth import User
-from nulland.config import settings
+from nulland.config import AuthSettings, settings
+from nulland.tracing import tracer
 
 
 logger = logging.getLogger(__name__)
+_background_tasks: set[asyncio.Task] = set()
 oauth2_scheme = OAuth2AuthorizationCodeBearer(
     authorizationUrl=str(settings.auth.authorization_endpoint),
     tokenUrl="token",
@@ -26,45 +34,227 @@ oauth2_scheme = OAuth2AuthorizationCodeBearer(
 )
 
 
-@lru_cache()
-def get_public_key():
-    """Loads the public key from the OIDC provider."""
-    if not settings.auth.jwks_uri:
-        logger.error("No JWT key source provided, authentication will not work.")
-        return None
-    logger.info("Loading public key from %s", settings.auth.jwks_uri)
+async def discover_oidc():
+    """Loads authentication settings from the OIDC configuration URL unless those are provided explicitly.
+
+    When the configuration cache file is set and exists, the settings are taken from it right away
+    and reloaded in the background.
+    """
+    if not settings.auth_openid_configuration_url or settings.auth != AuthSettings():
+        return
+    cache = settings.auth_openid_configuration_cache
+    if cache and cache.exists():
+        try:
+            _configure_auth(json.loads(cache.read_text()))
+        except (OSError, ValueError) as exc:
+            logger.warning("Failed to read cached OIDC configuration: %s", exc)
+        else:
+            _background_tasks.add(task := asyncio.create_task(_rediscover()))
+            task.add_done_callback(_background_tasks.discard)
+            return
+    _configure_auth(await _fetch_oidc_configuration())
+
+
+async def _rediscover():
     try:
-        return httpx.get(str(settings.auth.jwks_uri)).json()
-    except httpx.HTTPError as exc:
-        logger.critical("Failed to load public key: %s", exc)
-        raise
+        _configure_auth(await _fetch_oidc_configuration())
+    except (httpx.HTTPError, ValueError, ValidationError) as exc:
+        logger.warning("Failed to reload OIDC configuration, keeping the cached one: %s", exc)
 
 
-def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
-    """Parses the JWT token and returns the user object constructed from it."""
+async def _fetch_oidc_configuration() -> dict:
+    """Downloads the OIDC configuration retrying on failures and saves it to the cache file."""
+    url = str(settings.auth_openid_configuration_url)
+    async with httpx.AsyncClient(timeout=settings.auth_discovery_timeout) as client:
+        for attempt in range(1, settings.auth_discovery_retries + 1):
+            try:
+                response = await client.get(url)
+                response.raise_for_status()
+                break
+            except httpx.HTTPError as exc:
+                logger.warning("Failed to load OIDC configuration from %s (attempt %d): %s", url, attempt, exc)
+                if attempt == settings.auth_discovery_retries:
+                    raise
+                await asyncio.sleep(0.5 * 2 ** attempt)
+    oidc_conf = response.json()
+    if cache := settings.auth_openid_configuration_cache:
+        try:
+            cache.with_suffix(".tmp").write_text(json.dumps(oidc_conf))
+            cache.with_suffix(".tmp").replace(cache)
+        except OSError as exc:
+            logger.warning("Failed to cache OIDC configuration: %s", exc)
+    return oidc_conf
+
+
+def _configure_auth(oidc_conf: dict):
+    settings.auth = AuthSettings(**oidc_conf)
+    # OpenAPI schema is generated on the first request to the docs, so the discovered URL makes it there.
+    oauth2_scheme.model.flows.authorizationCode.authorizationUrl = str(settings.auth.authorization_endpoint)
+
+
+class JWKSCache:
+    """Keeps the public keys of the OIDC provider.
+
+    Keys are reused for as long as the provider allows with Cache-Control header, after that they are still
+    served while being reloaded in the background. A token signed with an unknown key forces a reload,
+    but not more often than once in `min_refresh_interval` seconds.
+    """
+
+    def __init__(self, ttl: float, min_refresh_interval: float):
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.keys: dict | None = None
+        self.loaded_at = float("-inf")
+        self.expires_at = float("-inf")
+        self._lock = asyncio.Lock()
+        self._refresh_task: asyncio.Task | None = None
+
+    async def get(self, kid: str | None = None) -> dict | None:
+        """Returns the JWKS, reloading it if it is missing or does not contain the key."""
+        if not settings.auth.jwks_uri:
+            return None
+        now = time.monotonic()
+        if self.keys is None:
+            prometheus.jwks_cache_requests.labels(result="miss").inc()
+            await self.refresh()
+        elif kid is not None and not self.has_key(kid) and now - self.loaded_at >= self.min_refresh_interval:
+            logger.info("Unknown key id %s, reloading public keys", kid)
+            prometheus.jwks_cache_requests.labels(result="miss").inc()
+            await self.refresh()
+        else:
+            prometheus.jwks_cache_requests.labels(result="hit").inc()
+            if now >= self.expires_at and self._refresh_task is None:
+                self._refresh_task = asyncio.create_task(self._refresh_in_background())
+        return self.keys
+
+    def has_key(self, kid: str) -> bool:
+        return any(key.get("kid") == kid for key in (self.keys or {}).get("keys", []))
+
+    async def refresh(self):
+        """Loads the public keys from the OIDC provider."""
+        requested_at = time.monotonic()
+        async with self._lock:
+            if self.loaded_at >= requested_at:
+                # Concurrent request has just reloaded the keys.
+                return
+            logger.info("Loading public key from %s", settings.auth.jwks_uri)
+            try:
+                self.keys, max_age = await self._fetch()
+            except httpx.HTTPError as exc:
+                logger.critical("Failed to load public key: %s", exc)
+                raise
+            self.loaded_at = time.monotonic()
+            self.expires_at = self.loaded_at + max(self.ttl if max_age is None else max_age, self.min_refresh_interval)
+
+    async def prefetch(self):
+        """Loads the keys ahead of the first request."""
+        if not settings.auth.jwks_uri:
+            logger.error("No JWT key source provided, authentication will not work.")
+            return
+        try:
+            await self.refresh()
+        except httpx.HTTPError:
+            pass
+
+    async def _refresh_in_background(self):
+        try:
+            await self.refresh()
+        except httpx.HTTPError:
+            pass
+        finally:
+            self._refresh_task = None
+
+    async def _fetch(self) -> tuple[dict, int | None]:
+        async with httpx.AsyncClient() as client:
+            response = await client.get(str(settings.auth.jwks_uri))
+            response.raise_for_status()
+        max_age = re.search(r"max-age=(\d+)", response.headers.get("cache-control", ""))
+        return response.json(), int(max_age.group(1)) if max_age else None
+
+
+class TokenCache:
+    """Remembers users of verified tokens to skip signature verification on repeated requests.
+
+    Holds at most `size` least recently used tokens, each until it expires but no longer than `ttl` seconds.
+    Tokens are kept by their hash.
+    """
+
+    def __init__(self, size: int, ttl: float):
+        self.size = size
+        self.ttl = ttl
+        self.entries: OrderedDict[bytes, tuple[User, float]] = OrderedDict()
+
+    def get(self, token: str) -> User | None:
+        key = hashlib.sha256(token.encode()).digest()
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        user, expires_at = entry
+        if expires_at <= time.time():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return user
+
+    def put(self, token: str, user: User, exp: float | None):
+        expires_at = time.time() + self.ttl
+        if exp is not None:
+            expires_at = min(expires_at, exp)
+        self.entries[hashlib.sha256(token.encode()).digest()] = (user, expires_at)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+
+jwks_cache = JWKSCache(ttl=settings.auth_jwks_ttl, min_refresh_interval=settings.auth_jwks_min_refresh_interval)
+token_cache = TokenCache(size=settings.auth_token_cache_size, ttl=settings.auth_token_cache_ttl)
+
+
+async def get_public_key(kid: str | None = None):
+    """Returns the public keys of the OIDC provider, making sure the key of given id is loaded if it exists."""
+    return await jwks_cache.get(kid)
+
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+async def _verify_token(token: str) -> dict:
+    """Verifies the signature of the JWT token and returns its claims."""
     try:
-        key = get_public_key()
+        kid = jwt.get_unverified_header(token).get("kid")
+    except JOSEError as exc:
+        logger.warning("Failed to decode auth token: %s", exc)
+        raise _credentials_exception()
+    try:
+        key = await get_public_key(kid)
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Service Unavailable",
         )
     try:
-        claims = jwt.decode(token, key, options={"verify_aud": False})
+        return jwt.decode(token, key, options={"verify_aud": False})
     except JOSEError as exc:
         logger.warning("Failed to decode auth token: %s", exc)
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise _credentials_exception()
+
+
+async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
+    """Parses the JWT token and returns the user object constructed from it."""
+    if user := token_cache.get(token):
+        prometheus.token_cache_requests.labels(result="hit").inc()
+        return user
+    prometheus.token_cache_requests.labels(result="miss").inc()
+    with tracer.start_as_current_span("auth.verify_token"), prometheus.token_verification_duration.time():
+        claims = await _verify_token(token)
     try:
         user = User(**claims)
     except ValidationError as exc:
         logger.error("Auth token contains incompatible claims: %s", exc)
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise _credentials_exception()
+    token_cache.put(token, user, claims.get("exp"))
     return user
@@ -0,0 +1,137 @@
+import time
+import uuid
+
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Iterable
+from functools import lru_cache
+
+from nulland.cache import none
+from nulland.config import settings
+from nulland.models.notes import Note as NoteModel
+from nulland.schemas.metrics import CacheStats
+from nulland.schemas.notes import Note
+
+
+class Backend:
+    async def get(self, key):
+        return None
+
+    async def set(self, key, value, ttl):
+        pass
+
+    async def delete(self, *keys):
+        pass
+
+    async def close(self):
+        pass
+
+
+class NoteCache:
+    """Read-through cache of notes keyed by the owner and the note id.
+
+    Notes are looked up in memory of the worker first, holding at most `size` least recently used notes
+    for `ttl` seconds each, then in the backend shared by workers, holding them for `shared_ttl` seconds.
+    Writes invalidate both, but other workers may serve a note from their memory until it expires there.
+    """
+
+    def __init__(self, backend: Backend, size: int, ttl: float, shared_ttl: float):
+        self.backend = backend
+        self.size = size
+        self.ttl = ttl
+        self.shared_ttl = shared_ttl
+        self.entries: OrderedDict[tuple[str, uuid.UUID], tuple[Note, float]] = OrderedDict()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _shared_key(user_id: str, note_id: uuid.UUID) -> str:
+        return f"note:{user_id}:{note_id}"
+
+    async def get(
+        self,
+        user_id: str,
+        note_id: uuid.UUID,
+        load: Callable[[], Awaitable[NoteModel | None]],
+    ) -> Note | None:
+        """Returns the note from the cache, loading it with `load` on a miss. Missing notes are not cached."""
+        if (note := await self.peek(user_id, note_id)) is not None:
+            return note
+        self.misses += 1
+        db_note = await load()
+        if db_note is None:
+            return None
+        note = Note.model_validate(db_note)
+        self._put(user_id, note)
+        await self.backend.set(self._shared_key(user_id, note_id), note.model_dump_json(), self.shared_ttl)
+        return note
+
+    async def peek(self, user_id: str, note_id: uuid.UUID) -> Note | None:
+        """Returns the note if it is cached, without loading it on a miss."""
+        key = (user_id, note_id)
+        entry = self.entries.get(key)
+        if entry is not None:
+            note, expires_at = entry
+            if expires_at > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return note
+            del self.entries[key]
+        value = await self.backend.get(self._shared_key(user_id, note_id))
+        if value is None:
+            return None
+        self.shared_hits += 1
+        note = Note.model_validate_json(value)
+        self._put(user_id, note)
+        return note
+
+    def _put(self, user_id: str, note: Note):
+        if self.size <= 0:
+            return
+        self.entries[(user_id, note.id)] = (note, time.monotonic() + self.ttl)
+        self.entries.move_to_end((user_id, note.id))
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    async def invalidate(self, user_id: str, note_ids: Iterable[uuid.UUID]):
+        """Forgets the notes after they have changed."""
+        keys = []
+        for note_id in note_ids:
+            self.entries.pop((user_id, note_id), None)
+            keys.append(self._shared_key(user_id, note_id))
+        if keys:
+            await self.backend.delete(*keys)
+
+    async def close(self):
+        await self.backend.close()
+
+    def stats(self) -> CacheStats:
+        return CacheStats(
+            size=self.size,
+            cached=len(self.entries),
+            hits=self.hits,
+            shared_hits=self.shared_hits,
+            misses=self.misses,
+            evictions=self.evictions,
+        )
+
+
+def get_backend() -> Backend:
+    if settings.note_cache_backend == settings.CacheBackend.REDIS:
+        # Left unimported unless configured, like the redis client it imports.
+        from nulland.cache import redis
+
+        return redis.Backend()
+    return none.Backend()
+
+
+@lru_cache
+def get_note_cache() -> NoteCache:
+    return NoteCache(
+        get_backend(),
+        size=settings.note_cache_size,
+        ttl=settings.note_cache_ttl,
+        shared_ttl=settings.note_cache_shared_ttl,
+    )
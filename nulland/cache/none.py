@@ -0,0 +1,12 @@
+class Backend:
+    async def get(self, key):
+        return None
+
+    async def set(self, key, value, ttl):
+        pass
+
+    async def delete(self, *keys):
+        pass
+
+    async def close(self):
+        pass
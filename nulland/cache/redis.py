@@ -0,0 +1,43 @@
+import logging
+
+from redis import RedisError
+from redis.asyncio import Redis
+
+from nulland.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class Backend:
+    """Keeps cached values in Redis, shared by all workers.
+
+    The cache is an optimization, so Redis errors are logged and treated as misses instead of failing requests.
+    """
+
+    def __init__(self):
+        if not settings.redis_url:
+            raise Exception("Redis URL not configured")
+        self.redis = Redis.from_url(settings.redis_url)
+
+    async def get(self, key):
+        try:
+            return await self.redis.get(key)
+        except RedisError as exc:
+            logger.warning("Failed to read %s from Redis: %s", key, exc)
+            return None
+
+    async def set(self, key, value, ttl):
+        try:
+            await self.redis.set(key, value, px=int(ttl * 1000))
+        except RedisError as exc:
+            logger.warning("Failed to write %s to Redis: %s", key, exc)
+
+    async def delete(self, *keys):
+        try:
+            await self.redis.delete(*keys)
+        except RedisError as exc:
+            logger.warning("Failed to delete %s from Redis: %s", ", ".join(keys), exc)
+
+    async def close(self):
+        await self.redis.aclose()
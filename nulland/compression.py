@@ -0,0 +1,358 @@
+import logging
+import zlib
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.exceptions import HTTPException
+from starlette.responses import PlainTextResponse
+
+from nulland.config import settings
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+
+logger = logging.getLogger(__name__)
+
+# Content types worth compressing, anything else is likely compressed already.
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "application/x-protobuf", "text/")
+
+# Compressed request bodies are decompressed at most this many bytes at a time, as they are read,
+# so that a small body inflating into a huge one is stopped at the size limit before it takes up memory.
+_DECOMPRESS_STEP = 65536
+# Routes streaming the request body allow it to grow beyond `compression_request_max_size` with `allow_body_size`.
+_MAX_BODY_SIZE_KEY = "nulland.max_body_size"
+# zstandard cannot limit the output of a step, the input is fed to it in slices this long instead,
+# which inflate into a little over a megabyte at most.
+_ZSTD_INPUT_SLICE = 64
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+class Codec:
+    """Compresses a body in chunks. Every chunk is flushed, so that streamed parts reach clients without delay."""
+
+    name: str
+    errors: tuple[type[Exception], ...]
+
+    def compress(self, data: bytes) -> bytes:
+        raise NotImplementedError()
+
+    def finish(self) -> bytes:
+        raise NotImplementedError()
+
+    @classmethod
+    def decompressor(cls, max_size: int):
+        """Returns a function decompressing consecutive pieces of a body into an iterator of parts of the output.
+
+        The iterator raises BodyTooLarge once the output grows beyond `max_size` bytes. After the `final` piece
+        it raises one of `errors` if the compressed stream has not ended, that is the body was cut short.
+        """
+        steps = cls._decompress_steps()
+        size = 0
+
+        def decompress(data: bytes, final: bool = False):
+            nonlocal size
+            for part in steps(data, final):
+                size += len(part)
+                if size > max_size:
+                    raise BodyTooLarge()
+                yield part
+
+        return decompress
+
+    @staticmethod
+    def _decompress_steps():
+        """Returns a generator function decompressing a piece of a body in steps of `_DECOMPRESS_STEP` bytes.
+
+        Given the `final` piece, the generator checks that the compressed stream has ended.
+        """
+        raise NotImplementedError()
+
+
+class GzipCodec(Codec):
+    name = "gzip"
+    errors = (zlib.error,)
+
+    def __init__(self):
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self.compressor.flush()
+
+    @staticmethod
+    def _decompress_steps():
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+        def steps(data: bytes, final: bool):
+            while True:
+                part = decompressor.decompress(data, _DECOMPRESS_STEP)
+                yield part
+                data = decompressor.unconsumed_tail
+                # A full step may have left output behind even with all of the input taken.
+                if not data and len(part) < _DECOMPRESS_STEP:
+                    break
+            if final and not decompressor.eof:
+                raise zlib.error("Truncated gzip stream")
+
+        return steps
+
+
+class BrotliCodec(Codec):
+    name = "br"
+    errors = (brotli.error,) if brotli else ()
+
+    def __init__(self):
+        # Quality above 5 costs much more time for little gain on dynamic content.
+        self.compressor = brotli.Compressor(quality=4)
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.process(data) + self.compressor.flush()
+
+    def finish(self) -> bytes:
+        return self.compressor.finish()
+
+    @staticmethod
+    def _decompress_steps():
+        decompressor = brotli.Decompressor()
+
+        def steps(data: bytes, final: bool):
+            yield decompressor.process(data, output_buffer_limit=_DECOMPRESS_STEP)
+            while not decompressor.can_accept_more_data():
+                yield decompressor.process(b"", output_buffer_limit=_DECOMPRESS_STEP)
+            if final and not decompressor.is_finished():
+                raise brotli.error("Truncated brotli stream")
+
+        return steps
+
+
+class ZstdCodec(Codec):
+    name = "zstd"
+    errors = (zstandard.ZstdError,) if zstandard else ()
+
+    def __init__(self):
+        self.compressor = zstandard.ZstdCompressor(level=3).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.compress(data) + self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self.compressor.flush()
+
+    @staticmethod
+    def _decompress_steps():
+        decompressor = zstandard.ZstdDecompressor().decompressobj(write_size=_DECOMPRESS_STEP)
+
+        def steps(data: bytes, final: bool):
+            for start in range(0, len(data), _ZSTD_INPUT_SLICE):
+                yield decompressor.decompress(data[start:start + _ZSTD_INPUT_SLICE])
+            if final and not decompressor.eof:
+                raise zstandard.ZstdError("Truncated zstd frame")
+
+        return steps
+
+
+# Codecs of libraries missing from the environment are not offered.
+CODECS: dict[str, type[Codec]] = {
+    codec.name: codec
+    for codec, available in [(ZstdCodec, zstandard), (BrotliCodec, brotli), (GzipCodec, True)]
+    if available
+}
+
+
+def negotiate(accept_encoding: str) -> type[Codec] | None:
+    """Chooses the codec of a response from the Accept-Encoding header, in the order of `compression_encodings`."""
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+    for name in settings.compression_encodings:
+        if name in CODECS and weights.get(name, weights.get("*", 0)) > 0:
+            return CODECS[name]
+    return None
+
+
+async def _offloaded(function, data: bytes, *args):
+    """Calls the function with the data in a worker thread if the data is large, to keep the event loop responsive."""
+    if len(data) >= settings.compression_offload_size:
+        return await run_in_threadpool(function, data, *args)
+    return function(data, *args)
+
+
+class CompressionMiddleware:
+    """Compresses responses in the encoding negotiated with the client, and decompresses request bodies.
+
+    Responses are compressed if their content type is compressible and the body is at least `compression_min_size`
+    bytes. Streamed responses are compressed as they are sent. Entity tags are left as they are: they identify
+    the version of notes, which conditional requests compare whatever the encoding.
+    Compressed request bodies are decompressed as the app reads them, those in unsupported encodings are refused
+    with 415.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = Headers(scope=scope)
+        if "content-encoding" in headers:
+            codec = CODECS.get(headers["content-encoding"].strip().lower())
+            if codec is None or codec.name not in settings.compression_encodings:
+                response = PlainTextResponse(
+                    "Unsupported content encoding",
+                    status_code=415,
+                    headers={"Accept-Encoding": ", ".join(name for name in settings.compression_encodings if name in CODECS)},
+                )
+                return await response(scope, receive, send)
+            # The app sees the body as if it was sent uncompressed, its length is not known until it is read.
+            headers = MutableHeaders(scope=scope)
+            del headers["content-encoding"]
+            del headers["content-length"]
+            receive = DecompressingReceiver(scope, receive, codec)
+        codec = negotiate(headers.get("accept-encoding", "")) if settings.compression_encodings else None
+        if codec is None:
+            return await self.app(scope, receive, send)
+        await self.app(scope, receive, CompressingSender(send, codec))
+
+
+def allow_body_size(scope, max_size: int):
+    """Lets the decompressed body of the request grow to `max_size` bytes, for routes that stream it.
+
+    Must be called before the body is read.
+    """
+    scope[_MAX_BODY_SIZE_KEY] = max_size
+
+
+class DecompressingReceiver:
+    """Receives the request body decompressed with the codec, a step at a time as the app reads it.
+
+    Bodies decompressing to more than `compression_request_max_size` bytes, or the size allowed by the route,
+    are refused with 413, invalid ones with 400.
+    """
+
+    def __init__(self, scope, receive, codec: type[Codec]):
+        self.scope = scope
+        self.receive = receive
+        self.codec = codec
+        self.decompress = None
+        self.parts = iter(())
+        self.more_body = True
+        self.finished = False
+
+    async def __call__(self):
+        if self.finished:
+            return await self.receive()
+        if self.decompress is None:
+            # The body is first read once the route is chosen, which may have allowed it to be larger.
+            self.decompress = self.codec.decompressor(
+                self.scope.get(_MAX_BODY_SIZE_KEY, settings.compression_request_max_size)
+            )
+        while True:
+            part = self._next_part()
+            if part:
+                return {"type": "http.request", "body": part, "more_body": True}
+            if part is not None:
+                continue
+            if not self.more_body:
+                self.finished = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            message = await self.receive()
+            if message["type"] == "http.disconnect":
+                return message
+            self.more_body = message.get("more_body", False)
+            self.parts = self.decompress(message.get("body", b""), final=not self.more_body)
+
+    def _next_part(self) -> bytes | None:
+        """Returns the next step of the output, None when the body received so far is used up."""
+        try:
+            return next(self.parts, None)
+        except BodyTooLarge:
+            raise HTTPException(status_code=413, detail="Request body too large")
+        except self.codec.errors as exc:
+            logger.info("Invalid %s request body: %s", self.codec.name, exc)
+            raise HTTPException(status_code=400, detail="Invalid compressed body")
+
+
+class CompressingSender:
+    """Sends the response of the app compressed with the codec, if it is worth it."""
+
+    def __init__(self, send, codec: type[Codec]):
+        self.send = send
+        self.codec = codec
+        self.start = None
+        self.compressor = None
+        self.passthrough = False
+
+    async def __call__(self, message):
+        if self.passthrough:
+            return await self.send(message)
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message.get("headers", []))
+            content_type = headers.get("content-type", "")
+            # Ranges are of the content as stored, they are sent as they are.
+            if (
+                message["status"] == 206
+                or "content-encoding" in headers
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+            ):
+                self.passthrough = True
+                return await self.send(message)
+            # Held back until the first part of the body shows whether to compress.
+            self.start = message
+        elif message["type"] != "http.response.body":
+            await self.send(message)
+        elif self.compressor is None:
+            await self._send_first(message.get("body", b""), message.get("more_body", False))
+        else:
+            await self._send_compressed(message.get("body", b""), message.get("more_body", False))
+
+    async def _send_first(self, body: bytes, more_body: bool):
+        headers = MutableHeaders(raw=self.start.setdefault("headers", []))
+        headers.add_vary_header("Accept-Encoding")
+        if not more_body and len(body) < settings.compression_min_size:
+            self.passthrough = True
+            await self.send(self.start)
+            return await self.send({"type": "http.response.body", "body": body})
+        self.compressor = self.codec()
+        headers["Content-Encoding"] = self.codec.name
+        # Ranges of the compressed body could not be served.
+        del headers["Accept-Ranges"]
+        if more_body:
+            # The length of a streamed body is not known until it ends.
+            del headers["Content-Length"]
+            await self.send(self.start)
+            return await self._send_compressed(body, more_body)
+        body = await _offloaded(self._compress_all, body)
+        headers["Content-Length"] = str(len(body))
+        await self.send(self.start)
+        await self.send({"type": "http.response.body", "body": body})
+
+    async def _send_compressed(self, body: bytes, more_body: bool):
+        if body:
+            body = await _offloaded(self.compressor.compress, body)
+        if not more_body:
+            body += self.compressor.finish()
+        if body or not more_body:
+            await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+    def _compress_all(self, body: bytes) -> bytes:
+        return self.compressor.compress(body) + self.compressor.finish()
@@ -1,13 +1,12 @@
-import httpx
-
 from enum import StrEnum
+from pathlib import Path
 from pydantic import PostgresDsn, HttpUrl, BaseModel
 from pydantic_settings import BaseSettings
 from typing import ClassVar
 
 
 class AuthSettings(BaseModel):
-    """Authentication settings retrieved from OIDC configuration URL.
+    """Authentication settings retrieved from OIDC configuration URL on startup.
 
     Attributes:
         authorization_endpoint: The OIDC authorization endpoint
@@ -25,33 +24,164 @@ class Settings(BaseSettings):
 
     Attributes:
         auth_openid_configuration_url: The URL of the OIDC configuration endpoint
-        auth: The authentication settings
+        auth_openid_configuration_cache: The file to keep the OIDC configuration in between restarts
+        auth_discovery_timeout: The number of seconds to wait for the OIDC configuration to load
+        auth_discovery_retries: The number of attempts to load the OIDC configuration
+        auth: The authentication settings, discovered from the OIDC configuration if not provided
+        auth_jwks_ttl: The number of seconds to reuse the JWKS if the provider does not specify it
+        auth_jwks_min_refresh_interval: The minimum number of seconds between JWKS reloads
+        auth_token_cache_size: The number of verified tokens to remember
+        auth_token_cache_ttl: The maximum number of seconds to remember a verified token
         database_uri: The URI of the PostgreSQL database
+        database_pool_size: The number of connections kept open in the pool of each worker
+        database_pool_max_overflow: The number of connections allowed to be opened above the pool size
+        database_pool_timeout: The number of seconds to wait for a connection to be available in the pool
+        database_pool_recycle: The age in seconds after which a connection is replaced, -1 to keep them forever
+        database_pool_pre_ping: Whether to test connections for liveness before handing them out
+        database_pgbouncer: Whether pooling is delegated to PgBouncer, disables the pool and prepared statements cache
+        database_replica_uris: The list of URIs of read replicas of the database
+        database_replica_selection: How a replica is chosen for a read: round_robin, least_connections
+        database_replica_retry_interval: The number of seconds a failed replica is not used
+        database_replica_stickiness: The number of seconds reads of a user go to the primary after their write
+        database_replica_writes_backend: Where recent writes of users are remembered: memory of each worker,
+            redis shared by workers
+        notes_page_size: The default number of notes returned by the list endpoint
+        notes_page_size_max: The maximum number of notes the list endpoint may be asked for
+        note_content_max_inline_size: The maximum number of bytes of UTF-8 encoded content kept with the note,
+            larger content is uploaded to the content endpoint of the note and stored in chunks
+        note_content_chunk_size: The number of bytes of content stored in each chunk
+        note_content_max_size: The maximum number of bytes of content uploaded to the content endpoint
+        note_cache_size: The number of notes each worker keeps in memory, 0 disables the in-process cache
+        note_cache_ttl: The number of seconds a note is kept in memory of a worker
+        note_cache_backend: The type of cache shared by workers: none, redis
+        note_cache_shared_ttl: The number of seconds a note is kept in the shared cache
+        redis_url: The URL of the Redis server of the shared cache, rate limits and replica writes
+        rate_limit_backend: Where token buckets of users are kept: memory of each worker, redis shared by workers
+        rate_limit_read_rate: The number of reads a second a user is allowed on average, 0 disables the limit
+        rate_limit_read_burst: The number of reads a user is allowed at once
+        rate_limit_write_rate: The number of writes a second a user is allowed on average, 0 disables the limit
+        rate_limit_write_burst: The number of writes a user is allowed at once
+        rate_limit_batch_rate: The number of batches a second a user is allowed on average, 0 disables the limit
+        rate_limit_batch_burst: The number of batches a user is allowed at once
+        rate_limit_concurrency: The number of concurrent requests of a user each worker handles, 0 disables the cap
         cors_allowed_origins: The list of allowed CORS origins
+        compression_encodings: The content encodings of responses in order of preference: zstd, br, gzip
+        compression_min_size: The number of bytes below which responses are sent uncompressed
+        compression_offload_size: The number of bytes above which responses are compressed outside the event loop
+        compression_request_max_size: The maximum number of bytes of a decompressed request body
+        json_fast_path: Whether note lists are encoded straight from database rows, skipping response validation
         log_format: The log format: default, json
+        metrics_token: The bearer token callers of the metrics endpoints must send, they are not served if not set
+        profiling_dir: The directory to write profiles of requests to, profiling is disabled if not set
+        profiling_sample_rate: The share of requests profiled without being asked for with the X-Profile header
+        profiling_token: The secret the X-Profile header must carry to have a request profiled, not offered if not set
+        profiling_max_files: The number of profiles kept in the directory, the oldest are deleted
+        tracing_exporter: The exporter of trace spans: none, console, otlp
+        tracing_otlp_endpoint: The URL of the OTLP HTTP endpoint receiving spans
+        tracing_sample_rate: The share of traces started by the app that are recorded
+        tracing_service_name: The service name spans are reported under
         event_producer: The type of event producer: none, stdout, kafka
+        event_queue_size: The number of events waiting to be produced above which new events are dropped
+        event_poll_interval: The number of seconds between producer polls when there are no events to produce
+        event_flush_timeout: The number of seconds to wait for pending events to be delivered on shutdown
+        event_outbox: Whether events are saved to the outbox table and published by the relay
+        outbox_batch_size: The number of events the relay publishes at once
+        outbox_poll_interval: The number of seconds the relay waits for new events when the outbox is empty
         kafka_client_id: The Kafka client ID
         kafka_bootstrap_servers: The Kafka bootstrap servers
         kafka_sasl_username: The Kafka username
         kafka_sasl_password: The Kafka password
+        kafka_linger_ms: The number of milliseconds to accumulate messages before sending a batch
+        kafka_batch_size: The maximum size of a message batch in bytes
+        kafka_compression_type: The compression codec of message batches: none, gzip, snappy, lz4, zstd
     """
     LogFormat: ClassVar = StrEnum("LogFormat", ["DEFAULT", "JSON"])
     EventProducer: ClassVar = StrEnum("EventProducer", ["NONE", "STDOUT", "KAFKA"])
+    ReplicaSelection: ClassVar = StrEnum("ReplicaSelection", ["ROUND_ROBIN", "LEAST_CONNECTIONS"])
+    TracingExporter: ClassVar = StrEnum("TracingExporter", ["NONE", "CONSOLE", "OTLP"])
+    CacheBackend: ClassVar = StrEnum("CacheBackend", ["NONE", "REDIS"])
+    RateLimitBackend: ClassVar = StrEnum("RateLimitBackend", ["MEMORY", "REDIS"])
+    ReplicaWritesBackend: ClassVar = StrEnum("ReplicaWritesBackend", ["MEMORY", "REDIS"])
 
     auth_openid_configuration_url: HttpUrl | None = None
+    auth_openid_configuration_cache: Path | None = None
+    auth_discovery_timeout: float = 5
+    auth_discovery_retries: int = 3
     auth: AuthSettings | None = None
+    auth_jwks_ttl: int = 3600
+    auth_jwks_min_refresh_interval: int = 60
+    auth_token_cache_size: int = 10000
+    auth_token_cache_ttl: int = 300
 
     database_uri: PostgresDsn
+    database_pool_size: int = 5
+    database_pool_max_overflow: int = 10
+    database_pool_timeout: float = 30
+    database_pool_recycle: int = -1
+    database_pool_pre_ping: bool = False
+    database_pgbouncer: bool = False
+    database_replica_uris: list[PostgresDsn] = []
+    database_replica_selection: ReplicaSelection = ReplicaSelection.ROUND_ROBIN
+    database_replica_retry_interval: float = 30
+    database_replica_stickiness: float = 5
+    database_replica_writes_backend: ReplicaWritesBackend = ReplicaWritesBackend.MEMORY
+
+    notes_page_size: int = 100
+    notes_page_size_max: int = 1000
+    note_content_max_inline_size: int = 1024 * 1024
+    note_content_chunk_size: int = 256 * 1024
+    note_content_max_size: int = 100 * 1024 * 1024
+    note_cache_size: int = 0
+    note_cache_ttl: float = 5
+    note_cache_backend: CacheBackend = CacheBackend.NONE
+    note_cache_shared_ttl: float = 60
+    redis_url: str | None = None
+
+    rate_limit_backend: RateLimitBackend = RateLimitBackend.MEMORY
+    rate_limit_read_rate: float = 50
+    rate_limit_read_burst: int = 100
+    rate_limit_write_rate: float = 10
+    rate_limit_write_burst: int = 50
+    rate_limit_batch_rate: float = 1
+    rate_limit_batch_burst: int = 10
+    rate_limit_concurrency: int = 10
 
     cors_allowed_origins: list[str] = ["*"]
 
+    compression_encodings: list[str] = ["zstd", "br", "gzip"]
+    compression_min_size: int = 1024
+    compression_offload_size: int = 65536
+    compression_request_max_size: int = 10 * 1024 * 1024
+
+    json_fast_path: bool = False
+
     log_format: LogFormat = LogFormat.DEFAULT
 
+    metrics_token: str | None = None
+    profiling_dir: Path | None = None
+    profiling_sample_rate: float = 0
+    profiling_token: str | None = None
+    profiling_max_files: int = 100
+
+    tracing_exporter: TracingExporter = TracingExporter.NONE
+    tracing_otlp_endpoint: str | None = None
+    tracing_sample_rate: float = 0.01
+    tracing_service_name: str = "nulland"
+
     event_producer: EventProducer = EventProducer.STDOUT
+    event_queue_size: int = 10000
+    event_poll_interval: float = 0.1
+    event_flush_timeout: float = 10
+    event_outbox: bool = False
+    outbox_batch_size: int = 100
+    outbox_poll_interval: float = 1
     kafka_client_id: str = "notes-service"
     kafka_bootstrap_servers: str | None = None
     kafka_sasl_username: str | None = None
     kafka_sasl_password: str | None = None
+    kafka_linger_ms: int = 5
+    kafka_batch_size: int = 1000000
+    kafka_compression_type: str = "none"
 
     def __hash__(self):
         return 0
@@ -60,6 +190,3 @@ class Settings(BaseSettings):
 settings = Settings()
 if not settings.auth:
     settings.auth = AuthSettings()
-    if settings.auth_openid_configuration_url:
-        oidc_conf = httpx.get(str(settings.auth_openid_configuration_url)).json()
-        settings.auth = AuthSettings(**oidc_conf)
@@ -1,48 +1,496 @@
 import uuid
 
-from sqlalchemy.orm import Session
+from collections.abc import AsyncIterator, Iterable
+from sqlalchemy import Row, Select, Text, Uuid
+from sqlalchemy import any_, bindparam, case, column, delete, false, func, insert, null, select, true, tuple_, union_all
+from sqlalchemy import update, values
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import NamedTuple
 
-from nulland.models.notes import Note
+from nulland.cache import get_note_cache
+from nulland.config import settings
+from nulland.crud import crud_outbox
+from nulland.db.session import replicas
+from nulland.models.notes import Note, NoteContentChunk, NoteTombstone, SEARCH_CONFIG, change_seq
 from nulland.schemas.auth import User
-from nulland.schemas.notes import NoteCreate, NoteUpdate
+from nulland.schemas.notes import Note as NoteSchema, NoteCreate, NoteCursor, NoteUpdate, NoteView
 
 
-def create_user_note(
+async def create_user_note(
     note: NoteCreate,
     user: User,
-    db: Session,
+    db: AsyncSession,
 ) -> Note:
     """Saves a note into the database."""
-    note_obj = Note(
-        id=uuid.uuid4(),
-        user_id=user.id,
-        **note.model_dump(),
-    )
-    db.add(note_obj)
-    db.commit()
-    db.refresh(note_obj)
+    await _lock_user_changes(user, db)
+    note_obj = await db.scalar(
+        insert(Note).values(
+            id=uuid.uuid4(),
+            user_id=user.id,
+            **note.model_dump(),
+        ).returning(Note)
+    )
+    await _record_events("created", [note_obj], db)
+    await db.commit()
+    await _after_commit(user, [])
     return note_obj
 
 
-def read_user_notes(user: User, db: Session) -> list[Note]:
-    """Retrieves all notes owned by the user."""
-    return db.query(Note).filter(Note.user_id == user.id).all()
+async def _after_commit(user: User, changed: list[uuid.UUID]) -> None:
+    """Lets the user read their committed changes, evicting changed notes from the cache and replica reads for a while."""
+    await replicas.record_write(user.id)
+    await get_note_cache().invalidate(user.id, changed)
+
+
+async def _lock_user_changes(user: User, db: AsyncSession) -> None:
+    """Serializes changes to the notes of the user until the end of the transaction.
+
+    Changes of a user draw their positions in the change feed under the lock, so they are committed in the order
+    of their positions and a client that has seen a position never misses a change before it.
+    """
+    await db.execute(select(func.pg_advisory_xact_lock(func.hashtextextended(user.id, 0))))
+
+
+async def _record_events(action: str, notes: Iterable[Note], db: AsyncSession) -> None:
+    """Saves events of the change in the same transaction if the outbox is enabled."""
+    if settings.event_outbox:
+        await crud_outbox.add_note_events(action, notes, db)
+
+
+def _user_notes_query(user: User, after: NoteCursor | None, view: NoteView, preview_length: int) -> Select:
+    """Builds the query of user's notes in creation order starting after the cursor.
+
+    Plain columns are selected instead of Note entities to skip ORM hydration of the listed notes.
+    Summary view selects only the columns of the summary, with the content cut to `preview_length` characters.
+    """
+    if view == NoteView.SUMMARY:
+        preview = func.left(Note.content, preview_length) if preview_length else null()
+        columns = [Note.id, Note.title, Note.created_at, preview.label("preview")]
+    else:
+        columns = [Note.id, Note.title, Note.content, Note.created_at, Note.updated_at, Note.version, Note.content_size]
+    query = select(*columns).where(Note.user_id == user.id)
+    if after is not None:
+        query = query.where(tuple_(Note.created_at, Note.id) > tuple_(after.created_at, after.id))
+    return query.order_by(Note.created_at, Note.id)
+
+
+async def read_user_notes(
+    user: User,
+    db: AsyncSession,
+    limit: int | None = None,
+    after: NoteCursor | None = None,
+    view: NoteView = NoteView.FULL,
+    preview_length: int = 0,
+) -> list:
+    """Retrieves notes owned by the user in creation order.
+
+    Returns rows of the view columns, at most `limit` of them positioned after the `after` cursor if those are given.
+    """
+    query = _user_notes_query(user, after, view, preview_length)
+    if limit is not None:
+        query = query.limit(limit)
+    return list(await db.execute(query))
+
+
+async def stream_user_notes(
+    user: User,
+    db: AsyncSession,
+    limit: int | None = None,
+    after: NoteCursor | None = None,
+    view: NoteView = NoteView.FULL,
+    preview_length: int = 0,
+    batch_size: int = 500,
+) -> AsyncIterator:
+    """Yields notes owned by the user in creation order, same as `read_user_notes` returns.
+
+    Rows are fetched from a server-side cursor in batches of `batch_size`,
+    so the whole result set is never held in memory at once.
+    """
+    query = _user_notes_query(user, after, view, preview_length).execution_options(yield_per=batch_size)
+    if limit is not None:
+        query = query.limit(limit)
+    async for note in await db.stream(query):
+        yield note
+
+
+async def read_user_note_changes(user: User, db: AsyncSession, since: int, limit: int) -> list:
+    """Retrieves changes to notes owned by the user after the `since` position of the change feed, in feed order.
+
+    Returns at most `limit` rows of the full view columns with `change_seq` and `deleted` flag,
+    the rows of deleted notes have only the id.
+    """
+    changed = (
+        select(
+            Note.id, Note.title, Note.content, Note.created_at, Note.updated_at, Note.version, Note.content_size,
+            Note.change_seq, false().label("deleted"),
+        )
+        .where(Note.user_id == user.id, Note.change_seq > since)
+        .order_by(Note.change_seq)
+        .limit(limit)
+    )
+    deleted = (
+        select(
+            NoteTombstone.id, null(), null(), null(), null(), null(), null(),
+            NoteTombstone.change_seq, true(),
+        )
+        .where(NoteTombstone.user_id == user.id, NoteTombstone.change_seq > since)
+        .order_by(NoteTombstone.change_seq)
+        .limit(limit)
+    )
+    # Each part is limited on its own first, so both are read from their indexes only as far as needed.
+    changes = union_all(changed, deleted).subquery()
+    return list(await db.execute(select(changes).order_by(changes.c.change_seq).limit(limit)))
 
 
-def get_user_note_by_id(note_id: uuid.UUID, user: User, db: Session) -> Note:
+async def search_user_notes(
+    query: str,
+    user: User,
+    db: AsyncSession,
+    limit: int,
+    offset: int = 0,
+) -> list:
+    """Finds notes owned by the user matching the web search style query, most relevant first.
+
+    Returns rows with id, title, created_at, rank and snippet of the content highlighting the matches.
+    """
+    ts_query = func.websearch_to_tsquery(SEARCH_CONFIG, query)
+    rank = func.ts_rank(Note.search_vector, ts_query)
+    # Snippets are expensive to build, so only the notes of the requested page get them.
+    page = (
+        select(Note.id, rank.label("rank"))
+        .where(Note.user_id == user.id, Note.search_vector.bool_op("@@")(ts_query))
+        .order_by(rank.desc(), Note.id)
+        .limit(limit)
+        .offset(offset)
+        .subquery()
+    )
+    snippet = func.ts_headline(SEARCH_CONFIG, Note.content, ts_query, "MaxFragments=2, MaxWords=20, MinWords=5")
+    return list(await db.execute(
+        select(Note.id, Note.title, Note.created_at, page.c.rank, snippet.label("snippet"))
+        .join(page, Note.id == page.c.id)
+        .order_by(page.c.rank.desc(), Note.id)
+    ))
+
+
+async def get_user_note_by_id(note_id: uuid.UUID, user: User, db: AsyncSession) -> Note | None:
     """Gets a single note by id owned by the user."""
-    return db.query(Note).filter(Note.id == note_id, Note.user_id == user.id).first()
+    return await db.scalar(select(Note).where(Note.id == note_id, Note.user_id == user.id))
+
+
+async def read_user_note(note_id: uuid.UUID, user: User, db: AsyncSession) -> NoteSchema | None:
+    """Gets a single note by id owned by the user through the note cache."""
+    return await get_note_cache().get(user.id, note_id, lambda: get_user_note_by_id(note_id, user, db))
+
+
+async def get_user_note_revision(note_id: uuid.UUID, user: User, db: AsyncSession) -> Row | NoteSchema | None:
+    """Gets the version and the modification time of a note owned by the user without loading the note itself.
+
+    A cached note is returned as is, it has both.
+    """
+    if (note := await get_note_cache().peek(user.id, note_id)) is not None:
+        return note
+    return (await db.execute(
+        select(Note.version, Note.updated_at).where(Note.id == note_id, Note.user_id == user.id)
+    )).first()
+
+
+async def get_user_notes_revision(user: User, db: AsyncSession) -> Row:
+    """Gets the position of the latest change to the notes owned by the user in the change feed, and their number.
+
+    Every change to the notes moves the position forward, in the order the changes are committed. Modification
+    times would not do, they are taken when a transaction starts, not when it commits.
+    """
+    return (await db.execute(select(
+        func.greatest(
+            select(func.max(Note.change_seq)).where(Note.user_id == user.id).scalar_subquery(),
+            select(func.max(NoteTombstone.change_seq)).where(NoteTombstone.user_id == user.id).scalar_subquery(),
+        ).label("change_seq"),
+        select(func.count()).select_from(Note).where(Note.user_id == user.id).scalar_subquery().label("count"),
+    ))).one()
+
+
+async def update_user_note(
+    note_id: uuid.UUID,
+    note: NoteUpdate,
+    user: User,
+    db: AsyncSession,
+    version: int | None = None,
+) -> Note | None:
+    """Saves changes to a note owned by the user into the database.
+
+    If `version` is given, the note is only updated when it is still at that version.
+    Returns the updated note or None if the user has no such note or it has a different version.
+    """
+    condition = [Note.id == note_id, Note.user_id == user.id]
+    if version is not None:
+        condition.append(Note.version == version)
+    values = note.model_dump(exclude_unset=True)
+    if not values:
+        return await db.scalar(select(Note).where(*condition))
+    if "content" in values:
+        values.update(content_id=None, content_size=None)
+    return await _update_note(condition, values, user, db)
+
+
+async def _update_note(condition: list, values: dict, user: User, db: AsyncSession) -> Note | None:
+    """Applies the values to the note matching the condition and commits, returns the note or None if none matched."""
+    await _lock_user_changes(user, db)
+    if "content_id" in values:
+        await _drop_content_chunks(condition, db)
+    db_note = await db.scalar(
+        update(Note).where(*condition).values(**values, **_revision_bump()).returning(Note)
+    )
+    if db_note is not None:
+        await _record_events("updated", [db_note], db)
+    await db.commit()
+    if db_note is not None:
+        await _after_commit(user, [db_note.id])
+    return db_note
+
 
+async def _drop_content_chunks(condition: list, db: AsyncSession) -> None:
+    """Deletes the chunks of the current content of the notes matching the condition, before it is replaced."""
+    await db.execute(
+        delete(NoteContentChunk)
+        .where(NoteContentChunk.note_id == Note.id, NoteContentChunk.content_id == Note.content_id, *condition)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _revision_bump() -> dict:
+    """Values of an update moving notes to their next revision."""
+    return {"updated_at": func.now(), "version": Note.version + 1, "change_seq": change_seq.next_value()}
+
+
+async def delete_user_note(note_id: uuid.UUID, user: User, db: AsyncSession) -> Note | None:
+    """Deletes a note owned by the user from the database.
+
+    Returns the deleted note or None if the user has no such note.
+    """
+    await _lock_user_changes(user, db)
+    db_note = await db.scalar(
+        delete(Note).where(Note.id == note_id, Note.user_id == user.id).returning(Note)
+    )
+    if db_note is not None:
+        await _bury_notes([db_note], user, db)
+        await _record_events("deleted", [db_note], db)
+    await db.commit()
+    if db_note is not None:
+        await _after_commit(user, [db_note.id])
+    return db_note
+
+
+async def get_user_note_content(note_id: uuid.UUID, user: User, db: AsyncSession) -> Row | None:
+    """Gets the content kept with a note owned by the user, or the id and the size of its content stored in chunks.
+
+    The row has the version and the modification time of the note too.
+    """
+    return (await db.execute(
+        select(Note.content, Note.content_id, Note.content_size, Note.version, Note.updated_at)
+        .where(Note.id == note_id, Note.user_id == user.id)
+    )).first()
+
+
+async def stream_note_content(content_id: uuid.UUID, start: int, end: int, db: AsyncSession) -> AsyncIterator[bytes]:
+    """Yields the bytes from `start` to `end` inclusive of the content stored in chunks, reading a chunk at a time.
+
+    If the content is replaced meanwhile, its chunks are gone and the stream ends early.
+    """
+    first = (
+        select(func.max(NoteContentChunk.offset))
+        .where(NoteContentChunk.content_id == content_id, NoteContentChunk.offset <= start)
+        .scalar_subquery()
+    )
+    query = (
+        select(NoteContentChunk.offset, NoteContentChunk.data)
+        .where(NoteContentChunk.content_id == content_id, NoteContentChunk.offset >= first, NoteContentChunk.offset <= end)
+        .order_by(NoteContentChunk.offset)
+        .execution_options(yield_per=1)
+    )
+    async for offset, data in await db.stream(query):
+        yield data[max(0, start - offset):end + 1 - offset]
+
+
+async def write_user_note_content(
+    note_id: uuid.UUID,
+    content: AsyncIterator[bytes],
+    user: User,
+    db: AsyncSession,
+    version: int | None = None,
+) -> Note | None:
+    """Replaces the content of a note owned by the user with UTF-8 encoded content read from the iterator.
+
+    Content of more than `note_content_max_inline_size` bytes is stored in chunks of `note_content_chunk_size` bytes,
+    each committed as it is read, so that neither memory nor a transaction holds all of it. The note is switched over
+    to the new content at the end. If `version` is given, the note is only updated when it is still at that version.
+    Returns the updated note or None if the user has no such note or it has a different version.
+    """
+    condition = [Note.id == note_id, Note.user_id == user.id]
+    exists = await db.scalar(select(Note.id).where(*condition)) is not None
+    # Ends the transaction of the check, which would otherwise stay open through an inline upload,
+    # and have the note updated at the time it started.
+    await db.commit()
+    if not exists:
+        return None
+    if version is not None:
+        condition.append(Note.version == version)
+    content_id = uuid.uuid4()
+    try:
+        inline, size = await _store_content(content, content_id, note_id, db)
+    except IntegrityError:
+        # The note was deleted during the upload, the chunks written so far went with it.
+        await db.rollback()
+        return None
+    except Exception:
+        await db.rollback()
+        await _delete_content_chunks(content_id, db)
+        raise
+
+    if inline is None:
+        values = {"content": "", "content_id": content_id, "content_size": size}
+    else:
+        values = {"content": inline, "content_id": None, "content_size": None}
+    db_note = await _update_note(condition, values, user, db)
+    if db_note is None and inline is None:
+        await _delete_content_chunks(content_id, db)
+    return db_note
+
+
+async def _store_content(
+    content: AsyncIterator[bytes],
+    content_id: uuid.UUID,
+    note_id: uuid.UUID,
+    db: AsyncSession,
+) -> tuple[str | None, int]:
+    """Reads the content, writing it in chunks once it is too long to be kept with the note.
 
-def update_note(db_note: Note, note: NoteUpdate, db: Session) -> None:
-    """Save changes to a note into the database."""
-    db.query(Note).filter(Note.id == db_note.id).update(note.model_dump(exclude_unset=True))
-    db.commit()
-    db.add(db_note)
-    db.refresh(db_note)
+    Returns the content to keep with the note, or None if it was written in chunks, and its size in bytes.
+    """
+    buffer = bytearray()
+    chunked = False
+    size = 0
+    async for data in content:
+        buffer += data
+        chunked = chunked or len(buffer) > settings.note_content_max_inline_size
+        while chunked and len(buffer) >= settings.note_content_chunk_size:
+            size = await _write_content_chunk(content_id, size, note_id, buffer[:settings.note_content_chunk_size], db)
+            del buffer[:settings.note_content_chunk_size]
+    if not chunked:
+        return buffer.decode(), len(buffer)
+    if buffer:
+        size = await _write_content_chunk(content_id, size, note_id, buffer, db)
+    return None, size
+
+
+async def _write_content_chunk(content_id: uuid.UUID, offset: int, note_id: uuid.UUID, data: bytes, db: AsyncSession) -> int:
+    """Commits a chunk of content starting at `offset`, returns the offset the next chunk starts at."""
+    await db.execute(insert(NoteContentChunk).values(content_id=content_id, offset=offset, note_id=note_id, data=bytes(data)))
+    await db.commit()
+    return offset + len(data)
+
+
+async def _delete_content_chunks(content_id: uuid.UUID, db: AsyncSession) -> None:
+    await db.execute(delete(NoteContentChunk).where(NoteContentChunk.content_id == content_id))
+    await db.commit()
+
+
+class NotesBatchResult(NamedTuple):
+    created: list[Note]
+    updated: dict[uuid.UUID, Note]
+    deleted: dict[uuid.UUID, Note]
+
+
+async def batch_user_notes(
+    creates: list[NoteCreate],
+    updates: dict[uuid.UUID, NoteUpdate],
+    deletes: list[uuid.UUID],
+    user: User,
+    db: AsyncSession,
+) -> NotesBatchResult:
+    """Creates, updates and deletes notes owned by the user in a single transaction.
+
+    Each kind of change is applied with one multi-row statement. Created notes are returned in the order given,
+    updated and deleted notes are mapped by id, missing ones are the notes the user does not have.
+    """
+    await _lock_user_changes(user, db)
+    # Updates leaving all fields unset change nothing, like an empty PATCH they return the note as it is.
+    kept = {note_id for note_id, note in updates.items() if note.title is None and note.content is None}
+    created = await _insert_user_notes(creates, user, db)
+    updated = await _update_user_notes({note_id: note for note_id, note in updates.items() if note_id not in kept}, user, db)
+    unchanged = await _read_user_notes_by_id(list(kept), user, db)
+    deleted = await _delete_user_notes(deletes, user, db)
+    await _record_events("created", created, db)
+    await _record_events("updated", updated.values(), db)
+    await _record_events("deleted", deleted.values(), db)
+    await db.commit()
+    await _after_commit(user, [*updated, *deleted])
+    return NotesBatchResult(created=created, updated={**updated, **unchanged}, deleted=deleted)
+
+
+async def _insert_user_notes(notes: list[NoteCreate], user: User, db: AsyncSession) -> list[Note]:
+    if not notes:
+        return []
+    rows = [{"id": uuid.uuid4(), "user_id": user.id, **note.model_dump()} for note in notes]
+    return list(await db.scalars(insert(Note).returning(Note, sort_by_parameter_order=True), rows))
+
+
+async def _update_user_notes(notes: dict[uuid.UUID, NoteUpdate], user: User, db: AsyncSession) -> dict[uuid.UUID, Note]:
+    if not notes:
+        return {}
+    # Fields left unset in an update are passed as NULL and keep their current value.
+    changes = values(
+        column("id", Uuid), column("title", Text), column("content", Text),
+        name="changes",
+    ).data([(note_id, note.title, note.content) for note_id, note in notes.items()])
+    replaced = [note_id for note_id, note in notes.items() if note.content is not None]
+    if replaced:
+        await _drop_content_chunks(
+            [Note.user_id == user.id, Note.id == any_(bindparam("replaced", replaced, type_=ARRAY(Uuid)))], db,
+        )
+    kept = changes.c.content.is_(None)
+    db_notes = await db.scalars(
+        update(Note)
+        .where(Note.id == changes.c.id, Note.user_id == user.id)
+        .values(
+            title=func.coalesce(changes.c.title, Note.title),
+            content=func.coalesce(changes.c.content, Note.content),
+            content_id=case((kept, Note.content_id), else_=null()),
+            content_size=case((kept, Note.content_size), else_=null()),
+            **_revision_bump(),
+        )
+        .returning(Note)
+        .execution_options(synchronize_session=False)
+    )
+    return {db_note.id: db_note for db_note in db_notes}
+
+
+async def _read_user_notes_by_id(note_ids: list[uuid.UUID], user: User, db: AsyncSession) -> dict[uuid.UUID, Note]:
+    if not note_ids:
+        return {}
+    db_notes = await db.scalars(
+        select(Note).where(Note.user_id == user.id, Note.id == any_(bindparam("note_ids", note_ids, type_=ARRAY(Uuid))))
+    )
+    return {db_note.id: db_note for db_note in db_notes}
+
+
+async def _delete_user_notes(note_ids: list[uuid.UUID], user: User, db: AsyncSession) -> dict[uuid.UUID, Note]:
+    if not note_ids:
+        return {}
+    db_notes = await db.scalars(
+        delete(Note)
+        .where(Note.user_id == user.id, Note.id == any_(bindparam("note_ids", note_ids, type_=ARRAY(Uuid))))
+        .returning(Note)
+        .execution_options(synchronize_session=False)
+    )
+    deleted = {db_note.id: db_note for db_note in db_notes}
+    await _bury_notes(deleted.values(), user, db)
+    return deleted
 
 
-def delete_note(db_note: Note, db: Session) -> None:
-    """Deletes a note from the database."""
-    db.query(Note).filter(Note.id == db_note.id).delete()
-    db.commit()
+async def _bury_notes(notes: Iterable[Note], user: User, db: AsyncSession) -> None:
+    """Leaves tombstones of deleted notes in the change feed."""
+    rows = [{"id": note.id, "user_id": user.id} for note in notes]
+    if rows:
+        await db.execute(insert(NoteTombstone), rows)
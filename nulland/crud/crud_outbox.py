@@ -0,0 +1,32 @@
+from collections.abc import Iterable
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from nulland.models.notes import Note
+from nulland.models.outbox import OutboxEvent
+from nulland.schemas.notes import NoteLog
+
+
+async def add_note_events(action: str, notes: Iterable[Note], db: AsyncSession) -> None:
+    """Adds events of the notes change to the outbox within the current transaction."""
+    rows = [
+        {"topic": "notes", "key": action, "value": NoteLog.model_validate(note).model_dump_json()}
+        for note in notes
+    ]
+    if rows:
+        await db.execute(insert(OutboxEvent), rows)
+
+
+def claim_events(limit: int, db: Session) -> list[OutboxEvent]:
+    """Locks the oldest events for publishing until the end of the transaction.
+
+    Events locked by other relays are skipped, so several of them can work concurrently.
+    """
+    query = select(OutboxEvent).order_by(OutboxEvent.id).limit(limit).with_for_update(skip_locked=True)
+    return list(db.scalars(query))
+
+
+def delete_events(events: Iterable[OutboxEvent], db: Session) -> None:
+    """Removes published events from the outbox."""
+    db.execute(delete(OutboxEvent).where(OutboxEvent.id.in_([event.id for event in events])))
@@ -9,3 +9,4 @@ Import base_class.Base instead.
 from .base_class import Base
 
 import nulland.models.notes
+import nulland.models.outbox
@@ -0,0 +1,51 @@
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from nulland.schemas.metrics import PoolStats
+
+
+class PoolMonitor:
+    """Collects usage statistics of the engine connection pool."""
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.connects = 0
+        self.checkouts = 0
+        self.invalidations = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "invalidate", self._on_invalidate)
+
+    def _on_connect(self, *_):
+        self.connects += 1
+
+    def _on_checkout(self, *_):
+        self.checkouts += 1
+
+    def _on_invalidate(self, *_):
+        self.invalidations += 1
+
+    def record_wait(self, seconds: float):
+        """Records the time spent waiting for a connection to be handed out."""
+        self.wait_time_total += seconds
+        self.wait_time_max = max(self.wait_time_max, seconds)
+
+    def stats(self) -> PoolStats:
+        # Pool size accessors are specific to QueuePool, NullPool keeps nothing to report.
+        def pool_value(name):
+            method = getattr(self.engine.pool, name, None)
+            return method() if method else None
+
+        return PoolStats(
+            size=pool_value("size"),
+            checked_in=pool_value("checkedin"),
+            checked_out=pool_value("checkedout"),
+            overflow=pool_value("overflow"),
+            connects=self.connects,
+            checkouts=self.checkouts,
+            invalidations=self.invalidations,
+            wait_time_total=self.wait_time_total,
+            wait_time_max=self.wait_time_max,
+        )
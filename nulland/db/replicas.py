@@ -0,0 +1,84 @@
+import itertools
+import logging
+import time
+
+from collections import OrderedDict
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from nulland.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class ReplicaSet:
+    """Chooses a read replica for queries of a user.
+
+    Replicas are taken in turns or by the fewest connections in use. A replica that fails is ejected
+    for `retry_interval` seconds. For `stickiness` seconds after a user's write their reads go to the primary,
+    so they see their own changes before replicas catch up. Writes are remembered by the current worker, and in
+    the `shared` cache backend if there is one, so that they are known to all workers.
+    """
+
+    def __init__(
+        self,
+        engines: list[AsyncEngine],
+        selection: str = settings.ReplicaSelection.ROUND_ROBIN,
+        retry_interval: float = 30,
+        stickiness: float = 5,
+        shared=None,
+    ):
+        self.engines = engines
+        self.selection = selection
+        self.retry_interval = retry_interval
+        self.stickiness = stickiness
+        self.shared = shared
+        self.ejected: dict[AsyncEngine, float] = {}
+        # Users by the time their reads may go to replicas again, in the order of their last write.
+        self.writes: OrderedDict[str, float] = OrderedDict()
+        self._turns = itertools.count()
+
+    async def choose(self, user_id: str) -> AsyncEngine | None:
+        """Returns the replica to read from, None if the primary must be used."""
+        now = time.monotonic()
+        healthy = [engine for engine in self.engines if self.ejected.get(engine, 0) <= now]
+        if not healthy or self.writes.get(user_id, 0) > now:
+            return None
+        if self.shared is not None and await self.shared.get(_write_key(user_id)) is not None:
+            return None
+        if self.selection == settings.ReplicaSelection.LEAST_CONNECTIONS:
+            return min(healthy, key=_connections_in_use)
+        return healthy[next(self._turns) % len(healthy)]
+
+    async def record_write(self, user_id: str):
+        """Sends the reads of the user to the primary for a while."""
+        if not self.engines:
+            return
+        now = time.monotonic()
+        self.writes[user_id] = now + self.stickiness
+        self.writes.move_to_end(user_id)
+        while self.writes and next(iter(self.writes.values())) <= now:
+            self.writes.popitem(last=False)
+        if self.shared is not None and self.stickiness > 0:
+            await self.shared.set(_write_key(user_id), b"1", self.stickiness)
+
+    def eject(self, engine: AsyncEngine):
+        """Stops choosing the replica for `retry_interval` seconds."""
+        self.ejected[engine] = time.monotonic() + self.retry_interval
+        logger.warning("Ejecting read replica %s for %s seconds", engine.url, self.retry_interval)
+
+    async def dispose(self):
+        for engine in self.engines:
+            await engine.dispose()
+        if self.shared is not None:
+            await self.shared.close()
+
+
+def _write_key(user_id: str) -> str:
+    return f"replica-write:{user_id}"
+
+
+def _connections_in_use(engine: AsyncEngine) -> int:
+    # Pools without connection accounting, like NullPool, count as idle.
+    checkedout = getattr(engine.pool, "checkedout", None)
+    return checkedout() if checkedout else 0
@@ -1,20 +1,130 @@
+import logging
+import time
+
+from fastapi import Depends
 from sqlalchemy import create_engine
+from sqlalchemy import NullPool
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.orm import sessionmaker
+from typing import Annotated
 
-from ._base import Base
+from .metrics import PoolMonitor
+from .replicas import ReplicaSet
+from nulland.auth import get_current_user
 from nulland.config import settings
+from nulland.prometheus import time_statements
+from nulland.schemas.auth import User
+
+
+logger = logging.getLogger(__name__)
+
+
+def _pool_options() -> dict:
+    """Builds engine connection pool arguments from the settings."""
+    if settings.database_pgbouncer:
+        return {"poolclass": NullPool}
+    return {
+        "pool_size": settings.database_pool_size,
+        "max_overflow": settings.database_pool_max_overflow,
+        "pool_timeout": settings.database_pool_timeout,
+        "pool_recycle": settings.database_pool_recycle,
+        "pool_pre_ping": settings.database_pool_pre_ping,
+    }
+
 
+def _async_database_url(uri):
+    url = make_url(str(uri)).set(drivername="postgresql+asyncpg")
+    if settings.database_pgbouncer:
+        # Prepared statements do not survive PgBouncer handing the server connection over to another client.
+        url = url.update_query_dict({"prepared_statement_cache_size": "0"})
+    return url
 
-engine = create_engine(str(settings.database_uri))
+
+# Synchronous engine for tools and scripts running outside of the event loop.
+engine = create_engine(str(settings.database_uri), **_pool_options())
 SessionLocal = sessionmaker(autoflush=False, bind=engine)
 
 
-def init_db():
-    """Applies all migrations to initialize new database."""
-    Base.metadata.create_all(engine)
+def _create_async_engine(uri):
+    async_engine = create_async_engine(
+        _async_database_url(uri),
+        connect_args={"statement_cache_size": 0} if settings.database_pgbouncer else {},
+        **_pool_options(),
+    )
+    time_statements(async_engine.sync_engine)
+    return async_engine
+
+
+def _replica_writes_backend():
+    """Returns the cache backend sharing recent writes of users between workers, None to keep them in the worker."""
+    if settings.database_replica_writes_backend == settings.ReplicaWritesBackend.REDIS:
+        from nulland.cache import redis
+
+        return redis.Backend()
+    return None
+
+
+async_engine = _create_async_engine(settings.database_uri)
+# Objects are not expired on commit as attributes can not be lazily reloaded outside of an awaitable call.
+AsyncSessionLocal = async_sessionmaker(autoflush=False, expire_on_commit=False, bind=async_engine)
+pool_monitor = PoolMonitor(async_engine.sync_engine)
+replicas = ReplicaSet(
+    [_create_async_engine(uri) for uri in settings.database_replica_uris],
+    selection=settings.database_replica_selection,
+    retry_interval=settings.database_replica_retry_interval,
+    stickiness=settings.database_replica_stickiness,
+    shared=_replica_writes_backend(),
+)
 
 
-def get_db():
+def dispose_after_fork():
+    """Drops connections a forked worker process inherited from its parent, without closing them for the parent.
+
+    Needed when the app is loaded before workers are forked, connections must never be shared between processes.
+    """
+    for pooled in [engine, async_engine.sync_engine, *(replica.sync_engine for replica in replicas.engines)]:
+        pooled.dispose(close=False)
+
+
+async def close_db():
+    """Closes all pooled database connections."""
+    await async_engine.dispose()
+    await replicas.dispose()
+
+
+async def _connect(db: AsyncSession):
+    started = time.perf_counter()
+    await db.connection()
+    pool_monitor.record_wait(time.perf_counter() - started)
+
+
+async def get_db():
     """Creates a new session for each request."""
-    with SessionLocal() as db:
+    async with AsyncSessionLocal() as db:
+        await _connect(db)
+        yield db
+
+
+async def get_read_db(user: Annotated[User, Depends(get_current_user)]):
+    """Creates a new session for a request that only reads, connected to a replica if there is one available.
+
+    Falls back to the primary when all replicas are ejected, the user has just written or the replica fails to connect.
+    """
+    replica = await replicas.choose(user.id)
+    if replica is not None:
+        async with AsyncSessionLocal(bind=replica) as db:
+            try:
+                await db.connection()
+            except (DBAPIError, OSError) as exc:
+                logger.warning("Failed to connect to read replica: %s", exc)
+                replicas.eject(replica)
+            else:
+                yield db
+                return
+    async with AsyncSessionLocal() as db:
+        await _connect(db)
         yield db
@@ -1,30 +1,143 @@
+import logging
+import queue
+import threading
+
 from functools import lru_cache
 
+from nulland import prometheus
 from nulland.config import settings
-from nulland.events import none, stdout, kafka
+from nulland.events import none, stdout
 from nulland.models.notes import Note
+from nulland.schemas.metrics import EventStats
 from nulland.schemas.notes import NoteLog
+from nulland.tracing import inject_headers, tracer
+
+
+logger = logging.getLogger(__name__)
 
 
 class Producer:
-    def produce(self, topic, key, value):
+    def produce(self, topic, key, value, headers=None):
         pass
 
+    def poll(self, timeout):
+        return 0
+
+    def flush(self, timeout):
+        return 0
+
 
 class EventEmmiter:
-    def __init__(self, producer: Producer):
+    """Passes note events to the producer from a background dispatcher thread.
+
+    Events are put into a bounded queue without blocking the request, when the queue is full they are dropped.
+    Until the dispatcher is started events are produced right away.
+    """
+    _STOP = object()
+
+    def __init__(self, producer: Producer, queue_size: int = 0, poll_interval: float = 0.1):
         self.producer = producer
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.poll_interval = poll_interval
+        self.emitted = 0
+        self.dropped = 0
+        self._dispatcher: threading.Thread | None = None
 
+    @prometheus.event_emit_duration.time()
     def emit(self, action: str, note: Note):
-        self.producer.produce("notes", action, NoteLog.model_validate(note).model_dump_json())
+        with tracer.start_as_current_span("events.emit", attributes={"event.action": action}):
+            event = NoteLog.model_validate(note)
+            # The trace context is captured here, as the event is produced later from the dispatcher thread.
+            headers = inject_headers()
+        if self._dispatcher is None:
+            self._produce(action, event, headers)
+            return
+        try:
+            self.queue.put_nowait((action, event, headers))
+        except queue.Full:
+            self._drop()
+            logger.warning("Event queue is full, dropping %s event of note %s", action, event.id)
+        prometheus.event_queue_length.set(self.queue.qsize())
+
+    def start(self):
+        """Starts the dispatcher thread."""
+        if self._dispatcher is not None:
+            return
+        self._dispatcher = threading.Thread(target=self._dispatch, name="event-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    def close(self, timeout: float):
+        """Stops the dispatcher after it produces all queued events and waits for their delivery."""
+        if self._dispatcher is not None:
+            try:
+                self.queue.put(self._STOP, timeout=timeout)
+            except queue.Full:
+                logger.error("Event dispatcher is stuck, %d events are lost", self.queue.qsize())
+            self._dispatcher.join(timeout)
+            self._dispatcher = None
+        if pending := self.producer.flush(timeout):
+            logger.error("%d events were not delivered before shutdown", pending)
+
+    def stats(self) -> EventStats:
+        return EventStats(
+            queued=self.queue.qsize(),
+            queue_size=self.queue.maxsize,
+            emitted=self.emitted,
+            dropped=self.dropped,
+            failed=getattr(self.producer, "failed", 0),
+        )
+
+    def _dispatch(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=self.poll_interval)
+            except queue.Empty:
+                self.producer.poll(0)
+                continue
+            if item is self._STOP:
+                return
+            prometheus.event_queue_length.set(self.queue.qsize())
+            self._produce(*item)
+            self.producer.poll(0)
+
+    def _produce(self, action: str, event: NoteLog, headers: dict[str, str]):
+        value = event.model_dump_json()
+        try:
+            self.producer.produce("notes", action, value, headers)
+        except BufferError:
+            # The producer queue is full, wait for some of the messages to be delivered and retry once.
+            self.producer.poll(1)
+            try:
+                self.producer.produce("notes", action, value, headers)
+            except BufferError:
+                self._drop()
+                logger.error("Producer queue is full, dropping %s event of note %s", action, event.id)
+                return
+        except Exception as exc:
+            self._drop()
+            logger.error("Failed to produce %s event of note %s: %s", action, event.id, exc)
+            return
+        self.emitted += 1
+        prometheus.events.labels(outcome="emitted").inc()
+
+    def _drop(self):
+        self.dropped += 1
+        prometheus.events.labels(outcome="dropped").inc()
+
+
+def get_producer() -> Producer:
+    if settings.event_producer == settings.EventProducer.KAFKA:
+        # Imported only when configured, the client library takes long to import.
+        from nulland.events import kafka
+
+        return kafka.Producer()
+    if settings.event_producer == settings.EventProducer.STDOUT:
+        return stdout.Producer()
+    return none.Producer()
 
 
 @lru_cache
 def get_emitter():
-    if settings.event_producer == settings.EventProducer.KAFKA:
-        producer = kafka.Producer()
-    elif settings.event_producer == settings.EventProducer.STDOUT:
-        producer = stdout.Producer()
-    else:
-        producer = none.Producer()
-    return EventEmmiter(producer)
+    # With the outbox enabled events are saved along with the changes and published by the relay.
+    producer = none.Producer() if settings.event_outbox else get_producer()
+    return EventEmmiter(producer, queue_size=settings.event_queue_size, poll_interval=settings.event_poll_interval)
@@ -1,6 +1,7 @@
 import logging
 
 from confluent_kafka import Producer as KafkaProducer
+from nulland import prometheus
 from nulland.config import settings
 
 
@@ -15,6 +16,9 @@ class Producer:
         cfg = {
             "client.id": settings.kafka_client_id,
             "bootstrap.servers": settings.kafka_bootstrap_servers,
+            "linger.ms": settings.kafka_linger_ms,
+            "batch.size": settings.kafka_batch_size,
+            "compression.type": settings.kafka_compression_type,
         }
         if settings.kafka_sasl_username:
             cfg.update({
@@ -24,10 +28,25 @@ class Producer:
                 "sasl.password": settings.kafka_sasl_password,
             })
         self.producer = KafkaProducer(cfg)
+        self.failed = 0
 
-    def produce(self, topic, key, value):
-        self.producer.produce(topic, key=key, value=value, on_delivery=self.delivery_callback)
+    def produce(self, topic, key, value, headers=None):
+        """Queues the message for delivery, raises BufferError if the local queue is full.
+
+        Headers carry the trace context of the change to the consumers.
+        """
+        self.producer.produce(topic, key=key, value=value, headers=headers, on_delivery=self.delivery_callback)
+
+    def poll(self, timeout):
+        """Serves delivery callbacks of sent messages."""
+        return self.producer.poll(timeout)
+
+    def flush(self, timeout):
+        """Waits for all queued messages to be delivered, returns the number of those still pending."""
+        return self.producer.flush(timeout)
 
     def delivery_callback(self, err, _):
         if err:
+            self.failed += 1
+            prometheus.events.labels(outcome="failed").inc()
             logger.error(f"Kafka message delivery failed: {err}")
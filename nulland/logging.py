@@ -1,13 +1,13 @@
 import logging
 
-from pythonjsonlogger import jsonlogger
-
 from .config import settings
 
 
 def init_logging():
     log_handlers = None
     if settings.log_format == settings.LogFormat.JSON:
+        from pythonjsonlogger import jsonlogger
+
         handler = logging.StreamHandler()
         formatter = jsonlogger.JsonFormatter(
             "%(levelname)s %(name)s %(message)s",
@@ -2,20 +2,40 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI, status
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 
-from nulland.db.session import init_db
+from nulland.auth import discover_oidc, jwks_cache
+from nulland.cache import get_note_cache
+from nulland.db.session import async_engine, close_db, replicas
+from nulland.events import get_emitter
+from nulland.ratelimit import get_rate_limiter
 from nulland.routes import auth
+from nulland.routes import metrics
 from nulland.routes import notes
 from nulland.logging import init_logging
 from nulland.config import settings
+from nulland.compression import CompressionMiddleware
+from nulland.profiling import ProfilingMiddleware
+from nulland.prometheus import PrometheusMiddleware
+from nulland.tracing import TracingMiddleware, init_tracing, shutdown_tracing, trace_statements
 
 
 @asynccontextmanager
 async def lifespan(_: FastAPI):
-    """ Application startup initialization."""
+    """ Application startup initialization and shutdown cleanup."""
     init_logging()
-    init_db()
+    if init_tracing():
+        for engine in [async_engine, *replicas.engines]:
+            trace_statements(engine.sync_engine)
+    await discover_oidc()
+    await jwks_cache.prefetch()
+    get_emitter().start()
     yield
+    await run_in_threadpool(get_emitter().close, settings.event_flush_timeout)
+    await get_note_cache().close()
+    await get_rate_limiter().close()
+    await close_db()
+    shutdown_tracing()
 
 
 app = FastAPI(
@@ -33,8 +53,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[notes.NEXT_CURSOR_HEADER, "ETag", "Last-Modified", "Retry-After"],
 )
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(PrometheusMiddleware)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(ProfilingMiddleware)
 app.include_router(auth.router)
+app.include_router(metrics.router)
 app.include_router(notes.router)
 
 
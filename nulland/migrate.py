@@ -0,0 +1,24 @@
+"""Applies database migrations, bringing the schema up to date.
+
+Run it once before the app is started for the first time and after every upgrade,
+so that starting app workers never has to touch the schema:
+
+    python -m nulland.migrate
+"""
+from alembic import command
+from alembic.config import Config
+from pathlib import Path
+
+
+ALEMBIC_CONFIG = Path(__file__).resolve().parent.parent / "alembic.ini"
+
+
+def migrate(revision: str = "head"):
+    config = Config(str(ALEMBIC_CONFIG))
+    # Migration scripts are found next to the config, wherever the command is run from.
+    config.set_main_option("script_location", str(ALEMBIC_CONFIG.parent / "alembic"))
+    command.upgrade(config, revision)
+
+
+if __name__ == "__main__":
+    migrate()
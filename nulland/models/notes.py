@@ -1,7 +1,14 @@
 from uuid import UUID
 from datetime import datetime
 
+from sqlalchemy import BigInteger
+from sqlalchemy import Computed
+from sqlalchemy import ForeignKey
+from sqlalchemy import Index
+from sqlalchemy import LargeBinary
+from sqlalchemy import Sequence
 from sqlalchemy import Text
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
 from sqlalchemy.sql import func
@@ -9,11 +16,71 @@ from sqlalchemy.sql import func
 from nulland.db.base_class import Base
 
 
+# Text search configuration of the notes, language-agnostic as notes may be written in any language.
+SEARCH_CONFIG = "simple"
+# Only the beginning of the content is searched, the text search vector of a whole note could exceed its 1 MB limit.
+SEARCH_CONTENT_LENGTH = 100000
+
+# Orders all changes to the notes, whether they are creates, updates or deletes.
+change_seq = Sequence("note_change_seq")
+
+
 class Note(Base):
     __tablename__ = "notes"
+    __table_args__ = (
+        # Serves both the ownership filter and keyset pagination in creation order.
+        Index("ix_notes_user_id_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_notes_search_vector", "search_vector", postgresql_using="gin"),
+        # Serves the change feed, and the latest change of the user's notes that entity tags of the list are made of.
+        Index("ix_notes_user_id_change_seq", "user_id", "change_seq"),
+    )
 
     id: Mapped[UUID] = mapped_column(primary_key=True)
-    user_id: Mapped[str] = mapped_column(index=True)
+    user_id: Mapped[str]
     title: Mapped[str] = mapped_column(Text)
     content: Mapped[str] = mapped_column(Text)
+    # Content too large to be kept with the note is stored in chunks under this id, `content` is empty then.
+    content_id: Mapped[UUID | None]
+    # The size of the content stored in chunks in bytes.
+    content_size: Mapped[int | None] = mapped_column(BigInteger)
     created_at: Mapped[datetime] = mapped_column(server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(server_default=func.now())
+    # Incremented on every update, identifies the revision of the note in entity tags.
+    version: Mapped[int] = mapped_column(server_default="1")
+    # Position of the latest change of the note in the change feed, drawn anew on every update.
+    change_seq: Mapped[int] = mapped_column(BigInteger, change_seq, server_default=change_seq.next_value())
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed(
+            f"to_tsvector('{SEARCH_CONFIG}', title || ' ' || left(content, {SEARCH_CONTENT_LENGTH}))",
+            persisted=True,
+        ),
+        deferred=True,
+    )
+
+
+class NoteTombstone(Base):
+    """Trace of a deleted note, kept so clients syncing changes learn about the delete."""
+    __tablename__ = "note_tombstones"
+    __table_args__ = (
+        Index("ix_note_tombstones_user_id_change_seq", "user_id", "change_seq"),
+    )
+
+    id: Mapped[UUID] = mapped_column(primary_key=True)
+    user_id: Mapped[str]
+    change_seq: Mapped[int] = mapped_column(BigInteger, change_seq, server_default=change_seq.next_value())
+    deleted_at: Mapped[datetime] = mapped_column(server_default=func.now())
+
+
+class NoteContentChunk(Base):
+    """Part of the content of a note stored in chunks, starting at `offset` byte of the UTF-8 encoded content."""
+    __tablename__ = "note_content_chunks"
+    __table_args__ = (
+        Index("ix_note_content_chunks_note_id", "note_id"),
+    )
+
+    content_id: Mapped[UUID] = mapped_column(primary_key=True)
+    offset: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    # Chunks go away with their note, including those of an upload still in progress.
+    note_id: Mapped[UUID] = mapped_column(ForeignKey("notes.id", ondelete="CASCADE"))
+    data: Mapped[bytes] = mapped_column(LargeBinary)
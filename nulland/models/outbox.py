@@ -0,0 +1,21 @@
+from datetime import datetime
+
+from sqlalchemy import BigInteger
+from sqlalchemy import Identity
+from sqlalchemy import Text
+from sqlalchemy.orm import Mapped
+from sqlalchemy.orm import mapped_column
+from sqlalchemy.sql import func
+
+from nulland.db.base_class import Base
+
+
+class OutboxEvent(Base):
+    """Event saved together with the change it describes, waiting to be published by the relay."""
+    __tablename__ = "outbox"
+
+    id: Mapped[int] = mapped_column(BigInteger, Identity(), primary_key=True)
+    topic: Mapped[str]
+    key: Mapped[str]
+    value: Mapped[str] = mapped_column(Text)
+    created_at: Mapped[datetime] = mapped_column(server_default=func.now())
@@ -0,0 +1,73 @@
+import cProfile
+import datetime
+import hmac
+import logging
+import random
+import re
+import uuid
+
+from starlette.concurrency import run_in_threadpool
+
+from nulland.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-Profile"
+
+
+class ProfilingMiddleware:
+    """Profiles requests asked for with `profiling_token` in the X-Profile header, or sampled at `profiling_sample_rate`.
+
+    Does nothing unless `profiling_dir` is set. Profiles are written there in pstats format, the file name is
+    returned in the X-Profile response header. Only the latest `profiling_max_files` profiles are kept.
+    The profiler sees everything running on the event loop, so one request is profiled at a time and others
+    are best kept off the worker meanwhile.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.profiling = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or settings.profiling_dir is None or self.profiling or not self._wanted(scope):
+            return await self.app(scope, receive, send)
+        path = re.sub(r"[^A-Za-z0-9]+", "-", scope["path"]).strip("-")
+        name = f"{datetime.datetime.now():%Y%m%dT%H%M%S.%f}-{scope['method']}-{path}-{uuid.uuid4().hex[:8]}.prof"
+
+        async def send_named(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", []).append((PROFILE_HEADER.lower().encode(), name.encode()))
+            await send(message)
+
+        profiler = cProfile.Profile()
+        self.profiling = True
+        try:
+            profiler.enable()
+            try:
+                await self.app(scope, receive, send_named)
+            finally:
+                profiler.disable()
+        finally:
+            self.profiling = False
+        await run_in_threadpool(self._write, profiler, name)
+        logger.info("Profile of %s %s written to %s", scope["method"], scope["path"], name)
+
+    @staticmethod
+    def _wanted(scope) -> bool:
+        if settings.profiling_token:
+            token = settings.profiling_token.encode()
+            for key, value in scope["headers"]:
+                if key == PROFILE_HEADER.lower().encode() and hmac.compare_digest(value, token):
+                    return True
+        return random.random() < settings.profiling_sample_rate
+
+    @staticmethod
+    def _write(profiler: cProfile.Profile, name: str):
+        """Writes the profile, deleting the oldest ones beyond `profiling_max_files`."""
+        settings.profiling_dir.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(settings.profiling_dir / name)
+        # Names start with the time, they sort oldest first.
+        profiles = sorted(settings.profiling_dir.glob("*.prof"))
+        for path in profiles[:max(0, len(profiles) - settings.profiling_max_files)]:
+            path.unlink(missing_ok=True)
@@ -0,0 +1,127 @@
+import os
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST
+from prometheus_client import REGISTRY
+from prometheus_client import CollectorRegistry
+from prometheus_client import Counter
+from prometheus_client import Gauge
+from prometheus_client import Histogram
+from prometheus_client import generate_latest
+from prometheus_client import multiprocess
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# Metrics are kept in files shared by worker processes when PROMETHEUS_MULTIPROC_DIR is set,
+# which it must be before this module is imported.
+request_duration = Histogram(
+    "nulland_http_request_duration_seconds",
+    "Time to handle a request until the last byte of the response is sent.",
+    ["method", "route", "status"],
+)
+statement_duration = Histogram(
+    "nulland_db_statement_duration_seconds",
+    "Time to execute a database statement.",
+    ["operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+token_verification_duration = Histogram(
+    "nulland_auth_token_verification_duration_seconds",
+    "Time to verify the signature of an auth token, including getting the key.",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1),
+)
+token_cache_requests = Counter(
+    "nulland_auth_token_cache_requests_total",
+    "Lookups of auth tokens among verified ones.",
+    ["result"],
+)
+jwks_cache_requests = Counter(
+    "nulland_auth_jwks_cache_requests_total",
+    "Lookups of signing keys, a miss waits for the JWKS to be loaded.",
+    ["result"],
+)
+rate_limit_requests = Counter(
+    "nulland_rate_limit_requests_total",
+    "Requests checked against the limits of their user, by class of routes and result.",
+    ["route_class", "result"],
+)
+event_emit_duration = Histogram(
+    "nulland_event_emit_duration_seconds",
+    "Time to hand a note event over to the dispatcher.",
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.1),
+)
+events = Counter(
+    "nulland_events_total",
+    "Note events by what happened to them: emitted, dropped or failed.",
+    ["outcome"],
+)
+event_queue_length = Gauge(
+    "nulland_event_queue_length",
+    "The number of events waiting to be produced.",
+    multiprocess_mode="livesum",
+)
+
+
+class PrometheusMiddleware:
+    """Observes the duration of requests by method, route template and status code.
+
+    Unlike an HTTP middleware it sees the end of streamed responses.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_observed(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_observed)
+        finally:
+            # The route is set on the scope by the router, templates keep the number of series bounded.
+            route = scope.get("route")
+            request_duration.labels(
+                method=scope["method"],
+                route=route.path if route is not None else "",
+                status=status_code,
+            ).observe(time.perf_counter() - started)
+
+
+# Statements of other kinds, like transaction control, are all counted as OTHER.
+_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH"}
+
+
+def time_statements(engine: Engine):
+    """Observes the execution time of every statement of the engine."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    words = statement.split(None, 1)
+    operation = words[0].upper() if words else ""
+    if operation not in _OPERATIONS:
+        operation = "OTHER"
+    statement_duration.labels(operation=operation).observe(time.perf_counter() - context._started)
+
+
+def render() -> tuple[bytes, str]:
+    """Renders metrics of all workers in the text exposition format, returns them with the content type."""
+    registry = REGISTRY
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,115 @@
+import math
+
+from enum import StrEnum
+from fastapi import Depends, HTTPException, status
+from functools import lru_cache
+from typing import Annotated
+
+from nulland import prometheus
+from nulland.auth import get_current_user
+from nulland.config import settings
+from nulland.ratelimit import memory
+from nulland.schemas.auth import User
+
+
+class RouteClass(StrEnum):
+    READ = "read"
+    WRITE = "write"
+    BATCH = "batch"
+
+
+class Backend:
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        """Takes a token from the bucket, returns 0 if there was one, or else the number of seconds until there is."""
+        return 0.0
+
+    async def close(self):
+        pass
+
+
+class RateLimiter:
+    """Limits the requests of each user with a token bucket for every class of routes, and caps concurrent requests.
+
+    A bucket of a user holds at most `burst` tokens and refills at `rate` tokens a second, every request takes one.
+    Concurrent requests are counted in the worker, which is what the database pool they compete for belongs to.
+    """
+
+    def __init__(self, backend: Backend, limits: dict[RouteClass, tuple[float, int]], concurrency: int):
+        self.backend = backend
+        self.limits = limits
+        self.concurrency = concurrency
+        self.active: dict[str, int] = {}
+
+    async def acquire(self, user_id: str, route_class: RouteClass):
+        """Admits a request of the user, raises 429 Too Many Requests if it is over the limits."""
+        if self.concurrency > 0 and self.active.get(user_id, 0) >= self.concurrency:
+            prometheus.rate_limit_requests.labels(route_class=route_class, result="concurrency_limited").inc()
+            raise self._too_many_requests(1)
+        # The slot is taken before waiting for the backend, so that concurrent requests see it.
+        self.active[user_id] = self.active.get(user_id, 0) + 1
+        rate, burst = self.limits[route_class]
+        if rate > 0:
+            try:
+                wait = await self.backend.take(f"{route_class}:{user_id}", rate, burst)
+            except BaseException:
+                self.release(user_id)
+                raise
+            if wait > 0:
+                self.release(user_id)
+                prometheus.rate_limit_requests.labels(route_class=route_class, result="rate_limited").inc()
+                raise self._too_many_requests(wait)
+        prometheus.rate_limit_requests.labels(route_class=route_class, result="allowed").inc()
+
+    def release(self, user_id: str):
+        """Marks an admitted request of the user as finished."""
+        if self.active[user_id] <= 1:
+            del self.active[user_id]
+        else:
+            self.active[user_id] -= 1
+
+    @staticmethod
+    def _too_many_requests(wait: float) -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests",
+            headers={"Retry-After": str(math.ceil(wait))},
+        )
+
+    async def close(self):
+        await self.backend.close()
+
+
+def get_backend() -> Backend:
+    if settings.rate_limit_backend == settings.RateLimitBackend.REDIS:
+        # The redis client is slow to import, most deployments never need it.
+        from nulland.ratelimit import redis
+
+        return redis.Backend()
+    return memory.Backend()
+
+
+@lru_cache
+def get_rate_limiter() -> RateLimiter:
+    return RateLimiter(
+        get_backend(),
+        limits={
+            RouteClass.READ: (settings.rate_limit_read_rate, settings.rate_limit_read_burst),
+            RouteClass.WRITE: (settings.rate_limit_write_rate, settings.rate_limit_write_burst),
+            RouteClass.BATCH: (settings.rate_limit_batch_rate, settings.rate_limit_batch_burst),
+        },
+        concurrency=settings.rate_limit_concurrency,
+    )
+
+
+def rate_limit(route_class: RouteClass):
+    """Returns the dependency admitting requests of the current user to routes of the class."""
+
+    async def dependency(user: Annotated[User, Depends(get_current_user)]):
+        limiter = get_rate_limiter()
+        await limiter.acquire(user.id, route_class)
+        try:
+            yield
+        finally:
+            limiter.release(user.id)
+
+    return dependency
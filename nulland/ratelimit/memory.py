@@ -0,0 +1,32 @@
+import time
+
+from collections import OrderedDict
+
+
+# Least recently used buckets beyond this number are forgotten, they have most likely refilled anyway.
+MAX_BUCKETS = 100000
+
+
+class Backend:
+    """Keeps token buckets in memory of the worker, each worker limits users on its own."""
+
+    def __init__(self):
+        self.buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        now = time.monotonic()
+        tokens, updated = self.buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        self.buckets[key] = (tokens, now)
+        self.buckets.move_to_end(key)
+        while len(self.buckets) > MAX_BUCKETS:
+            self.buckets.popitem(last=False)
+        return wait
+
+    async def close(self):
+        pass
@@ -0,0 +1,53 @@
+import logging
+
+from redis import RedisError
+from redis.asyncio import Redis
+
+from nulland.config import settings
+from nulland.ratelimit import memory
+
+
+logger = logging.getLogger(__name__)
+
+# Refills and takes a token atomically, with the clock of Redis shared by all workers.
+TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local time = redis.call("TIME")
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated")
+local tokens = math.min(burst, (tonumber(bucket[1]) or burst) + math.max(0, now - (tonumber(bucket[2]) or now)) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call("HSET", KEYS[1], "tokens", tokens, "updated", now)
+redis.call("PEXPIRE", KEYS[1], math.ceil(burst / rate * 1000))
+return tostring(wait)
+"""
+
+
+class Backend:
+    """Keeps token buckets in Redis, so that limits hold across all workers.
+
+    Rate limiting must not take the API down with Redis, so on Redis errors the worker limits users on its own.
+    """
+
+    def __init__(self):
+        if not settings.redis_url:
+            raise Exception("Redis URL not configured")
+        self.redis = Redis.from_url(settings.redis_url)
+        self.take_script = self.redis.register_script(TAKE_SCRIPT)
+        self.fallback = memory.Backend()
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        try:
+            return float(await self.take_script(keys=[f"ratelimit:{key}"], args=[rate, burst]))
+        except RedisError as exc:
+            logger.warning("Failed to take a token of %s from Redis: %s", key, exc)
+            return await self.fallback.take(key, rate, burst)
+
+    async def close(self):
+        await self.redis.aclose()
@@ -0,0 +1,65 @@
+"""Publishes events saved to the outbox table.
+
+Run as a separate process next to the app when EVENT_OUTBOX is enabled:
+
+    python -m nulland.relay
+
+Events are removed from the outbox only after the producer confirms their delivery,
+so each of them is published at least once.
+"""
+import logging
+import signal
+import threading
+
+from sqlalchemy.orm import Session
+
+from nulland.config import settings
+from nulland.crud import crud_outbox
+from nulland.db.session import SessionLocal
+from nulland.events import Producer, get_producer
+from nulland.logging import init_logging
+
+
+logger = logging.getLogger(__name__)
+
+
+def relay_events(producer: Producer, db: Session) -> int:
+    """Publishes a batch of events from the outbox, returns the number of published events."""
+    events = crud_outbox.claim_events(settings.outbox_batch_size, db)
+    if not events:
+        db.rollback()
+        return 0
+    failed = getattr(producer, "failed", 0)
+    for event in events:
+        producer.produce(event.topic, event.key, event.value)
+    pending = producer.flush(settings.event_flush_timeout)
+    if pending or getattr(producer, "failed", 0) != failed:
+        # Delivery is not confirmed for the whole batch, release it to be published again.
+        db.rollback()
+        raise RuntimeError(f"Failed to deliver {len(events)} events from the outbox")
+    crud_outbox.delete_events(events, db)
+    db.commit()
+    return len(events)
+
+
+def main():
+    init_logging()
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+    signal.signal(signal.SIGINT, lambda *_: stopped.set())
+
+    producer = get_producer()
+    logger.info("Relaying outbox events")
+    while not stopped.is_set():
+        try:
+            with SessionLocal() as db:
+                published = relay_events(producer, db)
+        except Exception as exc:
+            logger.error("Failed to relay events: %s", exc)
+            published = 0
+        if published < settings.outbox_batch_size:
+            stopped.wait(settings.outbox_poll_interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,5 @@
 import logging
 
-from authlib.integrations.httpx_client import AsyncOAuth2Client
 from fastapi import APIRouter, Depends
 from fastapi import HTTPException
 from fastapi import status
@@ -23,6 +22,9 @@ async def get_token(req: Annotated[TokenRequest, Depends()]):
     Since it is supposed that authentication and token aquiring will be fully managed by the external API user
     this endpoint exists only to support authentication for OpenAPI UI at /docs.
     """
+    # Imported on first use, the endpoint is called only from the docs.
+    from authlib.integrations.httpx_client import AsyncOAuth2Client
+
     async with AsyncOAuth2Client(
         client_id=req.client_id,
         client_secret=req.client_secret,
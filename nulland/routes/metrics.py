@@ -0,0 +1,56 @@
+import hmac
+
+from fastapi import APIRouter, Depends
+from fastapi import Header
+from fastapi import HTTPException
+from fastapi import Response
+from fastapi import status
+from typing import Annotated
+
+from nulland.cache import get_note_cache
+from nulland.db.session import pool_monitor
+from nulland import prometheus
+from nulland.config import settings
+from nulland.events import get_emitter
+from nulland.schemas.metrics import CacheStats, EventStats, PoolStats
+
+
+def verify_metrics_token(authorization: Annotated[str | None, Header(include_in_schema=False)] = None):
+    """Lets through callers sending `metrics_token` as a bearer token, the metrics are internal to operators."""
+    if not settings.metrics_token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), settings.metrics_token.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+router = APIRouter(dependencies=[Depends(verify_metrics_token)])
+
+
+@router.get("/metrics", include_in_schema=False)
+def read_metrics():
+    """Metrics of all worker processes in Prometheus text format."""
+    content, media_type = prometheus.render()
+    return Response(content, media_type=media_type)
+
+
+@router.get("/metrics/pool", response_model=PoolStats, include_in_schema=False)
+def read_pool_metrics():
+    """Database connection pool statistics of the current worker process."""
+    return pool_monitor.stats()
+
+
+@router.get("/metrics/events", response_model=EventStats, include_in_schema=False)
+def read_event_metrics():
+    """Event dispatcher statistics of the current worker process."""
+    return get_emitter().stats()
+
+
+@router.get("/metrics/cache", response_model=CacheStats, include_in_schema=False)
+def read_cache_metrics():
+    """Note cache statistics of the current worker process."""
+    return get_note_cache().stats()
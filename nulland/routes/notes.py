@@ -1,99 +1,512 @@
+import codecs
+import email.utils
+import hashlib
 import uuid
 
+from collections.abc import AsyncIterator
+from datetime import datetime, timezone
+
 from fastapi import APIRouter, Depends
+from fastapi import Header
 from fastapi import HTTPException
+from fastapi import Query
+from fastapi import Request
+from fastapi import Response
 from fastapi import status
-from sqlalchemy.orm import Session
+from fastapi.responses import JSONResponse
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Annotated
 
 from nulland.auth import get_current_user
+from nulland.compression import allow_body_size
+from nulland.config import settings
 from nulland.crud import crud_notes
-from nulland.db.session import get_db
+from nulland.db.session import get_db, get_read_db
 from nulland.events import get_emitter, EventEmmiter
+from nulland.ratelimit import RouteClass, rate_limit
 from nulland.schemas.auth import User
 from nulland.schemas.notes import Note
+from nulland.schemas.notes import NoteBatch
+from nulland.schemas.notes import NoteBatchCreate
+from nulland.schemas.notes import NoteBatchDelete
+from nulland.schemas.notes import NoteBatchResult
+from nulland.schemas.notes import NoteBatchUpdate
+from nulland.schemas.notes import NoteChanges
 from nulland.schemas.notes import NoteCreate
+from nulland.schemas.notes import NoteCursor
+from nulland.schemas.notes import NoteSearchResult
+from nulland.schemas.notes import NoteSummary
+from nulland.schemas.notes import NoteView
 from nulland.schemas.notes import NoteUpdate
 
 
 router = APIRouter()
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+TEXT_MEDIA_TYPE = "text/plain"
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _note_etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def _http_date(value: datetime) -> str:
+    # Times are stored without a time zone, in UTC.
+    return email.utils.format_datetime(value.replace(tzinfo=timezone.utc), usegmt=True)
+
+
+def _revision_headers(revision) -> dict[str, str]:
+    """Validators of a single note: its version as a strong entity tag and its modification time."""
+    return {"ETag": _note_etag(revision.version), "Last-Modified": _http_date(revision.updated_at)}
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """Compares the entity tags of an If-None-Match header to the etag, weakly as RFC 9110 requires."""
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+def _not_modified(revision, if_none_match: str | None, if_modified_since: str | None) -> bool:
+    """Evaluates conditional GET headers, If-None-Match takes precedence over If-Modified-Since."""
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, _note_etag(revision.version))
+    if if_modified_since is not None:
+        try:
+            since = email.utils.parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        # HTTP dates have a precision of a second.
+        return revision.updated_at.replace(tzinfo=timezone.utc, microsecond=0) <= since
+    return False
+
+
+def _if_match_version(if_match: str) -> int | None:
+    """Gets the note version an If-Match header requires, None for any version.
+
+    Raises 412 Precondition Failed if the header has no entity tag of a note.
+    """
+    for tag in if_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return None
+        # Weak tags never match under the strong comparison If-Match requires.
+        if tag.startswith('"') and tag.endswith('"') and tag[1:-1].isdigit():
+            return int(tag[1:-1])
+    raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="Note has changed")
+
+
+async def _update_failed(note_id: uuid.UUID, version: int | None, user: User, db: AsyncSession) -> HTTPException:
+    """Tells why a note was not updated: 412 if it is at another version than the one required, else 404."""
+    if version is not None and await crud_notes.get_user_note_revision(note_id, user, db=db) is not None:
+        return HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="Note has changed")
+    return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Note not found")
+
+
+def _byte_range(range_header: str, size: int) -> tuple[int, int] | None:
+    """Parses a Range header asking for a single range of bytes into the positions of its first and last byte.
+
+    Returns None for ranges that are ignored, in other units, malformed or multiple, the whole content is sent then.
+    Raises 416 Range Not Satisfiable if the range starts past the end of the content.
+    """
+    unit, _, spec = range_header.partition("=")
+    first, dash, last = spec.strip().partition("-")
+    if unit.strip().lower() != "bytes" or not dash or "," in spec:
+        return None
+    try:
+        if first:
+            start, end = int(first), min(int(last), size - 1) if last else size - 1
+        else:
+            # Suffix range, the last bytes of the content.
+            start, end = max(0, size - int(last)), size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, end
+
+
+async def _content_upload(request: Request) -> AsyncIterator[bytes]:
+    """Yields the request body as it arrives, checking that it is UTF-8 text within the size limit."""
+    allow_body_size(request.scope, settings.note_content_max_size)
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    size = 0
+    try:
+        async for data in request.stream():
+            size += len(data)
+            if size > settings.note_content_max_size:
+                raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Content too large")
+            decoder.decode(data)
+            # The database does not store NUL characters in text.
+            if b"\x00" in data:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Content contains NUL characters")
+            yield data
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Content is not UTF-8 text")
+
 
-@router.post("/notes", response_model=Note, status_code=status.HTTP_201_CREATED)
-def create_note(
+@router.post(
+    "/notes",
+    response_model=Note,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(rate_limit(RouteClass.WRITE))],
+)
+async def create_note(
     note: NoteCreate,
     user: Annotated[User, Depends(get_current_user)],
-    db: Annotated[Session, Depends(get_db)],
+    db: Annotated[AsyncSession, Depends(get_db)],
     events: Annotated[EventEmmiter, Depends(get_emitter)],
 ):
     """Create a note owned by the current user."""
-    db_note = crud_notes.create_user_note(note, user, db=db)
+    db_note = await crud_notes.create_user_note(note, user, db=db)
     events.emit("created", db_note)
     return db_note
 
 
-@router.get("/notes", response_model=list[Note])
-def read_notes(
+@router.post(
+    "/notes:batch",
+    response_model=list[NoteBatchResult],
+    dependencies=[Depends(rate_limit(RouteClass.BATCH))],
+)
+async def batch_notes(
+    batch: NoteBatch,
     user: Annotated[User, Depends(get_current_user)],
-    db: Session = Depends(get_db),
+    db: Annotated[AsyncSession, Depends(get_db)],
+    events: Annotated[EventEmmiter, Depends(get_emitter)],
 ):
-    """Get all notes owned by the current user."""
-    return crud_notes.read_user_notes(user, db=db)
+    """Create, update and delete multiple notes owned by the current user in a single transaction.
+
+    Results are returned in the order of operations, each with its own status code.
+    """
+    ops = batch.operations
+    outcome = await crud_notes.batch_user_notes(
+        creates=[op.note for op in ops if isinstance(op, NoteBatchCreate)],
+        updates={op.id: op.note for op in ops if isinstance(op, NoteBatchUpdate)},
+        deletes=[op.id for op in ops if isinstance(op, NoteBatchDelete)],
+        user=user,
+        db=db,
+    )
+    created = iter(outcome.created)
+    results = []
+    for op in ops:
+        if isinstance(op, NoteBatchCreate):
+            db_note = next(created)
+            events.emit("created", db_note)
+            results.append(NoteBatchResult(op=op.op, id=db_note.id, status=status.HTTP_201_CREATED, note=db_note))
+        elif op.id not in outcome.updated and op.id not in outcome.deleted:
+            results.append(NoteBatchResult(op=op.op, id=op.id, status=status.HTTP_404_NOT_FOUND))
+        elif isinstance(op, NoteBatchUpdate):
+            db_note = outcome.updated[op.id]
+            events.emit("updated", db_note)
+            results.append(NoteBatchResult(op=op.op, id=op.id, status=status.HTTP_200_OK, note=db_note))
+        else:
+            events.emit("deleted", outcome.deleted[op.id])
+            results.append(NoteBatchResult(op=op.op, id=op.id, status=status.HTTP_204_NO_CONTENT))
+    return results
+
+
+async def _ndjson_lines(notes, schema: type[Note | NoteSummary]):
+    async for note in notes:
+        yield schema.model_validate(note).model_dump_json() + "\n"
+
+
+class _RowsJSONResponse(JSONResponse):
+    """Encodes database rows with orjson, letting through value types of the driver it does not know, like asyncpg UUID."""
+
+    def render(self, content) -> bytes:
+        import orjson
+
+        return orjson.dumps(content, default=str)
+
+
+async def _ndjson_lines_fast(rows):
+    import orjson
+
+    async for row in rows:
+        yield orjson.dumps(row._asdict(), default=str) + b"\n"
+
+
+@router.get(
+    "/notes",
+    dependencies=[Depends(rate_limit(RouteClass.READ))],
+    response_model=list[Note] | list[NoteSummary],
+    responses={
+        status.HTTP_200_OK: {
+            "content": {NDJSON_MEDIA_TYPE: {}},
+            "headers": {NEXT_CURSOR_HEADER: {"description": "Cursor of the next page, absent on the last page"}},
+        },
+        status.HTTP_304_NOT_MODIFIED: {"description": "Notes have not changed since If-None-Match etag"},
+        status.HTTP_400_BAD_REQUEST: {"description": "Invalid cursor"},
+    },
+)
+async def read_notes(
+    user: Annotated[User, Depends(get_current_user)],
+    response: Response,
+    db: AsyncSession = Depends(get_read_db),
+    limit: Annotated[int | None, Query(ge=1, le=settings.notes_page_size_max)] = None,
+    cursor: Annotated[str | None, Query(description="The value of X-Next-Cursor header of the previous page")] = None,
+    view: Annotated[NoteView, Query(description="Summary view omits the content of notes")] = NoteView.FULL,
+    preview_length: Annotated[int, Query(ge=0, le=1000, description="The length of content preview in summary view")] = 0,
+    accept: Annotated[str | None, Header(include_in_schema=False)] = None,
+    if_none_match: Annotated[str | None, Header()] = None,
+):
+    """Get notes owned by the current user in creation order.
+
+    Notes are returned in pages, the cursor of the next page is passed in the X-Next-Cursor header.
+    Summary view returns only ids, titles and creation times of the notes, optionally with a preview of the content.
+
+    With `Accept: application/x-ndjson` notes are streamed one per line instead,
+    all of them unless the limit is given.
+
+    Responses carry an ETag of the notes, passing it back in If-None-Match returns 304 Not Modified
+    until any of the notes change.
+    """
+    after = None
+    if cursor is not None:
+        try:
+            after = NoteCursor.decode(cursor)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+    ndjson = bool(accept and NDJSON_MEDIA_TYPE in accept)
+    revision = await crud_notes.get_user_notes_revision(user, db=db)
+    # The representation depends on the notes and on everything in the request that shapes the response.
+    fingerprint = f"{revision.change_seq}:{revision.count}:{limit}:{cursor}:{view}:{preview_length}:{ndjson}"
+    headers = {"ETag": f'"{hashlib.sha256(fingerprint.encode()).hexdigest()[:32]}"'}
+    if if_none_match is not None and _etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    schema = NoteSummary if view == NoteView.SUMMARY else Note
+    if ndjson:
+        notes = crud_notes.stream_user_notes(
+            user, db=db, limit=limit, after=after, view=view, preview_length=preview_length,
+        )
+        lines = _ndjson_lines_fast(notes) if settings.json_fast_path else _ndjson_lines(notes, schema)
+        return StreamingResponse(lines, media_type=NDJSON_MEDIA_TYPE, headers=headers)
+
+    limit = limit or settings.notes_page_size
+    notes = await crud_notes.read_user_notes(
+        user, db=db, limit=limit + 1, after=after, view=view, preview_length=preview_length,
+    )
+    if len(notes) > limit:
+        notes = notes[:limit]
+        headers[NEXT_CURSOR_HEADER] = NoteCursor.model_validate(notes[-1]).encode()
+    if settings.json_fast_path:
+        # Rows come straight from the database in the shape of the schema, there is nothing to validate.
+        return _RowsJSONResponse([note._asdict() for note in notes], headers=headers)
+    response.headers.update(headers)
+    return [schema.model_validate(note) for note in notes]
+
+
+@router.get(
+    "/notes/changes",
+    response_model=NoteChanges,
+    dependencies=[Depends(rate_limit(RouteClass.READ))],
+)
+async def read_note_changes(
+    user: Annotated[User, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_read_db)],
+    since: Annotated[int, Query(ge=0, description="The token of the previous changes, 0 to get all notes")] = 0,
+    limit: Annotated[int, Query(ge=1, le=settings.notes_page_size_max)] = settings.notes_page_size,
+):
+    """Get changes to notes owned by the current user since the token, to keep a local copy of the notes in sync.
+
+    Returns notes created or updated since the token in their current state and ids of deleted notes,
+    with the token to pass next time. While `more` is true, the following changes can be requested right away.
+    """
+    changes = await crud_notes.read_user_note_changes(user, db=db, since=since, limit=limit + 1)
+    result = NoteChanges(notes=[], deleted=[], token=since, more=len(changes) > limit)
+    for change in changes[:limit]:
+        if change.deleted:
+            result.deleted.append(change.id)
+        else:
+            result.notes.append(Note.model_validate(change))
+        result.token = change.change_seq
+    return result
+
+
+@router.get(
+    "/notes/search",
+    response_model=list[NoteSearchResult],
+    dependencies=[Depends(rate_limit(RouteClass.READ))],
+)
+async def search_notes(
+    q: Annotated[str, Query(min_length=1, max_length=200, description="Words to search, supports quotes, OR and -")],
+    user: Annotated[User, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_read_db)],
+    limit: Annotated[int, Query(ge=1, le=settings.notes_page_size_max)] = settings.notes_page_size,
+    offset: Annotated[int, Query(ge=0)] = 0,
+):
+    """Search notes owned by the current user by title and content, most relevant first."""
+    return await crud_notes.search_user_notes(q, user, db=db, limit=limit, offset=offset)
 
 
 @router.get(
     "/notes/{note_id}",
-    responses={status.HTTP_404_NOT_FOUND: {"description": "Note not found"}},
+    dependencies=[Depends(rate_limit(RouteClass.READ))],
+    responses={
+        status.HTTP_304_NOT_MODIFIED: {"description": "Note has not changed"},
+        status.HTTP_404_NOT_FOUND: {"description": "Note not found"},
+    },
     response_model=Note,
 )
-def get_note(
+async def get_note(
     note_id: uuid.UUID,
     user: Annotated[User, Depends(get_current_user)],
-    db: Annotated[Session, Depends(get_db)],
+    response: Response,
+    db: Annotated[AsyncSession, Depends(get_read_db)],
+    if_none_match: Annotated[str | None, Header()] = None,
+    if_modified_since: Annotated[str | None, Header()] = None,
 ):
-    """Get single note by id."""
-    db_note = crud_notes.get_user_note_by_id(note_id, user, db=db)
+    """Get single note by id.
+
+    The note is returned with ETag and Last-Modified headers,
+    passing them back in If-None-Match or If-Modified-Since returns 304 Not Modified until the note changes.
+    """
+    if if_none_match is not None or if_modified_since is not None:
+        revision = await crud_notes.get_user_note_revision(note_id, user, db=db)
+        if revision is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Note not found")
+        if _not_modified(revision, if_none_match, if_modified_since):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=_revision_headers(revision))
+    db_note = await crud_notes.read_user_note(note_id, user, db=db)
     if db_note is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Note not found")
+    response.headers.update(_revision_headers(db_note))
     return db_note
 
 
 @router.patch(
     "/notes/{note_id}",
-    responses={status.HTTP_404_NOT_FOUND: {"description": "Note not found"}},
+    dependencies=[Depends(rate_limit(RouteClass.WRITE))],
+    responses={
+        status.HTTP_404_NOT_FOUND: {"description": "Note not found"},
+        status.HTTP_412_PRECONDITION_FAILED: {"description": "Note has changed since If-Match etag"},
+    },
     response_model=Note,
 )
-def update_note(
+async def update_note(
     note_id: uuid.UUID,
     note: NoteUpdate,
     user: Annotated[User, Depends(get_current_user)],
-    db: Annotated[Session, Depends(get_db)],
+    response: Response,
+    db: Annotated[AsyncSession, Depends(get_db)],
     events: Annotated[EventEmmiter, Depends(get_emitter)],
+    if_match: Annotated[str | None, Header()] = None,
 ):
-    """Update single note by id."""
-    db_note = crud_notes.get_user_note_by_id(note_id, user, db=db)
+    """Update single note by id.
+
+    With an If-Match header the note is only updated if its ETag still matches, otherwise 412 is returned.
+    """
+    version = _if_match_version(if_match) if if_match is not None else None
+    db_note = await crud_notes.update_user_note(note_id, note, user, db=db, version=version)
     if db_note is None:
+        raise await _update_failed(note_id, version, user, db)
+    events.emit("updated", db_note)
+    response.headers.update(_revision_headers(db_note))
+    return db_note
+
+
+@router.get(
+    "/notes/{note_id}/content",
+    dependencies=[Depends(rate_limit(RouteClass.READ))],
+    response_class=Response,
+    responses={
+        status.HTTP_200_OK: {"content": {TEXT_MEDIA_TYPE: {}}, "description": "The content of the note"},
+        status.HTTP_206_PARTIAL_CONTENT: {"content": {TEXT_MEDIA_TYPE: {}}, "description": "The range of the content"},
+        status.HTTP_404_NOT_FOUND: {"description": "Note not found"},
+        status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE: {"description": "Range starts past the end of the content"},
+    },
+)
+async def read_note_content(
+    note_id: uuid.UUID,
+    user: Annotated[User, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_read_db)],
+    range: Annotated[str | None, Header()] = None,
+    if_range: Annotated[str | None, Header()] = None,
+):
+    """Get the content of a note as plain text, whatever its size.
+
+    A single range of bytes can be asked for with a Range header, to download the content in parts or resume.
+    With If-Range holding the ETag of the note, the range is only sent if the note has not changed since,
+    the whole content otherwise.
+    """
+    note = await crud_notes.get_user_note_content(note_id, user, db=db)
+    if note is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Note not found")
-    crud_notes.update_note(db_note, note, db=db)
+    inline = note.content.encode() if note.content_id is None else None
+    size = len(inline) if inline is not None else note.content_size
+    headers = {"Accept-Ranges": "bytes", **_revision_headers(note)}
+    byte_range = None
+    if range is not None and (if_range is None or if_range.strip() == headers["ETag"]):
+        byte_range = _byte_range(range, size)
+    start, end = byte_range or (0, size - 1)
+    status_code = status.HTTP_200_OK
+    if byte_range is not None:
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    if inline is not None:
+        return Response(inline[start:end + 1], status_code=status_code, media_type=TEXT_MEDIA_TYPE, headers=headers)
+    headers["Content-Length"] = str(end - start + 1)
+    content = crud_notes.stream_note_content(note.content_id, start, end, db=db)
+    return StreamingResponse(content, status_code=status_code, media_type=TEXT_MEDIA_TYPE, headers=headers)
+
+
+@router.put(
+    "/notes/{note_id}/content",
+    dependencies=[Depends(rate_limit(RouteClass.WRITE))],
+    responses={
+        status.HTTP_400_BAD_REQUEST: {"description": "Content is not UTF-8 text"},
+        status.HTTP_404_NOT_FOUND: {"description": "Note not found"},
+        status.HTTP_412_PRECONDITION_FAILED: {"description": "Note has changed since If-Match etag"},
+        status.HTTP_413_REQUEST_ENTITY_TOO_LARGE: {"description": "Content is larger than allowed"},
+    },
+    response_model=Note,
+)
+async def write_note_content(
+    note_id: uuid.UUID,
+    request: Request,
+    user: Annotated[User, Depends(get_current_user)],
+    response: Response,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    events: Annotated[EventEmmiter, Depends(get_emitter)],
+    if_match: Annotated[str | None, Header()] = None,
+):
+    """Replace the content of a note with the plain text request body, for content too long to be sent in JSON.
+
+    The body is stored as it arrives, content longer than the limit of JSON is stored apart from the note
+    and read from this endpoint. With an If-Match header the note is only updated if its ETag still matches.
+    """
+    version = _if_match_version(if_match) if if_match is not None else None
+    db_note = await crud_notes.write_user_note_content(note_id, _content_upload(request), user, db=db, version=version)
+    if db_note is None:
+        raise await _update_failed(note_id, version, user, db)
     events.emit("updated", db_note)
+    response.headers.update(_revision_headers(db_note))
     return db_note
 
 
 @router.delete(
     "/notes/{note_id}",
+    dependencies=[Depends(rate_limit(RouteClass.WRITE))],
     responses={status.HTTP_404_NOT_FOUND: {"description": "Note not found"}},
     status_code=status.HTTP_204_NO_CONTENT,
 )
-def delete_note(
+async def delete_note(
     note_id: uuid.UUID,
     user: Annotated[User, Depends(get_current_user)],
-    db: Annotated[Session, Depends(get_db)],
+    db: Annotated[AsyncSession, Depends(get_db)],
     events: Annotated[EventEmmiter, Depends(get_emitter)],
 ):
     """Delete single note by id."""
-    db_note = crud_notes.get_user_note_by_id(note_id, user, db=db)
+    db_note = await crud_notes.delete_user_note(note_id, user, db=db)
     if db_note is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Note not found")
-    crud_notes.delete_note(db_note, db=db)
     events.emit("deleted", db_note)
     return None
@@ -0,0 +1,30 @@
+from pydantic import BaseModel, Field
+
+
+class PoolStats(BaseModel):
+    size: int | None = Field(description="The number of connections the pool keeps open, none if pooling is disabled.")
+    checked_in: int | None = Field(description="The number of idle connections in the pool.")
+    checked_out: int | None = Field(description="The number of connections currently in use.")
+    overflow: int | None = Field(description="The number of connections opened above the pool size.")
+    connects: int = Field(description="The number of connections opened since startup.")
+    checkouts: int = Field(description="The number of times a connection was taken from the pool.")
+    invalidations: int = Field(description="The number of connections discarded as broken.")
+    wait_time_total: float = Field(description="The total number of seconds requests waited for a connection.")
+    wait_time_max: float = Field(description="The longest number of seconds a request waited for a connection.")
+
+
+class EventStats(BaseModel):
+    queued: int = Field(description="The number of events waiting to be produced.")
+    queue_size: int = Field(description="The number of events the queue holds before new ones are dropped.")
+    emitted: int = Field(description="The number of events handed over to the producer since startup.")
+    dropped: int = Field(description="The number of events dropped since startup.")
+    failed: int = Field(description="The number of events the producer failed to deliver since startup.")
+
+
+class CacheStats(BaseModel):
+    size: int = Field(description="The number of notes the worker keeps in memory at most.")
+    cached: int = Field(description="The number of notes currently in memory of the worker.")
+    hits: int = Field(description="The number of notes found in memory of the worker since startup.")
+    shared_hits: int = Field(description="The number of notes found in the shared cache since startup.")
+    misses: int = Field(description="The number of notes loaded from the database since startup.")
+    evictions: int = Field(description="The number of notes pushed out of memory by more recently used ones.")
@@ -1,9 +1,29 @@
+import base64
+
 from datetime import datetime
+from enum import StrEnum
+from pydantic import AfterValidator
 from pydantic import BaseModel
 from pydantic import ConfigDict
 from pydantic import Field
+from pydantic import model_validator
+from typing import Annotated, Literal
 from uuid import UUID
 
+from nulland.config import settings
+
+
+def check_inline_size(content: str) -> str:
+    """Checks that the content is small enough to be kept with the note, in bytes as it is stored."""
+    if len(content.encode()) > settings.note_content_max_inline_size:
+        raise ValueError(
+            f"content of more than {settings.note_content_max_inline_size} bytes is uploaded to the content endpoint"
+        )
+    return content
+
+
+InlineContent = Annotated[str, AfterValidator(check_inline_size)]
+
 
 class BaseNote(BaseModel):
     title: str = Field(max_length=100, description="The title of the note.", examples=["My note"])
@@ -11,20 +31,124 @@ class BaseNote(BaseModel):
 
 
 class NoteCreate(BaseNote):
-    pass
+    content: InlineContent = Field(
+        description="The content of the note, longer content is uploaded to the content endpoint of the note.",
+        examples=["This is my note content"],
+    )
 
 
 class NoteUpdate(BaseNote):
     title: str | None = Field(max_length=100, description="The title of the note.", examples=["My note"], default=None)
-    content: str | None = Field(description="The content of the note.", examples=["This is my note content"], default=None)
+    content: InlineContent | None = Field(
+        description="The content of the note, longer content is uploaded to the content endpoint of the note.",
+        examples=["This is my note content"],
+        default=None,
+    )
 
 
 class Note(BaseNote):
     id: UUID = Field(description="The unique identifier of the note.")
     created_at: datetime = Field(description="The time the note was created.")
+    updated_at: datetime = Field(description="The time the note was last changed.")
+    version: int = Field(description="The revision of the note, incremented on every update.")
+    content_size: int | None = Field(
+        description="The size in bytes of content too large to be returned with the note, "
+        "it is read from the content endpoint of the note and `content` is empty. Absent for content returned inline.",
+        default=None,
+    )
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class NoteView(StrEnum):
+    FULL = "full"
+    SUMMARY = "summary"
+
+
+class NoteSummary(BaseModel):
+    id: UUID = Field(description="The unique identifier of the note.")
+    title: str = Field(description="The title of the note.")
+    created_at: datetime = Field(description="The time the note was created.")
+    preview: str | None = Field(description="The beginning of the note content, if requested.", default=None)
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class NoteSearchResult(BaseModel):
+    id: UUID = Field(description="The unique identifier of the note.")
+    title: str = Field(description="The title of the note.")
+    created_at: datetime = Field(description="The time the note was created.")
+    rank: float = Field(description="The relevance of the note to the search query.")
+    snippet: str = Field(description="Fragments of the note content with matches wrapped in <b></b> tags.")
 
     model_config = ConfigDict(from_attributes=True)
 
 
+class NoteChanges(BaseModel):
+    notes: list[Note] = Field(description="Notes created or updated since the token, in the order of changes.")
+    deleted: list[UUID] = Field(description="Ids of notes deleted since the token.")
+    token: int = Field(description="The token to pass as `since` to get the changes that follow.")
+    more: bool = Field(description="Whether more changes follow the token already.")
+
+
 class NoteLog(Note):
     user_id: str = Field(description="The user who created the note.")
+
+
+class NoteCursor(BaseModel):
+    """Position of a note in the creation order of user's notes.
+
+    Passed to API users as an opaque string, use `encode` and `decode` to convert it.
+    """
+    created_at: datetime
+    id: UUID
+
+    model_config = ConfigDict(from_attributes=True)
+
+    def encode(self) -> str:
+        return base64.urlsafe_b64encode(self.model_dump_json().encode()).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, cursor: str) -> "NoteCursor":
+        """Restores the cursor from its string form, raises ValueError if it is malformed."""
+        try:
+            data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        except ValueError as exc:
+            raise ValueError("Malformed cursor") from exc
+        return cls.model_validate_json(data)
+
+
+class NoteBatchCreate(BaseModel):
+    op: Literal["create"]
+    note: NoteCreate
+
+
+class NoteBatchUpdate(BaseModel):
+    op: Literal["update"]
+    id: UUID = Field(description="The identifier of the note to update.")
+    note: NoteUpdate
+
+
+class NoteBatchDelete(BaseModel):
+    op: Literal["delete"]
+    id: UUID = Field(description="The identifier of the note to delete.")
+
+
+class NoteBatch(BaseModel):
+    operations: list[
+        Annotated[NoteBatchCreate | NoteBatchUpdate | NoteBatchDelete, Field(discriminator="op")]
+    ] = Field(min_length=1, max_length=1000, description="The operations to apply in a single transaction.")
+
+    @model_validator(mode="after")
+    def check_unique_ids(self) -> "NoteBatch":
+        ids = [op.id for op in self.operations if not isinstance(op, NoteBatchCreate)]
+        if len(ids) != len(set(ids)):
+            raise ValueError("a note may only be referenced once in a batch")
+        return self
+
+
+class NoteBatchResult(BaseModel):
+    op: Literal["create", "update", "delete"]
+    id: UUID = Field(description="The identifier of the affected note.")
+    status: int = Field(description="The HTTP status code of the operation.", examples=[200])
+    note: Note | None = Field(description="The note as saved, absent if it was deleted or not found.", default=None)
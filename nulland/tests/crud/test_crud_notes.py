@@ -1,26 +1,38 @@
+import asyncio
 import pytest
 import uuid
 
-from sqlalchemy.orm import Session
-from unittest import TestCase
+from sqlalchemy import func, select
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
 
+from nulland.config import settings
 from nulland.crud import crud_notes as crud
+from nulland.db import session
 from nulland.models.notes import Note
+from nulland.models.outbox import OutboxEvent
 from nulland.schemas.auth import User
-from nulland.schemas.notes import NoteCreate, NoteUpdate
+from nulland.schemas.notes import NoteCreate, NoteCursor, NoteUpdate, NoteView
 
 
-class TestCrudNotes(TestCase):
+class TestCrudNotes(IsolatedAsyncioTestCase):
     @pytest.fixture(autouse=True)
-    def setup(self, db: Session):
-        self.db = db
+    def setup(self):
         self.user = User(
             sub=str(uuid.uuid4()),
             name="Test User",
             email="test@localhost",
         )
 
-    def _insert_note(self) -> Note:
+    async def asyncSetUp(self):
+        self.db = session.AsyncSessionLocal()
+
+    async def asyncTearDown(self):
+        await self.db.close()
+        # Pooled connections are bound to the event loop of the test.
+        await session.async_engine.dispose()
+
+    async def _insert_note(self) -> Note:
         note = Note(
             id=uuid.uuid4(),
             user_id=self.user.id,
@@ -28,16 +40,16 @@ class TestCrudNotes(TestCase):
             content="The text of test note.",
         )
         self.db.add(note)
-        self.db.commit()
-        self.db.refresh(note)
+        await self.db.commit()
+        await self.db.refresh(note)
         return note
 
-    def test_create_user_note(self):
+    async def test_create_user_note(self):
         note_in = NoteCreate(
             title="Test Note",
             content="The text of test note.",
         )
-        note_obj = crud.create_user_note(
+        note_obj = await crud.create_user_note(
             note=note_in,
             user=self.user,
             db=self.db,
@@ -47,30 +59,110 @@ class TestCrudNotes(TestCase):
         self.assertEqual(note_obj.title, note_in.title)
         self.assertEqual(note_obj.content, note_in.content)
 
-    def test_read_user_no_notes(self):
-        notes = crud.read_user_notes(
+    @patch.object(settings, "event_outbox", True)
+    async def test_create_user_note_outbox(self):
+        note_obj = await crud.create_user_note(
+            note=NoteCreate(title="Test Note", content="The text of test note."),
+            user=self.user,
+            db=self.db,
+        )
+        events = await self.db.scalars(select(OutboxEvent).where(OutboxEvent.value.contains(str(note_obj.id))))
+        self.assertEqual([e.key for e in events], ["created"])
+
+    async def test_read_user_no_notes(self):
+        notes = await crud.read_user_notes(
             user=self.user,
             db=self.db,
         )
         self.assertIsInstance(notes, list)
         self.assertEqual(len(notes), 0)
 
-    def test_read_user_notes(self):
-        self._insert_note()
+    async def test_read_user_notes(self):
+        await self._insert_note()
         self.db.expunge_all()
 
-        notes = crud.read_user_notes(
+        notes = await crud.read_user_notes(
             user=self.user,
             db=self.db,
         )
         self.assertIsInstance(notes, list)
         self.assertEqual(len(notes), 1)
 
-    def test_get_user_note_by_id(self):
-        note_db = self._insert_note()
+    async def test_read_user_notes_after_cursor(self):
+        cursors = [NoteCursor.model_validate(await self._insert_note()) for _ in range(3)]
+        self.db.expunge_all()
+
+        notes = await crud.read_user_notes(
+            user=self.user,
+            db=self.db,
+            limit=1,
+            after=cursors[0],
+        )
+        self.assertEqual([n.id for n in notes], [cursors[1].id])
+
+    async def test_read_user_notes_summary(self):
+        note_db = await self._insert_note()
+        self.db.expunge_all()
+
+        notes = await crud.read_user_notes(
+            user=self.user,
+            db=self.db,
+            view=NoteView.SUMMARY,
+            preview_length=4,
+        )
+        self.assertEqual(len(notes), 1)
+        self.assertEqual(notes[0].id, note_db.id)
+        self.assertEqual(notes[0].title, note_db.title)
+        self.assertEqual(notes[0].preview, "The ")
+        self.assertNotIn("content", notes[0]._fields)
+
+    async def test_read_user_notes_summary_without_preview(self):
+        await self._insert_note()
+        self.db.expunge_all()
+
+        notes = await crud.read_user_notes(
+            user=self.user,
+            db=self.db,
+            view=NoteView.SUMMARY,
+        )
+        self.assertIsNone(notes[0].preview)
+
+    async def test_stream_user_notes(self):
+        note_ids = [(await self._insert_note()).id for _ in range(3)]
         self.db.expunge_all()
 
-        note_obj = crud.get_user_note_by_id(
+        notes = crud.stream_user_notes(
+            user=self.user,
+            db=self.db,
+            batch_size=2,
+        )
+        self.assertEqual([n.id async for n in notes], note_ids)
+
+    async def test_search_user_notes(self):
+        note_db = await self._insert_note()
+        self.db.expunge_all()
+
+        results = await crud.search_user_notes(
+            query="text",
+            user=self.user,
+            db=self.db,
+            limit=10,
+        )
+        self.assertEqual([r.id for r in results], [note_db.id])
+
+        results = await crud.search_user_notes(
+            query="missing",
+            user=self.user,
+            db=self.db,
+            limit=10,
+        )
+        self.assertEqual(results, [])
+
+    async def test_get_user_note_by_id(self):
+        note_db = await self._insert_note()
+        self.db.expunge_all()
+
+        note_obj = await crud.get_user_note_by_id(
             note_id=note_db.id,
             user=self.user,
             db=self.db,
@@ -80,29 +172,33 @@ class TestCrudNotes(TestCase):
         self.assertEqual(note_obj.title, note_db.title)
         self.assertEqual(note_obj.content, note_db.content)
 
-    def test_get_user_note_by_id_not_found(self):
-        note_obj = crud.get_user_note_by_id(
+    async def test_get_user_note_by_id_not_found(self):
+        note_obj = await crud.get_user_note_by_id(
             note_id=uuid.uuid4(),
             user=self.user,
             db=self.db,
         )
         self.assertIsNone(note_obj)
 
-    def test_update_note_title(self):
-        note_db = self._insert_note()
+    async def test_update_user_note_title(self):
+        note_db = await self._insert_note()
         self.db.expunge_all()
 
         note_update = NoteUpdate(
             title="Updated Test Note",
         )
-        crud.update_note(
-            db_note=note_db,
+        note_upd = await crud.update_user_note(
+            note_id=note_db.id,
             note=note_update,
+            user=self.user,
             db=self.db,
         )
+        self.assertIsInstance(note_upd, Note)
+        self.assertEqual(note_upd.title, note_update.title)
+        self.assertEqual(note_upd.content, note_db.content)
         self.db.expunge_all()
 
-        note_obj = crud.get_user_note_by_id(
+        note_obj = await crud.get_user_note_by_id(
             note_id=note_db.id,
             user=self.user,
             db=self.db,
@@ -111,23 +207,26 @@ class TestCrudNotes(TestCase):
         self.assertEqual(note_obj.id, note_db.id)
         self.assertEqual(note_obj.title, note_update.title)
         self.assertEqual(note_obj.content, note_db.content)
-        self.assertEqual(note_db.title, note_update.title)
 
-    def test_update_note_content(self):
-        note_db = self._insert_note()
+    async def test_update_user_note_content(self):
+        note_db = await self._insert_note()
         self.db.expunge_all()
 
         note_update = NoteUpdate(
             content="Updated content.",
         )
-        crud.update_note(
-            db_note=note_db,
+        note_upd = await crud.update_user_note(
+            note_id=note_db.id,
             note=note_update,
+            user=self.user,
             db=self.db,
         )
+        self.assertIsInstance(note_upd, Note)
+        self.assertEqual(note_upd.title, note_db.title)
+        self.assertEqual(note_upd.content, note_update.content)
         self.db.expunge_all()
 
-        note_obj = crud.get_user_note_by_id(
+        note_obj = await crud.get_user_note_by_id(
             note_id=note_db.id,
             user=self.user,
             db=self.db,
@@ -136,21 +235,108 @@ class TestCrudNotes(TestCase):
         self.assertEqual(note_obj.id, note_db.id)
         self.assertEqual(note_obj.title, note_db.title)
         self.assertEqual(note_obj.content, note_update.content)
-        self.assertEqual(note_db.content, note_update.content)
 
-    def test_delete_note(self):
-        note_db = self._insert_note()
+    async def test_write_user_note_content_updated_at(self):
+        note_db = await self._insert_note()
         self.db.expunge_all()
+        uploaded = None
 
-        crud.delete_note(
-            db_note=note_db,
+        async def content():
+            nonlocal uploaded
+            yield b"Uploaded "
+            await asyncio.sleep(0.2)
+            yield b"text."
+            async with session.AsyncSessionLocal() as other:
+                uploaded = await other.scalar(select(func.localtimestamp()))
+
+        note_obj = await crud.write_user_note_content(
+            note_id=note_db.id,
+            content=content(),
+            user=self.user,
             db=self.db,
         )
+        self.assertEqual(note_obj.content, "Uploaded text.")
+        self.assertGreaterEqual(note_obj.updated_at, uploaded)
+
+    async def test_update_user_note_not_owner(self):
+        note_db = await self._insert_note()
         self.db.expunge_all()
 
-        note_obj = crud.get_user_note_by_id(
+        note_upd = await crud.update_user_note(
+            note_id=note_db.id,
+            note=NoteUpdate(title="Updated Test Note"),
+            user=User(sub=str(uuid.uuid4()), name="Other User", email="other@localhost"),
+            db=self.db,
+        )
+        self.assertIsNone(note_upd)
+
+    async def test_delete_user_note(self):
+        note_db = await self._insert_note()
+        self.db.expunge_all()
+
+        note_del = await crud.delete_user_note(
+            note_id=note_db.id,
+            user=self.user,
+            db=self.db,
+        )
+        self.assertEqual(note_del.id, note_db.id)
+        self.db.expunge_all()
+
+        note_obj = await crud.get_user_note_by_id(
             note_id=note_db.id,
             user=self.user,
             db=self.db,
         )
         self.assertIsNone(note_obj)
+
+    async def test_delete_user_note_not_found(self):
+        note_del = await crud.delete_user_note(
+            note_id=uuid.uuid4(),
+            user=self.user,
+            db=self.db,
+        )
+        self.assertIsNone(note_del)
+
+    async def test_batch_user_notes(self):
+        note_upd = await self._insert_note()
+        note_del = await self._insert_note()
+        self.db.expunge_all()
+
+        result = await crud.batch_user_notes(
+            creates=[NoteCreate(title="Batch Note", content="Created in batch.")],
+            updates={
+                note_upd.id: NoteUpdate(content="Updated in batch."),
+                uuid.uuid4(): NoteUpdate(title="Missing"),
+            },
+            deletes=[note_del.id, uuid.uuid4()],
+            user=self.user,
+            db=self.db,
+        )
+        self.assertEqual([n.title for n in result.created], ["Batch Note"])
+        self.assertEqual(list(result.updated), [note_upd.id])
+        self.assertEqual(result.updated[note_upd.id].title, note_upd.title)
+        self.assertEqual(result.updated[note_upd.id].content, "Updated in batch.")
+        self.assertEqual(list(result.deleted), [note_del.id])
+        self.db.expunge_all()
+
+        notes = await crud.read_user_notes(
+            user=self.user,
+            db=self.db,
+        )
+        self.assertEqual(len(notes), 2)
+
+    async def test_batch_user_notes_unchanged(self):
+        note_db = await self._insert_note()
+        self.db.expunge_all()
+
+        result = await crud.batch_user_notes(
+            creates=[],
+            updates={note_db.id: NoteUpdate(), uuid.uuid4(): NoteUpdate()},
+            deletes=[],
+            user=self.user,
+            db=self.db,
+        )
+        self.assertEqual(list(result.updated), [note_db.id])
+        self.assertEqual(result.updated[note_db.id].version, note_db.version)
+        self.assertEqual(result.updated[note_db.id].change_seq, note_db.change_seq)
+        self.assertEqual(result.updated[note_db.id].updated_at, note_db.updated_at)
@@ -0,0 +1,132 @@
+import asyncio
+import httpx
+import json
+import tempfile
+import time
+import unittest
+import uuid
+
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+
+from nulland import auth
+from nulland.auth import JWKSCache, TokenCache, discover_oidc
+from nulland.config import AuthSettings, settings
+from nulland.schemas.auth import User
+
+
+OIDC_CONF = {
+    "authorization_endpoint": "https://localhost/authorize",
+    "token_endpoint": "https://localhost/token",
+    "jwks_uri": "https://localhost/jwks",
+}
+JWKS = {"keys": [{"kid": "key-1", "kty": "RSA"}]}
+ROTATED_JWKS = {"keys": [{"kid": "key-2", "kty": "RSA"}]}
+
+
+@patch.object(settings.auth, "jwks_uri", "https://localhost/jwks")
+class TestJWKSCache(unittest.IsolatedAsyncioTestCase):
+    async def test_get_loads_keys_once(self):
+        cache = JWKSCache(ttl=3600, min_refresh_interval=60)
+        with patch.object(cache, "_fetch", AsyncMock(return_value=(JWKS, None))) as fetch:
+            self.assertEqual(await cache.get("key-1"), JWKS)
+            self.assertEqual(await cache.get("key-1"), JWKS)
+        fetch.assert_awaited_once()
+
+    async def test_get_unknown_kid_reloads_keys(self):
+        cache = JWKSCache(ttl=3600, min_refresh_interval=0)
+        with patch.object(cache, "_fetch", AsyncMock(side_effect=[(JWKS, None), (ROTATED_JWKS, None)])):
+            await cache.get("key-1")
+            self.assertEqual(await cache.get("key-2"), ROTATED_JWKS)
+
+    async def test_get_unknown_kid_reload_throttled(self):
+        cache = JWKSCache(ttl=3600, min_refresh_interval=60)
+        with patch.object(cache, "_fetch", AsyncMock(side_effect=[(JWKS, None), (ROTATED_JWKS, None)])) as fetch:
+            await cache.get("key-1")
+            self.assertEqual(await cache.get("key-2"), JWKS)
+        fetch.assert_awaited_once()
+
+    async def test_get_expired_reloads_in_background(self):
+        cache = JWKSCache(ttl=0, min_refresh_interval=0)
+        with patch.object(cache, "_fetch", AsyncMock(side_effect=[(JWKS, 0), (ROTATED_JWKS, 0)])):
+            await cache.get()
+            self.assertEqual(await cache.get(), JWKS)
+            await cache._refresh_task
+            self.assertEqual(await cache.get("key-2"), ROTATED_JWKS)
+
+
+class TestTokenCache(unittest.TestCase):
+    def setUp(self):
+        self.user = User(sub=str(uuid.uuid4()), name="Test User", email="test@localhost")
+
+    def test_get(self):
+        cache = TokenCache(size=10, ttl=60)
+        cache.put("token", self.user, None)
+        self.assertEqual(cache.get("token"), self.user)
+        self.assertIsNone(cache.get("other-token"))
+
+    def test_get_expired(self):
+        cache = TokenCache(size=10, ttl=60)
+        cache.put("token", self.user, time.time() - 1)
+        self.assertIsNone(cache.get("token"))
+
+    def test_put_evicts_least_recently_used(self):
+        cache = TokenCache(size=2, ttl=60)
+        cache.put("token-1", self.user, None)
+        cache.put("token-2", self.user, None)
+        cache.get("token-1")
+        cache.put("token-3", self.user, None)
+        self.assertIsNotNone(cache.get("token-1"))
+        self.assertIsNone(cache.get("token-2"))
+
+
+@patch.object(settings, "auth_openid_configuration_url", "https://localhost/.well-known/openid-configuration")
+@patch.object(settings, "auth_discovery_retries", 2)
+class TestDiscoverOIDC(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.cache = Path(tempfile.mkdtemp()) / "openid-configuration.json"
+        self.requests = 0
+        self.invalid = False
+        patch.object(settings, "auth", AuthSettings()).start()
+        patch.object(settings, "auth_openid_configuration_cache", self.cache).start()
+        async_client = httpx.AsyncClient
+        transport = httpx.MockTransport(self._handle)
+        patch("nulland.auth.httpx.AsyncClient", lambda **kw: async_client(transport=transport, **kw)).start()
+        self.addCleanup(patch.stopall)
+
+    def _handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        if self.invalid:
+            return httpx.Response(200, text="not json")
+        if self.requests == 1:
+            return httpx.Response(503)
+        return httpx.Response(200, json=OIDC_CONF)
+
+    async def test_discover_oidc_retries_and_caches(self):
+        with patch("nulland.auth.asyncio.sleep", AsyncMock()):
+            await discover_oidc()
+        self.assertEqual(self.requests, 2)
+        self.assertEqual(str(settings.auth.jwks_uri), OIDC_CONF["jwks_uri"])
+        self.assertEqual(json.loads(self.cache.read_text()), OIDC_CONF)
+
+    async def test_discover_oidc_from_cache(self):
+        self.cache.write_text(json.dumps({**OIDC_CONF, "jwks_uri": "https://localhost/cached-jwks"}))
+        self.requests = 1
+
+        await discover_oidc()
+        self.assertEqual(str(settings.auth.jwks_uri), "https://localhost/cached-jwks")
+        self.assertEqual(self.requests, 1)
+
+        await asyncio.gather(*auth._background_tasks)
+        self.assertEqual(str(settings.auth.jwks_uri), OIDC_CONF["jwks_uri"])
+        self.assertEqual(self.requests, 2)
+
+    async def test_discover_oidc_from_cache_invalid_reload(self):
+        self.cache.write_text(json.dumps({**OIDC_CONF, "jwks_uri": "https://localhost/cached-jwks"}))
+        self.requests = 1
+        self.invalid = True
+
+        await discover_oidc()
+        with self.assertLogs("nulland.auth", "WARNING"):
+            await asyncio.gather(*auth._background_tasks)
+        self.assertEqual(str(settings.auth.jwks_uri), "https://localhost/cached-jwks")
@@ -0,0 +1,34 @@
+import argparse
+import asyncio
+import orjson
+import pytest
+import unittest
+
+from benchmarks import load, micro, serialization
+from nulland.tests.utils.auth import get_public_key
+
+
+class TestBenchmarks(unittest.TestCase):
+    """Runs every benchmark briefly, so that changes to the app keep them working."""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr("nulland.auth.get_public_key", get_public_key)
+
+    def test_serialization(self):
+        rows = serialization.make_rows(3, 10)
+        default = asyncio.run(serialization.default_path(rows))
+        self.assertEqual(orjson.loads(default), orjson.loads(asyncio.run(serialization.fast_path(rows))))
+
+    def test_micro(self):
+        for name, function in micro.benchmarks().items():
+            with self.subTest(name=name):
+                micro.measure(function, number=1, repeat=1)
+
+    def test_load(self):
+        args = argparse.Namespace(
+            scenario="read-heavy", server="asgi", users=2, notes=3, content_size=10, concurrency=2, requests=20, seed=0,
+            allocations=False,
+        )
+        result = asyncio.run(load.run(args))
+        self.assertEqual(result["operations"]["all"]["count"], 20)
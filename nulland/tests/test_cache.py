@@ -0,0 +1,86 @@
+import unittest
+import uuid
+
+from datetime import datetime
+from unittest import mock
+
+from nulland.cache import NoteCache
+from nulland.models.notes import Note
+from nulland.tests.utils.cache import FakeBackend
+
+
+def make_note(user_id: str) -> Note:
+    return Note(
+        id=uuid.uuid4(),
+        user_id=user_id,
+        title="Test Note",
+        content="The text of test note.",
+        created_at=datetime.now(),
+        updated_at=datetime.now(),
+        version=1,
+    )
+
+
+class TestNoteCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.user_id = str(uuid.uuid4())
+        self.backend = FakeBackend()
+        self.cache = NoteCache(self.backend, size=2, ttl=60, shared_ttl=60)
+
+    async def test_read_through(self):
+        db_note = make_note(self.user_id)
+        load = mock.AsyncMock(return_value=db_note)
+
+        for _ in range(3):
+            note = await self.cache.get(self.user_id, db_note.id, load)
+            self.assertEqual(note.id, db_note.id)
+            self.assertEqual(note.title, "Test Note")
+        load.assert_awaited_once()
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 1))
+
+    async def test_missing_note_not_cached(self):
+        load = mock.AsyncMock(return_value=None)
+
+        self.assertIsNone(await self.cache.get(self.user_id, uuid.uuid4(), load))
+        self.assertEqual(self.cache.entries, {})
+        self.assertEqual(self.backend.values, {})
+
+    async def test_shared_tier(self):
+        db_note = make_note(self.user_id)
+        await self.cache.get(self.user_id, db_note.id, mock.AsyncMock(return_value=db_note))
+
+        # Another worker with the same backend finds the note without loading it.
+        other = NoteCache(self.backend, size=2, ttl=60, shared_ttl=60)
+        load = mock.AsyncMock()
+        note = await other.get(self.user_id, db_note.id, load)
+        self.assertEqual(note.id, db_note.id)
+        load.assert_not_awaited()
+        self.assertEqual(other.shared_hits, 1)
+        await other.get(self.user_id, db_note.id, load)
+        self.assertEqual(other.hits, 1)
+
+    async def test_eviction(self):
+        notes = [make_note(self.user_id) for _ in range(3)]
+        for db_note in notes:
+            await self.cache.get(self.user_id, db_note.id, mock.AsyncMock(return_value=db_note))
+
+        self.assertEqual(self.cache.evictions, 1)
+        self.assertEqual(list(self.cache.entries), [(self.user_id, note.id) for note in notes[1:]])
+
+    async def test_expiry(self):
+        self.cache.ttl = 0
+        self.backend = self.cache.backend = FakeBackend()
+        db_note = make_note(self.user_id)
+        await self.cache.get(self.user_id, db_note.id, mock.AsyncMock(return_value=db_note))
+
+        self.backend.values.clear()
+        self.assertIsNone(await self.cache.peek(self.user_id, db_note.id))
+
+    async def test_invalidate(self):
+        db_note = make_note(self.user_id)
+        await self.cache.get(self.user_id, db_note.id, mock.AsyncMock(return_value=db_note))
+
+        await self.cache.invalidate(self.user_id, [db_note.id])
+        self.assertEqual(self.cache.entries, {})
+        self.assertEqual(self.backend.values, {})
+        self.assertIsNone(await self.cache.peek(self.user_id, db_note.id))
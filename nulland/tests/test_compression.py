@@ -0,0 +1,150 @@
+import gzip
+import json
+import os
+import pytest
+import tracemalloc
+import unittest
+import uuid
+import zstandard
+
+from fastapi import status
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from nulland.compression import BrotliCodec, GzipCodec, ZstdCodec, negotiate
+from nulland.config import settings
+from nulland.models.notes import Note
+from nulland.tests.utils.auth import auth_headers, get_public_key
+
+
+class TestCompression(unittest.TestCase):
+    @pytest.fixture(autouse=True)
+    def setup(self, client: TestClient, db: Session, monkeypatch: pytest.MonkeyPatch):
+        self.client = client
+        self.db = db
+        self.monkeypatch = monkeypatch
+        monkeypatch.setattr("nulland.auth.get_public_key", get_public_key)
+
+    def _insert_notes(self, user_id, count: int, content: str):
+        self.db.add_all(
+            Note(id=uuid.uuid4(), user_id=str(user_id), title=f"Note {i}", content=content) for i in range(count)
+        )
+        self.db.commit()
+
+    def test_negotiate(self):
+        self.assertIs(negotiate("gzip, br, zstd"), ZstdCodec)
+        self.assertIs(negotiate("gzip, br;q=0.5"), BrotliCodec)
+        self.assertIs(negotiate("gzip;q=1.0, zstd;q=0"), GzipCodec)
+        self.assertIs(negotiate("*"), ZstdCodec)
+        self.assertIsNone(negotiate("identity"))
+        self.assertIsNone(negotiate(""))
+
+    def test_list_compressed(self):
+        user_id = uuid.uuid4()
+        self._insert_notes(user_id, 10, "x" * 1000)
+
+        for encoding in ["gzip", "br"]:
+            # The client decodes both of them.
+            response = self.client.get("/notes", headers={**auth_headers(user_id), "Accept-Encoding": encoding})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.headers["Content-Encoding"], encoding)
+            self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+            self.assertLess(int(response.headers["Content-Length"]), 1000)
+            self.assertEqual(len(response.json()), 10)
+
+    def test_small_response_uncompressed(self):
+        response = self.client.get("/notes", headers={**auth_headers(uuid.uuid4()), "Accept-Encoding": "gzip"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+        self.assertEqual(response.text, "[]")
+
+    def test_ndjson_streamed_compressed(self):
+        user_id = uuid.uuid4()
+        self._insert_notes(user_id, 5, "x" * 1000)
+
+        with self.client.stream(
+            "GET",
+            "/notes",
+            headers={**auth_headers(user_id), "Accept": "application/x-ndjson", "Accept-Encoding": "zstd"},
+        ) as response:
+            body = response.read()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.headers["Content-Encoding"], "zstd")
+        self.assertNotIn("Content-Length", response.headers)
+        lines = zstandard.ZstdDecompressor().decompressobj().decompress(body).splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(json.loads(lines[0])["content"], "x" * 1000)
+
+    def test_compressed_request(self):
+        user_id = uuid.uuid4()
+        body = json.dumps({"title": "Title", "content": "x" * 5000}).encode()
+
+        response = self.client.post(
+            "/notes",
+            content=gzip.compress(body),
+            headers={**auth_headers(user_id), "Content-Type": "application/json", "Content-Encoding": "gzip"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()["content"], "x" * 5000)
+
+    def test_compressed_request_errors(self):
+        headers = {**auth_headers(uuid.uuid4()), "Content-Type": "application/json"}
+        self.monkeypatch.setattr(settings, "compression_request_max_size", 10000)
+
+        response = self.client.post("/notes", content=b"{}", headers={**headers, "Content-Encoding": "compress"})
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        self.assertEqual(response.headers["Accept-Encoding"], "zstd, br, gzip")
+
+        response = self.client.post("/notes", content=b"not gzip", headers={**headers, "Content-Encoding": "gzip"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        body = gzip.compress(json.dumps({"title": "Title", "content": "x" * 20000}).encode())
+        response = self.client.post("/notes", content=body, headers={**headers, "Content-Encoding": "gzip"})
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    def test_truncated_request(self):
+        headers = {**auth_headers(uuid.uuid4()), "Content-Type": "application/json"}
+        body = json.dumps({"title": "Title", "content": "Content"}).encode()
+
+        for codec in [GzipCodec, BrotliCodec, ZstdCodec]:
+            with self.subTest(encoding=codec.name):
+                # Flushed but not finished, the whole body can be decompressed but the stream does not end.
+                truncated = codec().compress(body)
+                response = self.client.post("/notes", content=truncated, headers={**headers, "Content-Encoding": codec.name})
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_decompression_bomb(self):
+        headers = {**auth_headers(uuid.uuid4()), "Content-Type": "application/json"}
+        self.monkeypatch.setattr(settings, "compression_request_max_size", 1024 * 1024)
+        zeros = bytes(1024 * 1024)
+        bombs = {"gzip": GzipCodec(), "br": BrotliCodec(), "zstd": ZstdCodec()}
+        # A few hundred KiB at most, each inflating to 256 MiB.
+        bodies = {name: b"".join(codec.compress(zeros) for _ in range(256)) + codec.finish() for name, codec in bombs.items()}
+
+        for encoding, body in bodies.items():
+            with self.subTest(encoding=encoding):
+                tracemalloc.start()
+                try:
+                    response = self.client.post("/notes", content=body, headers={**headers, "Content-Encoding": encoding})
+                    peak = tracemalloc.get_traced_memory()[1]
+                finally:
+                    tracemalloc.stop()
+                self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+                self.assertLess(peak, 16 * 1024 * 1024)
+
+    def test_incompressible_request_too_large(self):
+        headers = {**auth_headers(uuid.uuid4()), "Content-Type": "application/json", "Content-Encoding": "gzip"}
+        self.monkeypatch.setattr(settings, "compression_request_max_size", 1024 * 1024)
+
+        response = self.client.post("/notes", content=gzip.compress(os.urandom(2 * 1024 * 1024)), headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    def test_compressed_off_loop(self):
+        self.monkeypatch.setattr(settings, "compression_offload_size", 0)
+        user_id = uuid.uuid4()
+        self._insert_notes(user_id, 10, "x" * 1000)
+
+        response = self.client.get("/notes", headers={**auth_headers(user_id), "Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(len(response.json()), 10)
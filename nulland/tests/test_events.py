@@ -0,0 +1,71 @@
+import unittest
+import unittest.mock
+import uuid
+
+from datetime import datetime
+
+from nulland.events import EventEmmiter
+from nulland.models.notes import Note
+from nulland.tests.utils.events import FakeProducer
+
+
+def make_note() -> Note:
+    return Note(
+        id=uuid.uuid4(),
+        user_id=str(uuid.uuid4()),
+        title="Test Note",
+        content="The text of test note.",
+        created_at=datetime.now(),
+        updated_at=datetime.now(),
+        version=1,
+    )
+
+
+class TestEventEmmiter(unittest.TestCase):
+    def test_emit_without_dispatcher(self):
+        producer = FakeProducer()
+        emitter = EventEmmiter(producer)
+        note = make_note()
+
+        emitter.emit("created", note)
+        self.assertEqual(len(producer.messages), 1)
+        topic, key, value = producer.messages[0]
+        self.assertEqual((topic, key), ("notes", "created"))
+        self.assertIn(str(note.id), value)
+
+    def test_emit_with_dispatcher(self):
+        producer = FakeProducer()
+        emitter = EventEmmiter(producer, queue_size=10, poll_interval=0.01)
+        emitter.start()
+
+        for _ in range(3):
+            emitter.emit("created", make_note())
+        emitter.close(timeout=5)
+
+        self.assertEqual(len(producer.messages), 3)
+        self.assertTrue(producer.flushed)
+        self.assertGreater(producer.polls, 0)
+        self.assertEqual(emitter.stats().emitted, 3)
+
+    def test_emit_drops_when_queue_full(self):
+        producer = FakeProducer()
+        emitter = EventEmmiter(producer, queue_size=2)
+        # The dispatcher is marked as running but does not consume the queue.
+        emitter._dispatcher = unittest.mock.Mock()
+
+        for _ in range(3):
+            emitter.emit("created", make_note())
+
+        stats = emitter.stats()
+        self.assertEqual(stats.queued, 2)
+        self.assertEqual(stats.dropped, 1)
+
+    def test_emit_drops_when_producer_full(self):
+        producer = FakeProducer(capacity=1)
+        emitter = EventEmmiter(producer)
+
+        emitter.emit("created", make_note())
+        emitter.emit("created", make_note())
+
+        self.assertEqual(len(producer.messages), 1)
+        self.assertEqual(emitter.stats().dropped, 1)
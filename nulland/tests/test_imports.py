@@ -0,0 +1,35 @@
+import subprocess
+import sys
+import unittest
+
+from benchmarks.imports import import_times
+
+
+# Generous, to hold on slow machines. It is to catch a heavy import, not small regressions.
+IMPORT_BUDGET = 5.0
+
+# Imported only when enabled in the settings, which they are not by default.
+OPTIONAL_PACKAGES = ["authlib", "confluent_kafka", "opentelemetry.exporter", "opentelemetry.sdk", "pythonjsonlogger", "redis"]
+
+
+class TestImports(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.times = import_times("nulland.main")
+
+    def test_budget(self):
+        self.assertLess(self.times["nulland.main"][1] / 1e6, IMPORT_BUDGET)
+
+    def test_optional_packages_not_imported(self):
+        for package in OPTIONAL_PACKAGES:
+            with self.subTest(package=package):
+                self.assertNotIn(package, self.times)
+
+    def test_fast_path_dependency_not_imported(self):
+        # FastAPI imports orjson itself when it is installed, so the app is imported with orjson made unavailable.
+        result = subprocess.run(
+            [sys.executable, "-c", "import sys; sys.modules['orjson'] = None; import nulland.main"],
+            capture_output=True,
+            text=True,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
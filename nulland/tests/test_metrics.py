@@ -0,0 +1,64 @@
+import pytest
+import unittest
+import uuid
+
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from nulland.config import settings
+from nulland.tests.utils.auth import auth_headers, get_public_key
+
+
+METRICS_HEADERS = {"Authorization": "Bearer metrics-secret"}
+
+
+class TestMetrics(unittest.TestCase):
+    @pytest.fixture(autouse=True)
+    def setup(self, client: TestClient, monkeypatch: pytest.MonkeyPatch):
+        self.client = client
+        self.monkeypatch = monkeypatch
+        monkeypatch.setattr("nulland.auth.get_public_key", get_public_key)
+        monkeypatch.setattr(settings, "metrics_token", "metrics-secret")
+
+    def test_pool_metrics(self):
+        self.client.get("/notes", headers=auth_headers(uuid.uuid4()))
+
+        response = self.client.get("/metrics/pool", headers=METRICS_HEADERS)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        stats = response.json()
+        self.assertGreater(stats["checkouts"], 0)
+        self.assertEqual(stats["checked_out"], 0)
+        self.assertGreater(stats["wait_time_max"], 0)
+        self.assertGreaterEqual(stats["wait_time_total"], stats["wait_time_max"])
+
+    def test_prometheus_metrics(self):
+        self.client.get("/notes", headers=auth_headers(uuid.uuid4()))
+
+        response = self.client.get("/metrics", headers=METRICS_HEADERS)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain"))
+        metrics = response.text
+        self.assertIn('nulland_http_request_duration_seconds_count{method="GET",route="/notes",status="200"}', metrics)
+        self.assertIn('nulland_db_statement_duration_seconds_count{operation="SELECT"}', metrics)
+        self.assertIn('nulland_auth_token_cache_requests_total{result="miss"}', metrics)
+        self.assertIn("nulland_auth_token_verification_duration_seconds_count", metrics)
+
+    def test_metrics_token(self):
+        for path in ["/metrics", "/metrics/pool", "/metrics/events", "/metrics/cache"]:
+            with self.subTest(path=path):
+                response = self.client.get(path)
+                self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+                self.assertEqual(response.headers["WWW-Authenticate"], "Bearer")
+
+                response = self.client.get(path, headers={"Authorization": "Bearer guess"})
+                self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+                response = self.client.get(path, headers=METRICS_HEADERS)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_metrics_without_token(self):
+        self.monkeypatch.setattr(settings, "metrics_token", None)
+        for path in ["/metrics", "/metrics/pool", "/metrics/events", "/metrics/cache"]:
+            with self.subTest(path=path):
+                response = self.client.get(path, headers=METRICS_HEADERS)
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
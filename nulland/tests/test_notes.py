@@ -1,13 +1,19 @@
+import gzip
+import json
 import pytest
 import unittest
 import uuid
 
 from fastapi import status
 from fastapi.testclient import TestClient
+from sqlalchemy import func, select, update
 from sqlalchemy.orm import Session
 
-from nulland.models.notes import Note
-from nulland.tests.utils.auth import auth_headers, jwk_public_key
+from nulland.cache import NoteCache
+from nulland.config import settings
+from nulland.models.notes import Note, NoteContentChunk, change_seq
+from nulland.tests.utils.auth import auth_headers, get_public_key
+from nulland.tests.utils.cache import FakeBackend
 
 
 class TestNotes(unittest.TestCase):
@@ -15,14 +21,15 @@ class TestNotes(unittest.TestCase):
     def setup(self, client: TestClient, db: Session, monkeypatch: pytest.MonkeyPatch):
         self.client = client
         self.db = db
-        monkeypatch.setattr("nulland.auth.get_public_key", lambda: jwk_public_key)
+        self.monkeypatch = monkeypatch
+        monkeypatch.setattr("nulland.auth.get_public_key", get_public_key)
 
-    def _insert_note(self, user_id) -> Note:
+    def _insert_note(self, user_id, note_id=None, content="The text of the new test note.") -> Note:
         note = Note(
-            id=user_id,
+            id=note_id or user_id,
             user_id=user_id,
             title="New Test Note",
-            content="The text of the new test note.",
+            content=content,
         )
         self.db.add(note)
         self.db.commit()
@@ -44,6 +51,7 @@ class TestNotes(unittest.TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         notes_resp = response.json()
         self.assertEqual(len(notes_resp), 1)
+        self.assertEqual(notes_resp[0]["content"], "The text of the new test note.")
 
     def test_list_notes_empty_list(self):
         response = self.client.get(
@@ -53,6 +61,156 @@ class TestNotes(unittest.TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.text, "[]")
 
+    def test_list_notes_pages(self):
+        user_id = uuid.uuid4()
+        note_ids = [str(self._insert_note(user_id, uuid.uuid4()).id) for _ in range(3)]
+
+        response = self.client.get(
+            "/notes",
+            params={"limit": 2},
+            headers=auth_headers(user_id),
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([n["id"] for n in response.json()], note_ids[:2])
+        self.assertIn("X-Next-Cursor", response.headers)
+
+        response = self.client.get(
+            "/notes",
+            params={"limit": 2, "cursor": response.headers["X-Next-Cursor"]},
+            headers=auth_headers(user_id),
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([n["id"] for n in response.json()], note_ids[2:])
+        self.assertNotIn("X-Next-Cursor", response.headers)
+
+    def test_list_notes_summary(self):
+        user_id = uuid.uuid4()
+        self._insert_note(user_id)
+
+        response = self.client.get(
+            "/notes",
+            params={"view": "summary", "preview_length": 8},
+            headers=auth_headers(user_id),
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        notes_resp = response.json()
+        self.assertEqual(len(notes_resp), 1)
+        self.assertEqual(notes_resp[0]["title"], "New Test Note")
+        self.assertEqual(notes_resp[0]["preview"], "The text")
+        self.assertNotIn("content", notes_resp[0])
+
+    def test_list_notes_fast_path(self):
+        user_id = uuid.uuid4()
+        note_ids = [str(self._insert_note(user_id, uuid.uuid4()).id) for _ in range(2)]
+        self.monkeypatch.setattr(settings, "json_fast_path", True)
+
+        response = self.client.get(
+            "/notes",
+            params={"limit": 1},
+            headers=auth_headers(user_id),
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        notes_resp = response.json()
+        self.assertEqual([n["id"] for n in notes_resp], note_ids[:1])
+        self.assertEqual(notes_resp[0]["content"], "The text of the new test note.")
+        self.assertIn("X-Next-Cursor", response.headers)
+
+        response = self.client.get(
+            "/notes",
+            params={"view": "summary"},
+            headers={**auth_headers(user_id), "Accept": "application/x-ndjson"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual([n["id"] for n in lines], note_ids)
+        self.assertEqual(set(lines[0]), {"id", "title", "created_at", "preview"})
+
+    def test_list_notes_invalid_cursor(self):
+        response = self.client.get(
+            "/notes",
+            params={"cursor": "not-a-cursor"},
+            headers=auth_headers(uuid.uuid4()),
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_notes_ndjson(self):
+        user_id = uuid.uuid4()
+        note_ids = [str(self._insert_note(user_id, uuid.uuid4()).id) for _ in range(3)]
+
+        response = self.client.get(
+            "/notes",
+            headers={**auth_headers(user_id), "Accept": "application/x-ndjson"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.headers["Content-Type"].startswith("application/x-ndjson"))
+        lines = response.text.splitlines()
+        self.assertEqual([json.loads(line)["id"] for line in lines], note_ids)
+
+    def test_note_changes(self):
+        user_id = uuid.uuid4()
+        ids = [
+            self.client.post("/notes", json={"title": title, "content": "Text"}, headers=auth_headers(user_id)).json()["id"]
+            for title in ("First", "Second", "Third")
+        ]
+
+        response = self.client.get("/notes/changes?limit=2", headers=auth_headers(user_id))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        changes = response.json()
+        self.assertEqual([note["id"] for note in changes["notes"]], ids[:2])
+        self.assertTrue(changes["more"])
+        changes = self.client.get(f"/notes/changes?since={changes['token']}", headers=auth_headers(user_id)).json()
+        self.assertEqual([note["id"] for note in changes["notes"]], ids[2:])
+        self.assertFalse(changes["more"])
+        token = changes["token"]
+
+        self.client.patch(f"/notes/{ids[1]}", json={"title": "Updated"}, headers=auth_headers(user_id))
+        self.client.delete(f"/notes/{ids[0]}", headers=auth_headers(user_id))
+        changes = self.client.get(f"/notes/changes?since={token}", headers=auth_headers(user_id)).json()
+        self.assertEqual([(note["id"], note["title"]) for note in changes["notes"]], [(ids[1], "Updated")])
+        self.assertEqual(changes["deleted"], [ids[0]])
+        self.assertGreater(changes["token"], token)
+
+        changes = self.client.get(f"/notes/changes?since={changes['token']}", headers=auth_headers(user_id)).json()
+        self.assertEqual(changes, {"notes": [], "deleted": [], "token": changes["token"], "more": False})
+
+    def test_search_notes(self):
+        user_id = uuid.uuid4()
+        note_db = self._insert_note(user_id, uuid.uuid4(), content="Buy some cat food on the way home.")
+        self._insert_note(user_id, uuid.uuid4(), content="Walk the dog.")
+        self._insert_note(uuid.uuid4(), uuid.uuid4(), content="Other user's cat food.")
+
+        response = self.client.get(
+            "/notes/search",
+            params={"q": "cat food"},
+            headers=auth_headers(user_id),
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()
+        self.assertEqual([r["id"] for r in results], [str(note_db.id)])
+        self.assertIn("<b>cat</b>", results[0]["snippet"])
+        self.assertGreater(results[0]["rank"], 0)
+
+    def test_search_notes_long_content(self):
+        user_id = uuid.uuid4()
+        # Close to the inline limit of distinct words, whose text search vector would be over 1 MB.
+        words = " ".join(f"w{i:x}" for i in range(140000))
+
+        response = self.client.post("/notes", json={"title": "Words", "content": words}, headers=auth_headers(user_id))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        note_id = response.json()["id"]
+
+        response = self.client.get("/notes/search", params={"q": "w2a"}, headers=auth_headers(user_id))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([r["id"] for r in response.json()], [note_id])
+
+    def test_search_notes_empty_query(self):
+        response = self.client.get(
+            "/notes/search",
+            params={"q": ""},
+            headers=auth_headers(uuid.uuid4()),
+        )
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
     def test_create_note(self):
         response = self.client.post(
             "/notes",
@@ -114,6 +272,77 @@ class TestNotes(unittest.TestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
+    def test_get_note_not_modified(self):
+        user_id = uuid.uuid4()
+        note_db = self._insert_note(user_id)
+
+        response = self.client.get(f"/notes/{note_db.id}", headers=auth_headers(user_id))
+        self.assertEqual(response.headers["etag"], '"1"')
+        for conditional in (
+            {"If-None-Match": response.headers["etag"]},
+            {"If-Modified-Since": response.headers["last-modified"]},
+        ):
+            response = self.client.get(f"/notes/{note_db.id}", headers={**auth_headers(user_id), **conditional})
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(response.headers["etag"], '"1"')
+            self.assertEqual(response.content, b"")
+
+        self.client.patch(f"/notes/{note_db.id}", json={"title": "Updated Test Note"}, headers=auth_headers(user_id))
+        response = self.client.get(f"/notes/{note_db.id}", headers={**auth_headers(user_id), "If-None-Match": '"1"'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.headers["etag"], '"2"')
+        self.assertEqual(response.json()["version"], 2)
+
+    def test_list_notes_not_modified(self):
+        user_id = uuid.uuid4()
+        note_db = self._insert_note(user_id)
+
+        etag = self.client.get("/notes", headers=auth_headers(user_id)).headers["etag"]
+        response = self.client.get("/notes", headers={**auth_headers(user_id), "If-None-Match": etag})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get("/notes?view=summary", headers={**auth_headers(user_id), "If-None-Match": etag})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.client.delete(f"/notes/{note_db.id}", headers=auth_headers(user_id))
+        response = self.client.get("/notes", headers={**auth_headers(user_id), "If-None-Match": etag})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), [])
+        self.assertNotEqual(response.headers["etag"], etag)
+
+    def test_list_notes_modified_in_earlier_transaction(self):
+        user_id = uuid.uuid4()
+        first = self._insert_note(user_id)
+        self._insert_note(user_id, note_id=uuid.uuid4())
+        etag = self.client.get("/notes", headers=auth_headers(user_id)).headers["etag"]
+
+        # A transaction that started before the latest change commits after it, with its earlier time.
+        self.db.execute(
+            update(Note)
+            .where(Note.id == first.id)
+            .values(title="Changed", updated_at=first.updated_at, change_seq=change_seq.next_value())
+        )
+        self.db.commit()
+        response = self.client.get("/notes", headers={**auth_headers(user_id), "If-None-Match": etag})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_get_note_cached(self):
+        cache = NoteCache(FakeBackend(), size=10, ttl=60, shared_ttl=60)
+        self.monkeypatch.setattr("nulland.crud.crud_notes.get_note_cache", lambda: cache)
+        user_id = uuid.uuid4()
+        note_db = self._insert_note(user_id)
+
+        for _ in range(2):
+            response = self.client.get(f"/notes/{note_db.id}", headers=auth_headers(user_id))
+            self.assertEqual(response.json()["title"], "New Test Note")
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        self.client.patch(f"/notes/{note_db.id}", json={"title": "Updated Test Note"}, headers=auth_headers(user_id))
+        response = self.client.get(f"/notes/{note_db.id}", headers=auth_headers(user_id))
+        self.assertEqual(response.json()["title"], "Updated Test Note")
+        self.client.delete(f"/notes/{note_db.id}", headers=auth_headers(user_id))
+        response = self.client.get(f"/notes/{note_db.id}", headers=auth_headers(user_id))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_update_note_title(self):
         user_id = uuid.uuid4()
         note_db = self._insert_note(user_id)
@@ -171,6 +400,189 @@ class TestNotes(unittest.TestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
+    def test_update_note_if_match(self):
+        user_id = uuid.uuid4()
+        note_db = self._insert_note(user_id)
+
+        response = self.client.patch(
+            f"/notes/{note_db.id}",
+            json={"title": "Updated Test Note"},
+            headers={**auth_headers(user_id), "If-Match": '"1"'},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.headers["etag"], '"2"')
+
+        response = self.client.patch(
+            f"/notes/{note_db.id}",
+            json={"title": "Lost Update"},
+            headers={**auth_headers(user_id), "If-Match": '"1"'},
+        )
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.db.refresh(note_db)
+        self.assertEqual(note_db.title, "Updated Test Note")
+        self.assertEqual(note_db.version, 2)
+
+    def _content_chunks(self, note_id) -> int:
+        return self.db.scalar(
+            select(func.count()).select_from(NoteContentChunk).where(NoteContentChunk.note_id == note_id)
+        )
+
+    def test_note_content_chunked(self):
+        user_id = uuid.uuid4()
+        note_db = self._insert_note(user_id)
+        self.monkeypatch.setattr(settings, "note_content_max_inline_size", 10)
+        self.monkeypatch.setattr(settings, "note_content_chunk_size", 4)
+        content = "Plenty of text, Grüße."
+
+        response = self.client.put(
+            f"/notes/{note_db.id}/content",
+            content=iter([content[:7].encode(), content[7:].encode()]),
+            headers=auth_headers(user_id),
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["content"], "")
+        self.assertEqual(response.json()["content_size"], len(content.encode()))
+        self.assertEqual(response.json()["version"], 2)
+        self.assertEqual(self._content_chunks(note_db.id), 6)
+
+        # Ranges are not offered for compressed content.
+        response = self.client.get(
+            f"/notes/{note_db.id}/content",
+            headers={**auth_headers(user_id), "Accept-Encoding": "identity"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.text, content)
+        self.assertEqual(response.headers["Accept-Ranges"], "bytes")
+        etag = response.headers["ETag"]
+
+        for range_header, expected in [("bytes=3-9", "nty of "), ("bytes=-8", "Grüße."), ("bytes=16-", "Grüße.")]:
+            response = self.client.get(
+                f"/notes/{note_db.id}/content",
+                headers={**auth_headers(user_id), "Range": range_header, "If-Range": etag},
+            )
+            self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+            self.assertEqual(response.text, expected)
+        self.assertEqual(response.headers["Content-Range"], "bytes 16-23/24")
+
+        response = self.client.get(
+            f"/notes/{note_db.id}/content",
+            headers={**auth_headers(user_id), "Range": "bytes=3-9", "If-Range": '"1"'},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.text, content)
+
+        response = self.client.get(
+            f"/notes/{note_db.id}/content",
+            headers={**auth_headers(user_id), "Range": "bytes=24-"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(response.headers["Content-Range"], "bytes */24")
+
+        # Content sent in JSON replaces the chunks.
+        response = self.client.patch(
+            f"/notes/{note_db.id}",
+            json={"content": "Short."},
+            headers=auth_headers(user_id),
+        )
+        self.assertEqual(response.json()["content"], "Short.")
+        self.assertIsNone(response.json()["content_size"])
+        self.assertEqual(self._content_chunks(note_db.id), 0)
+
+    def test_note_content_inline(self):
+        user_id = uuid.uuid4()
+        note_db = self._insert_note(user_id)
+
+        response = self.client.put(
+            f"/notes/{note_db.id}/content",
+            content="Uploaded text.".encode(),
+            headers=auth_headers(user_id),
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["content"], "Uploaded text.")
+        self.assertIsNone(response.json()["content_size"])
+
+        response = self.client.get(
+            f"/notes/{note_db.id}/content",
+            headers={**auth_headers(user_id), "Range": "bytes=9-"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response.text, "text.")
+        self.assertTrue(response.headers["Content-Type"].startswith("text/plain"))
+
+    def test_note_content_invalid(self):
+        user_id = uuid.uuid4()
+        note_db = self._insert_note(user_id)
+        self.monkeypatch.setattr(settings, "note_content_max_inline_size", 4)
+        self.monkeypatch.setattr(settings, "note_content_chunk_size", 4)
+
+        response = self.client.put(
+            f"/notes/{note_db.id}/content",
+            content=iter([b"Valid text, then ", b"\xff"]),
+            headers=auth_headers(user_id),
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._content_chunks(note_db.id), 0)
+
+        self.monkeypatch.setattr(settings, "note_content_max_size", 8)
+        response = self.client.put(
+            f"/notes/{note_db.id}/content",
+            content=b"Too much text.",
+            headers=auth_headers(user_id),
+        )
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        response = self.client.put(
+            f"/notes/{uuid.uuid4()}/content",
+            content=b"Text.",
+            headers=auth_headers(user_id),
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.get(f"/notes/{uuid.uuid4()}/content", headers=auth_headers(user_id))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_note_content_compressed(self):
+        user_id = uuid.uuid4()
+        note_db = self._insert_note(user_id)
+        self.monkeypatch.setattr(settings, "compression_request_max_size", 16)
+        self.monkeypatch.setattr(settings, "note_content_max_inline_size", 4)
+        self.monkeypatch.setattr(settings, "note_content_chunk_size", 8)
+        headers = {**auth_headers(user_id), "Content-Encoding": "gzip"}
+        content = "Compressed text, " * 4
+
+        # The content endpoint allows bodies up to the content size limit.
+        response = self.client.put(f"/notes/{note_db.id}/content", content=gzip.compress(content.encode()), headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["content_size"], len(content))
+        self.assertEqual(self._content_chunks(note_db.id), 9)
+
+        self.monkeypatch.setattr(settings, "note_content_max_size", 32)
+        response = self.client.put(f"/notes/{note_db.id}/content", content=gzip.compress(content.encode()), headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    def test_note_content_inline_size(self):
+        user_id = uuid.uuid4()
+        note_db = self._insert_note(user_id)
+        self.monkeypatch.setattr(settings, "note_content_max_inline_size", 8)
+
+        # Eight characters, but ten bytes.
+        response = self.client.patch(f"/notes/{note_db.id}", json={"content": "Grüße ok"}, headers=auth_headers(user_id))
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        response = self.client.patch(f"/notes/{note_db.id}", json={"content": "Gruss ok"}, headers=auth_headers(user_id))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_delete_note_content_chunks(self):
+        user_id = uuid.uuid4()
+        note_db = self._insert_note(user_id)
+        self.monkeypatch.setattr(settings, "note_content_max_inline_size", 4)
+        self.client.put(f"/notes/{note_db.id}/content", content=b"Chunked text.", headers=auth_headers(user_id))
+        self.assertEqual(self._content_chunks(note_db.id), 1)
+
+        response = self.client.delete(f"/notes/{note_db.id}", headers=auth_headers(user_id))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self._content_chunks(note_db.id), 0)
+
     def test_delete_note(self):
         user_id = uuid.uuid4()
         note_db = self._insert_note(user_id)
@@ -207,3 +619,56 @@ class TestNotes(unittest.TestCase):
 
         note_db = self.db.get(Note, note_db.id)
         self.assertIsNotNone(note_db)
+
+    def test_batch_notes(self):
+        user_id = uuid.uuid4()
+        note_upd = self._insert_note(user_id, uuid.uuid4())
+        note_del = self._insert_note(user_id, uuid.uuid4())
+        missing_id = uuid.uuid4()
+
+        response = self.client.post(
+            "/notes:batch",
+            json={"operations": [
+                {"op": "create", "note": {"title": "Batch Note", "content": "Created in batch."}},
+                {"op": "update", "id": str(note_upd.id), "note": {"title": "Updated Batch Note"}},
+                {"op": "delete", "id": str(note_del.id)},
+                {"op": "delete", "id": str(missing_id)},
+            ]},
+            headers=auth_headers(user_id),
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()
+        self.assertEqual([r["status"] for r in results], [201, 200, 204, 404])
+        self.assertEqual(results[1]["note"]["title"], "Updated Batch Note")
+        self.assertEqual(results[1]["note"]["content"], "The text of the new test note.")
+
+        self.db.expunge_all()
+        note_db = self.db.get(Note, results[0]["id"])
+        self.assertEqual(note_db.title, "Batch Note")
+        self.assertEqual(self.db.get(Note, note_upd.id).title, "Updated Batch Note")
+        self.assertIsNone(self.db.get(Note, note_del.id))
+
+    def test_batch_notes_not_owner(self):
+        note_db = self._insert_note(uuid.uuid4(), uuid.uuid4())
+
+        response = self.client.post(
+            "/notes:batch",
+            json={"operations": [
+                {"op": "update", "id": str(note_db.id), "note": {"title": "Updated Batch Note"}},
+            ]},
+            headers=auth_headers(uuid.uuid4()),
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()[0]["status"], status.HTTP_404_NOT_FOUND)
+
+    def test_batch_notes_duplicate_id(self):
+        note_id = str(uuid.uuid4())
+        response = self.client.post(
+            "/notes:batch",
+            json={"operations": [
+                {"op": "update", "id": note_id, "note": {"title": "Updated Batch Note"}},
+                {"op": "delete", "id": note_id},
+            ]},
+            headers=auth_headers(uuid.uuid4()),
+        )
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
@@ -0,0 +1,61 @@
+import pstats
+import pytest
+import unittest
+import uuid
+
+from fastapi import status
+from fastapi.testclient import TestClient
+from pathlib import Path
+
+from nulland.config import settings
+from nulland.main import app
+from nulland.tests.utils.auth import auth_headers, get_public_key
+
+
+class TestProfiling(unittest.TestCase):
+    @pytest.fixture(autouse=True)
+    def setup(self, monkeypatch: pytest.MonkeyPatch, tmp_path: Path):
+        self.monkeypatch = monkeypatch
+        self.profiling_dir = tmp_path
+        monkeypatch.setattr("nulland.auth.get_public_key", get_public_key)
+
+    def test_profile_requested(self):
+        self.monkeypatch.setattr(settings, "profiling_dir", self.profiling_dir)
+        self.monkeypatch.setattr(settings, "profiling_token", "secret")
+        with TestClient(app) as client:
+            response = client.get("/notes", headers={**auth_headers(uuid.uuid4()), "X-Profile": "secret"})
+            not_profiled = client.get("/notes", headers=auth_headers(uuid.uuid4()))
+            wrong_token = client.get("/notes", headers={**auth_headers(uuid.uuid4()), "X-Profile": "guess"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        name = response.headers["X-Profile"]
+        self.assertEqual([path.name for path in self.profiling_dir.iterdir()], [name])
+        functions = pstats.Stats(str(self.profiling_dir / name)).stats
+        self.assertTrue(any(function == "read_notes" for _, _, function in functions))
+        self.assertNotIn("X-Profile", not_profiled.headers)
+        self.assertNotIn("X-Profile", wrong_token.headers)
+
+    def test_profile_token_not_set(self):
+        self.monkeypatch.setattr(settings, "profiling_dir", self.profiling_dir)
+        with TestClient(app) as client:
+            response = client.get("/notes", headers={**auth_headers(uuid.uuid4()), "X-Profile": ""})
+
+        self.assertNotIn("X-Profile", response.headers)
+        self.assertEqual(list(self.profiling_dir.iterdir()), [])
+
+    def test_oldest_profiles_deleted(self):
+        self.monkeypatch.setattr(settings, "profiling_dir", self.profiling_dir)
+        self.monkeypatch.setattr(settings, "profiling_sample_rate", 1)
+        self.monkeypatch.setattr(settings, "profiling_max_files", 2)
+        with TestClient(app) as client:
+            names = [client.get("/notes", headers=auth_headers(uuid.uuid4())).headers["X-Profile"] for _ in range(3)]
+
+        self.assertEqual(sorted(path.name for path in self.profiling_dir.iterdir()), names[1:])
+
+    def test_profiling_disabled(self):
+        with TestClient(app) as client:
+            response = client.get("/notes", headers={**auth_headers(uuid.uuid4()), "X-Profile": "1"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("X-Profile", response.headers)
+        self.assertEqual(list(self.profiling_dir.iterdir()), [])
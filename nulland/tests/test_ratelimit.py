@@ -0,0 +1,98 @@
+import asyncio
+import pytest
+import unittest
+import uuid
+
+from fastapi import HTTPException, status
+from fastapi.testclient import TestClient
+from unittest import mock
+
+from nulland.ratelimit import RateLimiter, RouteClass, memory
+from nulland.tests.utils.auth import auth_headers, get_public_key
+
+
+def make_limiter(concurrency: int = 0) -> RateLimiter:
+    limits = {RouteClass.READ: (1, 2), RouteClass.WRITE: (0, 0), RouteClass.BATCH: (1, 1)}
+    return RateLimiter(memory.Backend(), limits, concurrency)
+
+
+class TestRateLimiter(unittest.IsolatedAsyncioTestCase):
+    async def test_token_bucket(self):
+        limiter = make_limiter()
+        with mock.patch("nulland.ratelimit.memory.time.monotonic", return_value=100.0) as monotonic:
+            for _ in range(2):
+                await limiter.acquire("user", RouteClass.READ)
+                limiter.release("user")
+            with self.assertRaises(HTTPException) as raised:
+                await limiter.acquire("user", RouteClass.READ)
+            self.assertEqual(raised.exception.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertEqual(raised.exception.headers["Retry-After"], "1")
+
+            # Buckets are separate for users and classes of routes.
+            await limiter.acquire("other", RouteClass.READ)
+            await limiter.acquire("user", RouteClass.BATCH)
+
+            monotonic.return_value = 101.0
+            await limiter.acquire("user", RouteClass.READ)
+
+    async def test_unlimited(self):
+        limiter = make_limiter()
+        for _ in range(10):
+            await limiter.acquire("user", RouteClass.WRITE)
+        self.assertEqual(limiter.active, {"user": 10})
+
+    async def test_concurrency(self):
+        limiter = make_limiter(concurrency=1)
+        await limiter.acquire("user", RouteClass.WRITE)
+        with self.assertRaises(HTTPException) as raised:
+            await limiter.acquire("user", RouteClass.WRITE)
+        self.assertEqual(raised.exception.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        await limiter.acquire("other", RouteClass.WRITE)
+
+        limiter.release("user")
+        await limiter.acquire("user", RouteClass.WRITE)
+        limiter.release("user")
+        limiter.release("other")
+        self.assertEqual(limiter.active, {})
+
+    async def test_concurrency_backend_wait(self):
+        class SlowBackend(memory.Backend):
+            async def take(self, key: str, rate: float, burst: int) -> float:
+                await asyncio.sleep(0)
+                return await super().take(key, rate, burst)
+
+        limiter = RateLimiter(SlowBackend(), {RouteClass.READ: (100, 100)}, concurrency=1)
+        results = await asyncio.gather(*(limiter.acquire("user", RouteClass.READ) for _ in range(2)), return_exceptions=True)
+        self.assertIsNone(results[0])
+        self.assertIsInstance(results[1], HTTPException)
+        self.assertEqual(limiter.active, {"user": 1})
+
+        limiter.release("user")
+        limiter.limits[RouteClass.READ] = (1, 0)
+        with self.assertRaises(HTTPException):
+            await limiter.acquire("user", RouteClass.READ)
+        self.assertEqual(limiter.active, {})
+
+
+class TestRateLimitedRoutes(unittest.TestCase):
+    @pytest.fixture(autouse=True)
+    def setup(self, client: TestClient, monkeypatch: pytest.MonkeyPatch):
+        self.client = client
+        self.limiter = make_limiter(concurrency=1)
+        monkeypatch.setattr("nulland.auth.get_public_key", get_public_key)
+        monkeypatch.setattr("nulland.ratelimit.get_rate_limiter", lambda: self.limiter)
+
+    def test_too_many_requests(self):
+        headers = auth_headers(uuid.uuid4())
+        for _ in range(2):
+            response = self.client.get("/notes", headers=headers)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get("/notes", headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertGreaterEqual(int(response.headers["Retry-After"]), 1)
+        # Finished requests no longer count as concurrent.
+        self.assertEqual(self.limiter.active, {})
+
+        response = self.client.get("/notes", headers=auth_headers(uuid.uuid4()))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -0,0 +1,44 @@
+import pytest
+import unittest
+import uuid
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from nulland.models.outbox import OutboxEvent
+from nulland.relay import relay_events
+from nulland.tests.utils.events import FakeProducer
+
+
+class TestRelay(unittest.TestCase):
+    @pytest.fixture(autouse=True)
+    def setup(self, db: Session):
+        self.db = db
+
+    def _insert_event(self) -> OutboxEvent:
+        event = OutboxEvent(topic="notes", key="created", value=f'{{"id": "{uuid.uuid4()}"}}')
+        self.db.add(event)
+        self.db.commit()
+        self.db.refresh(event)
+        return event
+
+    def _outbox_ids(self) -> set[int]:
+        return set(self.db.scalars(select(OutboxEvent.id)))
+
+    def test_relay_events(self):
+        event = self._insert_event()
+        producer = FakeProducer()
+
+        published = relay_events(producer, self.db)
+        self.assertGreater(published, 0)
+        self.assertIn(("notes", "created", event.value), producer.messages)
+        self.assertNotIn(event.id, self._outbox_ids())
+
+    def test_relay_events_not_delivered(self):
+        event = self._insert_event()
+        producer = FakeProducer()
+        producer.pending = 1
+
+        with self.assertRaises(RuntimeError):
+            relay_events(producer, self.db)
+        self.assertIn(event.id, self._outbox_ids())
@@ -0,0 +1,120 @@
+import pytest
+import unittest
+import uuid
+
+from fastapi import status
+from fastapi.testclient import TestClient
+from sqlalchemy import NullPool
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from types import SimpleNamespace
+
+from nulland.config import settings
+from nulland.db.replicas import ReplicaSet
+from nulland.db.session import async_engine, replicas
+from nulland.tests.utils.auth import auth_headers, get_public_key
+from nulland.tests.utils.cache import FakeBackend
+
+
+class FakeEngine:
+    url = "postgresql://replica"
+
+    def __init__(self, checkedout=0):
+        self.pool = SimpleNamespace(checkedout=lambda: checkedout)
+
+
+class TestReplicaSet(unittest.IsolatedAsyncioTestCase):
+    async def test_round_robin(self):
+        engines = [FakeEngine(), FakeEngine()]
+        replica_set = ReplicaSet(engines)
+
+        self.assertEqual([await replica_set.choose("user") for _ in range(4)], engines * 2)
+
+    async def test_least_connections(self):
+        engines = [FakeEngine(checkedout=3), FakeEngine(checkedout=1), FakeEngine(checkedout=2)]
+        replica_set = ReplicaSet(engines, selection=settings.ReplicaSelection.LEAST_CONNECTIONS)
+
+        self.assertIs(await replica_set.choose("user"), engines[1])
+
+    async def test_eject(self):
+        engines = [FakeEngine(), FakeEngine()]
+        replica_set = ReplicaSet(engines)
+
+        replica_set.eject(engines[0])
+        self.assertEqual({await replica_set.choose("user") for _ in range(4)}, {engines[1]})
+        replica_set.eject(engines[1])
+        self.assertIsNone(await replica_set.choose("user"))
+
+        replica_set.retry_interval = 0
+        replica_set.eject(engines[0])
+        self.assertIs(await replica_set.choose("user"), engines[0])
+
+    async def test_read_your_writes(self):
+        replica_set = ReplicaSet([FakeEngine()])
+
+        await replica_set.record_write("writer")
+        self.assertIsNone(await replica_set.choose("writer"))
+        self.assertIsNotNone(await replica_set.choose("reader"))
+
+        replica_set.stickiness = 0
+        await replica_set.record_write("writer")
+        self.assertIsNotNone(await replica_set.choose("writer"))
+        self.assertEqual(list(replica_set.writes), [])
+
+    async def test_read_your_writes_shared(self):
+        # Workers of the app, sharing writes through the cache.
+        shared = FakeBackend()
+        writer_worker = ReplicaSet([FakeEngine()], shared=shared)
+        reader_worker = ReplicaSet([FakeEngine()], shared=shared)
+
+        await writer_worker.record_write("writer")
+        self.assertIsNone(await reader_worker.choose("writer"))
+        self.assertIsNotNone(await reader_worker.choose("reader"))
+
+        # Without the shared backend the other worker does not know of the write.
+        self.assertIsNotNone(await ReplicaSet([FakeEngine()]).choose("writer"))
+
+    async def test_no_replicas(self):
+        replica_set = ReplicaSet([])
+
+        await replica_set.record_write("writer")
+        self.assertIsNone(await replica_set.choose("writer"))
+        self.assertEqual(list(replica_set.writes), [])
+
+
+class TestReadReplicaRouting(unittest.TestCase):
+    @pytest.fixture(autouse=True)
+    def setup(self, client: TestClient, monkeypatch: pytest.MonkeyPatch):
+        self.client = client
+        self.monkeypatch = monkeypatch
+        monkeypatch.setattr("nulland.auth.get_public_key", get_public_key)
+        monkeypatch.setattr(replicas, "writes", replicas.writes.copy())
+        monkeypatch.setattr(replicas, "ejected", {})
+
+    def _use_replica(self, url) -> list:
+        engine = create_async_engine(url, poolclass=NullPool)
+        connects = []
+        event.listen(engine.sync_engine, "connect", lambda *_: connects.append(1))
+        self.monkeypatch.setattr(replicas, "engines", [engine])
+        return connects
+
+    def test_reads_go_to_replica(self):
+        # The replica is the primary itself under another engine.
+        connects = self._use_replica(async_engine.url)
+        user_id = uuid.uuid4()
+
+        response = self.client.get("/notes", headers=auth_headers(user_id))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(connects), 1)
+
+        self.client.post("/notes", json={"title": "Title", "content": "Text"}, headers=auth_headers(user_id))
+        response = self.client.get("/notes", headers=auth_headers(user_id))
+        self.assertEqual(len(response.json()), 1)
+        self.assertEqual(len(connects), 1)
+
+    def test_failed_replica_ejected(self):
+        self._use_replica("postgresql+asyncpg://postgres@localhost:1/postgres")
+
+        response = self.client.get("/notes", headers=auth_headers(uuid.uuid4()))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(replicas.ejected), replicas.engines)
@@ -0,0 +1,21 @@
+import unittest
+
+from unittest import mock
+
+from nulland.db import session
+
+
+class TestSession(unittest.TestCase):
+    def test_dispose_after_fork(self):
+        engine, async_engine, replica = mock.Mock(), mock.Mock(), mock.Mock()
+        with (
+            mock.patch.object(session, "engine", engine),
+            mock.patch.object(session, "async_engine", async_engine),
+            mock.patch.object(session.replicas, "engines", [replica]),
+        ):
+            session.dispose_after_fork()
+
+        # Connections of the parent process are left open for it.
+        engine.dispose.assert_called_once_with(close=False)
+        async_engine.sync_engine.dispose.assert_called_once_with(close=False)
+        replica.sync_engine.dispose.assert_called_once_with(close=False)
@@ -0,0 +1,60 @@
+import pytest
+import unittest
+import uuid
+
+from collections import OrderedDict
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from nulland.auth import token_cache
+from nulland.events import EventEmmiter
+from nulland.main import app
+from nulland.tests.test_events import make_note
+from nulland.tests.utils.auth import auth_headers, get_public_key
+from nulland.tests.utils.events import FakeProducer
+from nulland.tests.utils.tracing import enable_tracing
+from nulland.tracing import tracer
+
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+
+
+class TestTracing(unittest.TestCase):
+    @pytest.fixture(autouse=True)
+    def setup(self, monkeypatch: pytest.MonkeyPatch):
+        self.monkeypatch = monkeypatch
+        monkeypatch.setattr("nulland.auth.get_public_key", get_public_key)
+        self.exporter = enable_tracing()
+
+    def test_request_spans(self):
+        user_id = uuid.uuid4()
+        with TestClient(app) as client:
+            response = client.post("/notes", json={"title": "Title", "content": "Text"}, headers=auth_headers(user_id))
+            note_id = response.json()["id"]
+            self.monkeypatch.setattr(token_cache, "entries", OrderedDict())
+            self.exporter.clear()
+            response = client.patch(
+                f"/notes/{note_id}",
+                json={"title": "Updated"},
+                headers={**auth_headers(user_id), "traceparent": f"00-{TRACE_ID}-00f067aa0ba902b7-01"},
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        spans = [span for span in self.exporter.get_finished_spans() if f"{span.context.trace_id:032x}" == TRACE_ID]
+        names = [span.name for span in spans]
+        self.assertIn("auth.verify_token", names)
+        self.assertIn("db UPDATE", names)
+        self.assertIn("events.emit", names)
+        server = spans[names.index("PATCH /notes/{note_id}")]
+        self.assertEqual(server.attributes["http.response.status_code"], status.HTTP_200_OK)
+        self.assertEqual(f"{server.parent.span_id:016x}", "00f067aa0ba902b7")
+
+    def test_event_headers(self):
+        producer = FakeProducer()
+        emitter = EventEmmiter(producer)
+
+        with tracer.start_as_current_span("test") as span:
+            emitter.emit("created", make_note())
+
+        self.assertEqual(len(producer.headers), 1)
+        self.assertIn(f"{span.get_span_context().trace_id:032x}", producer.headers[0]["traceparent"])
@@ -22,6 +22,10 @@ public_key = rsa_key.public_key().public_bytes(
 jwk_public_key = jwk.RSAKey(key=public_key.decode('utf-8'), algorithm='RS256')
 
 
+async def get_public_key(kid=None):
+    return jwk_public_key
+
+
 def auth_headers(user_id) -> dict[str, str]:
     from jose import jwt
     claims = {"sub": str(user_id), "name": "John Doe", "email": "joe@localhost"}
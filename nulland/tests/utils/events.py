@@ -0,0 +1,22 @@
+class FakeProducer:
+    def __init__(self, capacity=None):
+        self.capacity = capacity
+        self.messages = []
+        self.headers = []
+        self.polls = 0
+        self.flushed = False
+        self.pending = 0
+
+    def produce(self, topic, key, value, headers=None):
+        if self.capacity is not None and len(self.messages) >= self.capacity:
+            raise BufferError("Local: Queue full")
+        self.messages.append((topic, key, value))
+        self.headers.append(headers)
+
+    def poll(self, timeout):
+        self.polls += 1
+        return 0
+
+    def flush(self, timeout):
+        self.flushed = True
+        return self.pending
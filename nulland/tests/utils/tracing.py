@@ -0,0 +1,13 @@
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+from nulland.tracing import init_tracing
+
+
+exporter = InMemorySpanExporter()
+
+
+def enable_tracing() -> InMemorySpanExporter:
+    """Exports spans to memory. The tracer provider can be set only once, so it stays for the rest of the tests."""
+    init_tracing(exporter)
+    exporter.clear()
+    return exporter
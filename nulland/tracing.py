@@ -0,0 +1,130 @@
+import logging
+
+from opentelemetry import propagate
+from opentelemetry import trace
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from nulland.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+# Spans are dropped by the no-op tracer of the API until `init_tracing` sets up the provider.
+# The SDK and the exporters are imported only then, they take long to import and are rarely enabled.
+tracer = trace.get_tracer("nulland")
+
+
+def get_exporter():
+    if settings.tracing_exporter == settings.TracingExporter.OTLP:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        return OTLPSpanExporter(endpoint=settings.tracing_otlp_endpoint)
+    if settings.tracing_exporter == settings.TracingExporter.CONSOLE:
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+        return ConsoleSpanExporter()
+    return None
+
+
+def init_tracing(exporter=None) -> bool:
+    """Sets up the tracer provider exporting spans of sampled traces, returns whether tracing is enabled.
+
+    Traces started by the app are sampled at `tracing_sample_rate`, traces started by callers follow their decision.
+    """
+    if not isinstance(trace.get_tracer_provider(), trace.ProxyTracerProvider):
+        return True
+    exporter = exporter or get_exporter()
+    if exporter is None:
+        return False
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": settings.tracing_service_name}),
+        sampler=ParentBased(TraceIdRatioBased(settings.tracing_sample_rate)),
+    )
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    logger.info("Tracing enabled, sampling %s of traces", settings.tracing_sample_rate)
+    return True
+
+
+def shutdown_tracing():
+    """Exports the spans still buffered."""
+    provider = trace.get_tracer_provider()
+    # Only the provider of the SDK buffers spans, the one of the API is a placeholder.
+    if hasattr(provider, "force_flush"):
+        provider.force_flush()
+
+
+class TracingMiddleware:
+    """Starts a server span for every request, continuing the trace of the caller passed in traceparent header."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        with tracer.start_as_current_span(
+            scope["method"],
+            context=propagate.extract(headers),
+            kind=trace.SpanKind.SERVER,
+            attributes={"http.request.method": scope["method"], "url.path": scope["path"]},
+        ) as span:
+
+            async def send_traced(message):
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.response.status_code", message["status"])
+                    if message["status"] >= 500:
+                        span.set_status(trace.StatusCode.ERROR)
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_traced)
+            finally:
+                # The route is set on the scope by the router.
+                if (route := scope.get("route")) is not None:
+                    span.set_attribute("http.route", route.path)
+                    span.update_name(f"{scope['method']} {route.path}")
+
+
+def trace_statements(engine: Engine):
+    """Records every statement of the engine as a span."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    words = statement.split(None, 1)
+    context._span = tracer.start_span(
+        f"db {words[0].upper() if words else ''}",
+        kind=trace.SpanKind.CLIENT,
+        # Parameters are left out, they carry the content of notes.
+        attributes={"db.system": "postgresql", "db.statement": statement},
+    )
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._span.end()
+
+
+def _handle_error(exception_context):
+    context = exception_context.execution_context
+    if context is not None and hasattr(context, "_span"):
+        context._span.record_exception(exception_context.original_exception)
+        context._span.set_status(trace.StatusCode.ERROR)
+        context._span.end()
+
+
+def inject_headers() -> dict[str, str]:
+    """Returns the headers passing the current trace context on to consumers of a message."""
+    carrier = {}
+    propagate.inject(carrier)
+    return carrier